@@ -1,9 +1,28 @@
-from typing import List, Dict, Generator
+import asyncio
+import hashlib
+import json
+import time
+from typing import List, Dict, Any, Optional, Tuple, Generator, AsyncGenerator
 from langchain_core.messages import HumanMessage
 from graph import create_graph
+from response_cache import get_response_cache
+from supabase_vectorstore import get_vectorstore
+from embeddings_setup import get_retriever
+from speculation import speculation_stats
+from usage import RequestUsage, track_request_usage, route_usage_stats
+from request_trace import RequestTrace, track_request_trace, record_cache_lookup
+from sessions import get_session_store
+from cache import SingleFlight, StreamFanout, normalize_text
+from config import RESPONSE_CACHE_ENABLED, COALESCE_QUERIES, SPECULATIVE_RETRIEVAL, BATCH_CONCURRENCY
 
 _agent_graph = None
 
+TOOL_NODES = ["execute_rag_tool", "execute_tavily_tool", "execute_both_tools"]
+
+# Identical concurrent queries: /chat callers share a result, /chat/stream callers an event stream
+_query_flight = SingleFlight()
+_stream_fanout = StreamFanout()
+
 
 def get_agent():
     global _agent_graph
@@ -12,51 +31,254 @@ def get_agent():
     return _agent_graph
 
 
-def query_agent(query: str, conversation_history: List[Dict[str, str]] = None) -> str:
-    """
-    Query the Agentic RAG agent with optional conversation history
-    
-    The agent dynamically routes queries to appropriate tools:
-    - RAG (knowledge base) for revenue planning strategies
-    - Tavily (web search) for current market information
-    - Both tools for comprehensive answers
-    - Direct LLM response for general queries
-    """
-    
-    agent = get_agent()
-    
-
-    inputs = {
+def _build_inputs(query: str, conversation_history: List[Dict[str, str]] = None, conversation_summary: str = "", speculative: Optional[Dict[str, Any]] = None) -> dict:
+    """Initial graph state for a single query (speculative may carry prefetched tool work)"""
+    return {
         "messages": [HumanMessage(content=query)],
         "conversation_history": conversation_history or [],
+        "conversation_summary": conversation_summary or None,
         "question": None,
         "tool_choice": None,
+        "time_sensitive": None,
+        "speculative": speculative,
         "rag_documents": None,
         "tavily_results": None,
         "can_answer_internally": None,
         "validation_result": None,
         "tools_tried": None
     }
+
+
+def _session_context(session_id: Optional[str], conversation_history: List[Dict[str, str]] = None) -> Tuple[str, Optional[List[Dict[str, str]]]]:
+    """
+    Rolling summary and recent messages for a server-side session
+    
+    Without a session the client-supplied history is used as before. Client
+    history sent with a new (empty) session seeds it, so existing clients can
+    switch to sessions without losing the conversation so far.
+    """
+    if not session_id:
+        return "", conversation_history
+    
+    store = get_session_store()
+    if conversation_history:
+        store.seed(session_id, conversation_history)
+    return store.get_context(session_id)
+
+
+async def _asession_context(session_id: Optional[str], conversation_history: List[Dict[str, str]] = None) -> Tuple[str, Optional[List[Dict[str, str]]]]:
+    """Async variant of _session_context (a persistent backend may read from disk)"""
+    if not session_id:
+        return "", conversation_history
+    return await asyncio.to_thread(_session_context, session_id, conversation_history)
+
+
+def _record_turn(session_id: Optional[str], query: str, answer: str):
+    """Append the answered turn to the session; summarization happens in the background"""
+    if session_id and answer:
+        get_session_store().append_turn(session_id, query, answer)
+
+
+def _lookup_cached_response(query: str, conversation_history: List[Dict[str, str]] = None, conversation_summary: str = "") -> Tuple[Optional[Dict[str, Any]], Optional[Tuple[List[float], int]]]:
+    """
+    Check the semantic response cache before running the graph
+    
+    Only queries with no history and no session summary are cached, since the
+    same question can need a different answer mid-conversation. The query
+    embedding and the cache generation seen by this lookup are returned so
+    the answer can be stored under it afterwards, unless the cache was
+    invalidated meanwhile (the embedding also primes the embedding cache for
+    retrieval on a miss).
+    """
+    if not RESPONSE_CACHE_ENABLED or conversation_history or conversation_summary:
+        return None, None
+    
+    generation = get_response_cache().generation
+    try:
+        embedding = get_vectorstore().embed_query(query)
+    except Exception as e:
+        print(f"Response cache lookup error: {str(e)}")
+        return None, None
+    
+    cached = get_response_cache().lookup(embedding)
+    record_cache_lookup("response", cached is not None)
+    return cached, (embedding, generation)
+
+
+async def _alookup_cached_response(query: str, conversation_history: List[Dict[str, str]] = None, conversation_summary: str = "") -> Tuple[Optional[Dict[str, Any]], Optional[Tuple[List[float], int]]]:
+    """Async variant of _lookup_cached_response"""
+    if not RESPONSE_CACHE_ENABLED or conversation_history or conversation_summary:
+        return None, None
+    
+    generation = get_response_cache().generation
+    try:
+        embedding = await get_vectorstore().aembed_query(query)
+    except Exception as e:
+        print(f"Response cache lookup error: {str(e)}")
+        return None, None
+    
+    cached = get_response_cache().lookup(embedding)
+    record_cache_lookup("response", cached is not None)
+    return cached, (embedding, generation)
+
+
+def _store_response(query: str, cache_key: Optional[Tuple[List[float], int]], answer: str, tool_choice: Optional[str], time_sensitive: bool = False):
+    """Remember a generated answer for semantically similar future queries (cache_key from the lookup)"""
+    if cache_key is not None and answer:
+        embedding, generation = cache_key
+        get_response_cache().store(query, embedding, answer, tool_choice, time_sensitive, generation)
+
+
+def get_coalescing_stats() -> Dict[str, Any]:
+    """Executions vs. callers that attached to an identical in-flight query"""
+    query_stats = _query_flight.stats()
+    stream_stats = _stream_fanout.stats()
+    calls = sum(stats["executions"] + stats["shared"] for stats in (query_stats, stream_stats))
+    shared = query_stats["shared"] + stream_stats["shared"]
+    return {
+        "enabled": COALESCE_QUERIES,
+        "coalescing_ratio": round(shared / calls, 4) if calls else 0.0,
+        "query": query_stats,
+        "stream": stream_stats
+    }
+
+
+def _coalesce_key(query: str, conversation_history: List[Dict[str, str]] = None, conversation_summary: str = "", session_id: Optional[str] = None) -> tuple:
+    """Same normalized question asked in the same session with the same conversation context"""
+    # A shared run records its turn in one session, so runs are never shared across sessions
+    context = json.dumps([session_id or "", conversation_summary or "", conversation_history or []], sort_keys=True)
+    return (normalize_text(query), hashlib.sha1(context.encode("utf-8")).hexdigest())
+
+
+def _new_run_info() -> Dict[str, Any]:
+    """Route taken by one execution: the router's tool choice and how many tool nodes ran"""
+    return {"tool_choice": None, "tool_runs": 0}
+
+
+def _route_label(run_info: Dict[str, Any]) -> str:
+    route = run_info["tool_choice"] or "unrouted"
+    # More than one tool node means validation sent the request back for another tool
+    return f"{route}+retry" if run_info["tool_runs"] > 1 else route
+
+
+def _outcome(response: str, answered: bool, usage: RequestUsage, run_info: Dict[str, Any], start: float, trace: Optional[RequestTrace] = None) -> Dict[str, Any]:
+    """Result of one execution with its token usage and trace; also feeds the rolling per-route aggregates"""
+    route = _route_label(run_info)
+    usage_summary = {"route": route, **usage.to_dict()}
+    route_usage_stats.record(route, usage_summary, time.perf_counter() - start)
+    return {
+        "response": response,
+        "answered": answered,
+        "usage": usage_summary,
+        "trace": trace.to_dict() if trace is not None else None
+    }
+
+
+def _execute_query(query: str, conversation_history: List[Dict[str, str]], conversation_summary: str, run_info: Dict[str, Any]) -> Tuple[str, bool]:
+    """
+    Answer one query from the response cache or a full graph run
+    
+    Returns:
+        The response text and whether it is an answer (False for fallback/error messages)
+    """
+    cached, cache_key = _lookup_cached_response(query, conversation_history, conversation_summary)
+    if cached:
+        run_info["tool_choice"] = "cache"
+        return cached["answer"], True
+    
+    agent = get_agent()
+    
+    
+    inputs = _build_inputs(query, conversation_history, conversation_summary)
     
     try:
         result = None
+        tool_choice = None
+        time_sensitive = False
         
         for output in agent.stream(inputs):
             for key, value in output.items():
+            
+                if key == "analyze_and_route":
+                    tool_choice = value.get("tool_choice")
+                    time_sensitive = bool(value.get("time_sensitive"))
+                    run_info["tool_choice"] = tool_choice
+                
+                if key in TOOL_NODES:
+                    run_info["tool_runs"] += 1
                 
                 if key == "generate_response":
                     result = value["messages"][-1]
         
         if result:
-            return result
+            _store_response(query, cache_key, result, tool_choice, time_sensitive)
+            return result, True
         else:
-            return "Sorry, I couldn't generate a response. Please try again."
-            
+            return "Sorry, I couldn't generate a response. Please try again.", False
+    
     except Exception as e:
-        return f"Error processing query: {str(e)}"
+        return f"Error processing query: {str(e)}", False
+
+
+def _run_query(query: str, conversation_history: List[Dict[str, str]] = None, conversation_summary: str = "", session_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    _execute_query with usage tracking and tracing; returns response, answered, usage and trace
+    
+    An answer is recorded as a session turn here, inside the (possibly shared)
+    run, so coalesced callers record it once.
+    """
+    start = time.perf_counter()
+    run_info = _new_run_info()
+    with track_request_usage() as usage, track_request_trace() as trace:
+        response, answered = _execute_query(query, conversation_history, conversation_summary, run_info)
+    if answered:
+        _record_turn(session_id, query, response)
+    return _outcome(response, answered, usage, run_info, start, trace)
+
+
+def query_agent_with_usage(query: str, conversation_history: List[Dict[str, str]] = None, session_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    query_agent that also reports token usage, estimated cost and a trace
+    
+    Returns:
+        {"response": str, "usage": dict, "trace": dict or None} where usage
+        has the route, token totals, estimated cost and a per-node breakdown
+        and trace the node path and timings (see request_trace.py);
+        coalesced callers report the usage and trace of the shared run
+    """
+    summary, conversation_history = _session_context(session_id, conversation_history)
+    
+    # OPTIMIZED: Concurrent identical queries (same conversation context) share one run
+    if COALESCE_QUERIES:
+        outcome = _query_flight.do(
+            _coalesce_key(query, conversation_history, summary, session_id),
+            lambda: _run_query(query, conversation_history, summary, session_id)
+        )
+    else:
+        outcome = _run_query(query, conversation_history, summary, session_id)
+    
+    return {"response": outcome["response"], "usage": outcome["usage"], "trace": outcome["trace"]}
 
 
-def stream_agent(query: str, conversation_history: List[Dict[str, str]] = None) -> Generator[str, None, None]:
+def query_agent(query: str, conversation_history: List[Dict[str, str]] = None, session_id: Optional[str] = None) -> str:
+    """
+    Query the Agentic RAG agent with optional conversation history
+    
+    The agent dynamically routes queries to appropriate tools:
+    - RAG (knowledge base) for revenue planning strategies
+    - Tavily (web search) for current market information
+    - Both tools for comprehensive answers
+    - Direct LLM response for general queries
+    
+    History-free queries are answered from the semantic response cache
+    when a close enough question was answered recently. With a session_id
+    the conversation is kept server-side (see sessions.py).
+    """
+    
+    return query_agent_with_usage(query, conversation_history, session_id)["response"]
+
+
+def stream_agent(query: str, conversation_history: List[Dict[str, str]] = None, session_id: Optional[str] = None) -> Generator[str, None, None]:
     """
     Stream the Agentic RAG agent response token by token
     
@@ -65,38 +287,40 @@ def stream_agent(query: str, conversation_history: List[Dict[str, str]] = None)
     Args:
         query: User's question
         conversation_history: Optional conversation context
-        
+        session_id: Optional server-side session holding the conversation
+    
     Yields:
         str: Individual response tokens or status updates
     """
     
+    summary, conversation_history = _session_context(session_id, conversation_history)
+    
+    cached, cache_key = _lookup_cached_response(query, conversation_history, summary)
+    if cached:
+        _record_turn(session_id, query, cached["answer"])
+        yield cached["answer"]
+        return
+    
     agent = get_agent()
     
     
-    inputs = {
-        "messages": [HumanMessage(content=query)],
-        "conversation_history": conversation_history or [],
-        "question": None,
-        "tool_choice": None,
-        "rag_documents": None,
-        "tavily_results": None,
-        "can_answer_internally": None,
-        "validation_result": None,
-        "tools_tried": None
-    }
+    inputs = _build_inputs(query, conversation_history, summary)
     
     try:
         response_generated = False
+        tool_choice = None
+        time_sensitive = False
         
         for output in agent.stream(inputs):
             for node_name, value in output.items():
-                
-                
-                if node_name == "route_query":
+            
+            
+                if node_name == "analyze_and_route":
                     tool_choice = value.get("tool_choice", "unknown")
+                    time_sensitive = bool(value.get("time_sensitive"))
                     yield f"[ROUTING: {tool_choice}]\n"
                 
-                elif node_name in ["execute_rag_tool", "execute_tavily_tool", "execute_both_tools"]:
+                elif node_name in TOOL_NODES:
                     yield f"[RETRIEVING...]\n"
                 
                 
@@ -106,11 +330,15 @@ def stream_agent(query: str, conversation_history: List[Dict[str, str]] = None)
                         response_generated = True
                         
                         if isinstance(response, str):
-                            yield response
+                            content = response
                         elif hasattr(response, 'content'):
-                            yield response.content
+                            content = response.content
                         else:
-                            yield str(response)
+                            content = str(response)
+                        
+                        _store_response(query, cache_key, content, tool_choice, time_sensitive)
+                        _record_turn(session_id, query, content)
+                        yield content
                         
                         break  
             
@@ -121,7 +349,336 @@ def stream_agent(query: str, conversation_history: List[Dict[str, str]] = None)
         
         if not response_generated:
             yield "Sorry, I couldn't generate a response. Please try again."
-        
+    
     except Exception as e:
         yield f"Error: {str(e)}"
 
+
+async def _aexecute_query(query: str, conversation_history: List[Dict[str, str]], conversation_summary: str, run_info: Dict[str, Any], speculative: Optional[Dict[str, Any]] = None) -> Tuple[str, bool]:
+    """Async variant of _execute_query"""
+    cached, cache_key = await _alookup_cached_response(query, conversation_history, conversation_summary)
+    if cached:
+        run_info["tool_choice"] = "cache"
+        return cached["answer"], True
+    
+    agent = get_agent()
+    
+    inputs = _build_inputs(query, conversation_history, conversation_summary, speculative)
+    
+    try:
+        result = None
+        tool_choice = None
+        time_sensitive = False
+        
+        async for output in agent.astream(inputs):
+            for key, value in output.items():
+            
+                if key == "analyze_and_route":
+                    tool_choice = value.get("tool_choice")
+                    time_sensitive = bool(value.get("time_sensitive"))
+                    run_info["tool_choice"] = tool_choice
+                
+                if key in TOOL_NODES:
+                    run_info["tool_runs"] += 1
+                
+                if key == "generate_response":
+                    result = value["messages"][-1]
+        
+        if result:
+            _store_response(query, cache_key, result, tool_choice, time_sensitive)
+            return result, True
+        else:
+            return "Sorry, I couldn't generate a response. Please try again.", False
+    
+    except Exception as e:
+        return f"Error processing query: {str(e)}", False
+
+
+async def _arun_query(query: str, conversation_history: List[Dict[str, str]] = None, conversation_summary: str = "", speculative: Optional[Dict[str, Any]] = None, session_id: Optional[str] = None) -> Dict[str, Any]:
+    """Async variant of _run_query"""
+    start = time.perf_counter()
+    run_info = _new_run_info()
+    with track_request_usage() as usage, track_request_trace() as trace:
+        response, answered = await _aexecute_query(query, conversation_history, conversation_summary, run_info, speculative)
+    if answered:
+        _record_turn(session_id, query, response)
+    return _outcome(response, answered, usage, run_info, start, trace)
+
+
+async def aquery_agent_with_usage(query: str, conversation_history: List[Dict[str, str]] = None, session_id: Optional[str] = None) -> Dict[str, Any]:
+    """Async variant of query_agent_with_usage"""
+    summary, conversation_history = await _asession_context(session_id, conversation_history)
+    
+    # OPTIMIZED: Concurrent identical queries (same conversation context) share one run
+    if COALESCE_QUERIES:
+        outcome = await _query_flight.ado(
+            _coalesce_key(query, conversation_history, summary, session_id),
+            lambda: _arun_query(query, conversation_history, summary, session_id=session_id)
+        )
+    else:
+        outcome = await _arun_query(query, conversation_history, summary, session_id=session_id)
+    
+    return {"response": outcome["response"], "usage": outcome["usage"], "trace": outcome["trace"]}
+
+
+async def aquery_agent(query: str, conversation_history: List[Dict[str, str]] = None, session_id: Optional[str] = None) -> str:
+    """
+    Async variant of query_agent
+    
+    Runs the graph through astream so LLM, Supabase and Tavily calls are awaited
+    instead of blocking the event loop.
+    """
+    return (await aquery_agent_with_usage(query, conversation_history, session_id))["response"]
+
+
+async def abatch_query_agent(items: List[Dict[str, Any]], concurrency: int = BATCH_CONCURRENCY) -> List[Dict[str, Any]]:
+    """
+    Answer many queries in one call
+    
+    Identical items (same query and conversation context) run once. All
+    queries are embedded with one embed_documents call, which primes the
+    embedding cache for the response-cache lookups and retrieval. Knowledge
+    base retrieval for every query starts up front and is handed to each
+    graph run as its speculative "rag" work. At most `concurrency` graph
+    runs (and retrievals) are in flight at a time.
+    
+    Args:
+        items: Dicts with "query" and optional "conversation_history" and "session_id"
+        concurrency: Maximum concurrent graph runs
+    
+    Returns:
+        One dict per item, in order: {"response": str, "usage": dict, "trace": dict}
+        or {"error": str, "usage": dict, "trace": dict}
+    """
+    contexts = await asyncio.gather(*[
+        _asession_context(item.get("session_id"), item.get("conversation_history"))
+        for item in items
+    ])
+    
+    # One run per distinct query/session/context
+    keys = [
+        _coalesce_key(item["query"], history, summary, item.get("session_id"))
+        for item, (summary, history) in zip(items, contexts)
+    ]
+    runs: Dict[tuple, Tuple[str, List[Dict[str, str]], str, Optional[str]]] = {}
+    for key, item, (summary, history) in zip(keys, items, contexts):
+        runs.setdefault(key, (item["query"], history, summary, item.get("session_id")))
+    queries = list(dict.fromkeys(query for query, _, _, _ in runs.values()))
+    
+    # OPTIMIZED: One embeddings request for the whole batch instead of one per query
+    try:
+        await get_vectorstore().aembed_queries(queries)
+    except Exception as e:
+        print(f"Batch embedding error, falling back to per-query embeddings: {str(e)}")
+    
+    # Separate limits: a graph run waiting on its prefetch must not hold the slot the prefetch needs
+    retrieval_slots = asyncio.Semaphore(max(1, concurrency))
+    run_slots = asyncio.Semaphore(max(1, concurrency))
+    
+    async def bounded(semaphore: asyncio.Semaphore, coro):
+        async with semaphore:
+            return await coro
+    
+    # OPTIMIZED: Retrieval for the whole batch runs concurrently over the shared pool, ahead of routing
+    prefetched: Dict[str, "asyncio.Future"] = {}
+    if SPECULATIVE_RETRIEVAL:
+        retriever = get_retriever()
+        for query in queries:
+            prefetched[query] = asyncio.ensure_future(bounded(retrieval_slots, retriever.ainvoke(query)))
+            speculation_stats.record("rag", "launched")
+    
+    runs_per_query: Dict[str, int] = {}
+    for query, _, _, _ in runs.values():
+        runs_per_query[query] = runs_per_query.get(query, 0) + 1
+    
+    async def run(query: str, history: List[Dict[str, str]], summary: str, session_id: Optional[str]) -> Dict[str, Any]:
+        speculative = None
+        if query in prefetched:
+            # A run whose router skips RAG cancels its handle; shield it when other runs share the prefetch
+            handle = prefetched[query]
+            speculative = {"rag": asyncio.shield(handle) if runs_per_query[query] > 1 else handle}
+        return await bounded(run_slots, _arun_query(query, history, summary, speculative, session_id))
+    
+    outcomes = await asyncio.gather(*[run(*run_args) for run_args in runs.values()], return_exceptions=True)
+    by_key = dict(zip(runs.keys(), outcomes))
+    
+    # Prefetches a run never consumed (e.g. it errored before routing) must not linger
+    for task in prefetched.values():
+        if not task.done():
+            task.cancel()
+    
+    results = []
+    for key, item in zip(keys, items):
+        outcome = by_key[key]
+        if isinstance(outcome, BaseException):
+            results.append({"error": str(outcome) or type(outcome).__name__})
+            continue
+        if outcome["answered"]:
+            results.append({"response": outcome["response"], "usage": outcome["usage"], "trace": outcome["trace"]})
+        else:
+            results.append({"error": outcome["response"], "usage": outcome["usage"], "trace": outcome["trace"]})
+    return results
+
+
+async def _astream_events(query: str, conversation_history: List[Dict[str, str]], conversation_summary: str, run_info: Dict[str, Any]) -> AsyncGenerator[Dict[str, Any], None]:
+    """
+    Agent events for one query, from the response cache or a full graph run
+    
+    Ends with an internal {"type": "answered", "answered": bool} event
+    (False for fallback/error output).
+    """
+    
+    cached, cache_key = await _alookup_cached_response(query, conversation_history, conversation_summary)
+    if cached:
+        run_info["tool_choice"] = "cache"
+        yield {
+            "type": "cache",
+            "status": "hit",
+            "similarity": cached["similarity"],
+            "age_seconds": cached["age_seconds"]
+        }
+        yield {"type": "token", "content": cached["answer"]}
+        yield {"type": "answered", "answered": True}
+        return
+    
+    agent = get_agent()
+    
+    inputs = _build_inputs(query, conversation_history, conversation_summary)
+    
+    try:
+        response_generated = False
+        tool_choice = None
+        time_sensitive = False
+        answer_parts = []
+        
+        async for event in agent.astream_events(inputs, version="v2"):
+            kind = event["event"]
+            node_name = event.get("metadata", {}).get("langgraph_node")
+            
+            
+            if kind == "on_chat_model_stream" and node_name == "generate_response":
+                token = event["data"]["chunk"].content
+                if token:
+                    response_generated = True
+                    answer_parts.append(token)
+                    yield {"type": "token", "content": token}
+            
+            
+            elif kind == "on_chain_start" and event["name"] in TOOL_NODES and event["name"] == node_name \
+                    and any(tag.startswith("graph:step:") for tag in event.get("tags", [])):
+                yield {"type": "retrieval", "status": "started", "node": node_name}
+            
+            
+            # Top-level graph stream carries the per-node state updates
+            elif kind == "on_chain_stream" and not event.get("parent_ids"):
+                for update_node, value in event["data"]["chunk"].items():
+                
+                    if update_node == "analyze_and_route":
+                        tool_choice = value.get("tool_choice", "unknown")
+                        time_sensitive = bool(value.get("time_sensitive"))
+                        run_info["tool_choice"] = tool_choice
+                        yield {"type": "routing", "tool_choice": tool_choice}
+                    
+                    elif update_node in TOOL_NODES:
+                        run_info["tool_runs"] += 1
+                        yield {
+                            "type": "retrieval",
+                            "status": "completed",
+                            "node": update_node,
+                            "rag_documents": len(value.get("rag_documents") or []),
+                            "tavily_results": bool(value.get("tavily_results"))
+                        }
+                    
+                    elif update_node == "validate_and_reason":
+                        yield {"type": "validation", "result": value.get("validation_result")}
+                    
+                    
+                    # Fallback for models that did not stream: emit the whole answer once
+                    elif update_node == "generate_response" and not response_generated:
+                        response = value["messages"][-1]
+                        if response:
+                            response_generated = True
+                            content = response.content if hasattr(response, 'content') else str(response)
+                            answer_parts.append(content)
+                            yield {"type": "token", "content": content}
+        
+        
+        if response_generated:
+            _store_response(query, cache_key, "".join(answer_parts), tool_choice, time_sensitive)
+        else:
+            yield {"type": "token", "content": "Sorry, I couldn't generate a response. Please try again."}
+        yield {"type": "answered", "answered": response_generated}
+    
+    except Exception as e:
+        yield {"type": "error", "error": str(e)}
+        yield {"type": "answered", "answered": False}
+
+
+async def _astream_run(query: str, conversation_history: List[Dict[str, str]] = None, conversation_summary: str = "", session_id: Optional[str] = None) -> AsyncGenerator[Dict[str, Any], None]:
+    """
+    _astream_events with usage tracking and tracing; the final "answered" event carries usage and trace
+    
+    A complete answer is recorded as a session turn inside the (possibly
+    shared) run; a run abandoned by every subscriber records nothing.
+    """
+    start = time.perf_counter()
+    run_info = _new_run_info()
+    answer_parts = []
+    with track_request_usage() as usage, track_request_trace() as trace:
+        async for event in _astream_events(query, conversation_history, conversation_summary, run_info):
+            if event["type"] == "token":
+                answer_parts.append(event["content"])
+            elif event["type"] == "answered":
+                if event["answered"]:
+                    _record_turn(session_id, query, "".join(answer_parts))
+                outcome = _outcome("", event["answered"], usage, run_info, start, trace)
+                event = {**event, "usage": outcome["usage"], "trace": outcome["trace"]}
+            yield event
+
+
+async def astream_agent(query: str, conversation_history: List[Dict[str, str]] = None, session_id: Optional[str] = None, include_usage: bool = False, include_trace: bool = False) -> AsyncGenerator[Dict[str, Any], None]:
+    """
+    Stream typed agent events with token-level output from generate_response
+    
+    Built on the graph's astream_events so LLM tokens are forwarded as the
+    generator produces them instead of after the node has finished.
+    
+    Args:
+        query: User's question
+        conversation_history: Optional conversation context
+        session_id: Optional server-side session holding the conversation
+        include_usage: End with a "usage" event (tokens and estimated cost)
+        include_trace: End with a "trace" event (node path, timings, cache hits, retries)
+    
+    Yields:
+        dict: Events with a "type" of "cache", "routing", "retrieval",
+        "validation", "token", "error", "usage" or "trace"
+    """
+    
+    summary, conversation_history = await _asession_context(session_id, conversation_history)
+    
+    # OPTIMIZED: Concurrent identical queries subscribe to one run; late joiners replay its events so far
+    if COALESCE_QUERIES:
+        events = _stream_fanout.subscribe(
+            _coalesce_key(query, conversation_history, summary, session_id),
+            lambda: _astream_run(query, conversation_history, summary, session_id)
+        )
+    else:
+        events = _astream_run(query, conversation_history, summary, session_id)
+    
+    usage = None
+    trace = None
+    try:
+        async for event in events:
+            if event["type"] == "answered":
+                usage = event["usage"]
+                trace = event["trace"]
+                continue
+            yield event
+    finally:
+        await events.aclose()
+    
+    if include_usage and usage is not None:
+        yield {"type": "usage", "usage": usage}
+    if include_trace and trace is not None:
+        yield {"type": "trace", "trace": trace}
@@ -1,17 +1,37 @@
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
 from pydantic import BaseModel, Field
-from typing import List, Dict, Optional
-from agent import query_agent, stream_agent
+from typing import List, Dict, Any, Optional
+from warmup import run_warmup, warmup_state
+from config import get_settings, configure_tracing, load_env
 import os
 import uvicorn
+import asyncio
 import json
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warm the graph, connection pools and indexes before (or while) serving traffic"""
+    load_env()
+    configure_tracing()
+    warmup_task = None
+    if get_settings().WARMUP_BLOCKING:
+        await run_warmup()
+    else:
+        warmup_task = asyncio.create_task(run_warmup())
+    yield
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
+
+
 app = FastAPI(
     title="Revenue Planning Agent",
     description="AI assistant for revenue planning and marketing strategy",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 
@@ -35,9 +55,46 @@ class ChatRequest(BaseModel):
         default=None,
         description="Previous conversation messages"
     )
+    session_id: Optional[str] = Field(
+        default=None,
+        pattern=r"^[A-Za-z0-9_-]{1,128}$",
+        description="Server-side session; the conversation is kept by the server so history need not be resent"
+    )
+    include_usage: bool = Field(
+        default=False,
+        description="Return token usage and estimated cost (a final 'usage' event on /chat/stream)"
+    )
+    include_trace: bool = Field(
+        default=False,
+        description="Return the request trace: node path and timings, cache hits, retries (Server-Timing header and "
+                    "'trace' field on /chat, a final 'trace' event on /chat/stream)"
+    )
 
 class ChatResponse(BaseModel):
     response: str = Field(..., description="Agent's generated response")
+    session_id: Optional[str] = Field(default=None, description="Session the turn was recorded in")
+    usage: Optional[Dict[str, Any]] = Field(
+        default=None,
+        description="Route, tokens (input/cached/output/embedding), estimated USD cost and per-node breakdown"
+    )
+    trace: Optional[Dict[str, Any]] = Field(
+        default=None,
+        description="Node path with per-node wall time, routing and retry hops, cache hits and external call timings"
+    )
+
+class BatchChatRequest(BaseModel):
+    items: List[ChatRequest] = Field(..., min_length=1, description="Questions to answer, each with optional history/session")
+    concurrency: Optional[int] = Field(default=None, ge=1, description="Concurrent graph runs (defaults to BATCH_CONCURRENCY)")
+
+class BatchChatResult(BaseModel):
+    response: Optional[str] = Field(default=None, description="Agent's generated response")
+    error: Optional[str] = Field(default=None, description="Why this item failed (other items are unaffected)")
+    session_id: Optional[str] = None
+    usage: Optional[Dict[str, Any]] = None
+    trace: Optional[Dict[str, Any]] = None
+
+class BatchChatResponse(BaseModel):
+    results: List[BatchChatResult] = Field(..., description="One result per item, in request order")
 
 class HealthResponse(BaseModel):
     status: str
@@ -49,17 +106,74 @@ class InfoResponse(BaseModel):
     embedding_model: str
     description: str
 
+class StatsResponse(BaseModel):
+    speculation: Dict[str, Any] = Field(
+        default_factory=dict,
+        description="Speculative retrieval counters per tool (launched/used/cancelled/discarded)"
+    )
+    embedding_cache: Dict[str, Any] = Field(
+        default_factory=dict,
+        description="Query-embedding cache size and hit/miss counters"
+    )
+    response_cache: Dict[str, Any] = Field(
+        default_factory=dict,
+        description="Semantic response cache size and hit/miss counters"
+    )
+    tavily_cache: Dict[str, Any] = Field(
+        default_factory=dict,
+        description="Tavily result cache and in-flight deduplication counters"
+    )
+    retrieval: Dict[str, Any] = Field(
+        default_factory=dict,
+        description="Retrieval backend and local index size/freshness"
+    )
+    prerouter: Dict[str, Any] = Field(
+        default_factory=dict,
+        description="Pre-router hit rate and agreement with the LLM router"
+    )
+    validation: Dict[str, Any] = Field(
+        default_factory=dict,
+        description="Deterministic validation outcomes (ambiguous ones go to the LLM validator)"
+    )
+    http_pools: Dict[str, Any] = Field(
+        default_factory=dict,
+        description="Shared HTTP/2 pool settings, request counts, handshakes and open connections per backend"
+    )
+    context_packing: Dict[str, Any] = Field(
+        default_factory=dict,
+        description="Generator context tokens before/after packing, duplicates and overlap removed"
+    )
+    llm_usage: Dict[str, Any] = Field(
+        default_factory=dict,
+        description="Input, cached (prompt-prefix cache) and output tokens and estimated cost per graph node"
+    )
+    route_usage: Dict[str, Any] = Field(
+        default_factory=dict,
+        description="Rolling per-route averages of tokens, estimated cost and latency (e.g. both+retry)"
+    )
+    sessions: Dict[str, Any] = Field(
+        default_factory=dict,
+        description="Server-side session count, rolling summary updates and evictions"
+    )
+    coalescing: Dict[str, Any] = Field(
+        default_factory=dict,
+        description="Identical concurrent queries that attached to an in-flight run (/chat and /chat/stream)"
+    )
+
 
 
 @app.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, http_response: Response):
     """
     Main Agent chat endpoint (Non-streaming)
     
-    Processes user query with optional conversation history and returns complete AI response
+    Processes user query with optional conversation history and returns complete AI response.
+    With include_trace, per-node timings are also sent as Server-Timing headers.
     """
     try:
-       
+        from agent import aquery_agent_with_usage
+        from request_trace import server_timing
+        
         history = None
         if request.conversation_history:
             history = [
@@ -68,13 +182,23 @@ async def chat(request: ChatRequest):
             ]
         
         
-        response = query_agent(
+        result = await aquery_agent_with_usage(
             query=request.query,
-            conversation_history=history
+            conversation_history=history,
+            session_id=request.session_id
         )
         
-        return ChatResponse(response=response)
+        trace = result["trace"] if request.include_trace else None
+        if trace:
+            http_response.headers["Server-Timing"] = server_timing(trace)
         
+        return ChatResponse(
+            response=result["response"],
+            session_id=request.session_id,
+            usage=result["usage"] if request.include_usage else None,
+            trace=trace
+        )
+    
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -82,6 +206,77 @@ async def chat(request: ChatRequest):
         )
 
 
+@app.post("/chat/batch", response_model=BatchChatResponse)
+async def chat_batch(request: BatchChatRequest):
+    """
+    Batch chat endpoint
+    
+    Answers many questions in one request: queries are embedded together,
+    knowledge-base retrieval runs for the whole batch up front and graph runs
+    are bounded by the concurrency limit. Results come back in request order,
+    with an error on the items that failed.
+    """
+    settings = get_settings()
+    if len(request.items) > settings.BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Batch too large: {len(request.items)} items (max {settings.BATCH_MAX_ITEMS})"
+        )
+    
+    try:
+        from agent import abatch_query_agent
+        
+        items = [
+            {
+                "query": item.query,
+                "conversation_history": [
+                    {"role": msg.role, "content": msg.content}
+                    for msg in item.conversation_history
+                ] if item.conversation_history else None,
+                "session_id": item.session_id
+            }
+            for item in request.items
+        ]
+        
+        results = await abatch_query_agent(items, concurrency=request.concurrency or settings.BATCH_CONCURRENCY)
+        
+        return BatchChatResponse(results=[
+            BatchChatResult(
+                response=result.get("response"),
+                error=result.get("error"),
+                session_id=item.session_id,
+                usage=result.get("usage") if item.include_usage else None,
+                trace=result.get("trace") if item.include_trace else None
+            )
+            for item, result in zip(request.items, results)
+        ])
+    
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error processing batch: {str(e)}"
+        )
+
+
+def _format_sse(event: Dict) -> str:
+    """
+    Format an agent event as an SSE frame
+    
+    Tokens and errors go out as default "message" events (keeping the
+    'chunk'/'error' keys existing clients read); routing, retrieval and
+    validation updates are sent as named events.
+    """
+    event_type = event.get("type")
+    
+    if event_type == "token":
+        return f"data: {json.dumps({'type': 'token', 'chunk': event['content']})}\n\n"
+    
+    if event_type == "error":
+        return f"data: {json.dumps({'type': 'error', 'error': event['error']})}\n\n"
+    
+    return f"event: {event_type}\ndata: {json.dumps(event)}\n\n"
+
+
 @app.post("/chat/stream")
 async def chat_stream(request: ChatRequest):
     """
@@ -90,6 +285,11 @@ async def chat_stream(request: ChatRequest):
     Streams AI response in real-time as tokens are generated.
     Use Server-Sent Events (SSE) format for frontend consumption.
     
+    Token deltas arrive as default messages ({"type": "token", "chunk": ...});
+    progress is sent as named "routing", "retrieval" and "validation" events,
+    and a named "usage" event follows the answer when include_usage is set,
+    then a named "trace" event when include_trace is set.
+    
     Example usage with JavaScript:
     ```javascript
     const eventSource = new EventSource('/chat/stream?query=...');
@@ -99,6 +299,8 @@ async def chat_stream(request: ChatRequest):
     ```
     """
     try:
+        from agent import astream_agent
+        
         history = None
         if request.conversation_history:
             history = [
@@ -106,38 +308,44 @@ async def chat_stream(request: ChatRequest):
                 for msg in request.conversation_history
             ]
         
-        def generate():
-            """Generator function for streaming response"""
+        async def generate():
+            """Async generator function for streaming response"""
             stream_gen = None
             try:
-                stream_gen = stream_agent(
+                stream_gen = astream_agent(
                     query=request.query,
-                    conversation_history=history
+                    conversation_history=history,
+                    session_id=request.session_id,
+                    include_usage=request.include_usage,
+                    include_trace=request.include_trace
                 )
                 
-                for chunk in stream_gen:
-                    yield f"data: {json.dumps({'chunk': chunk})}\n\n"
-                
+                async for event in stream_gen:
+                    yield _format_sse(event)
                 
-                yield f"data: {json.dumps({'done': True})}\n\n"
                 
+                done = {'done': True}
+                if request.session_id:
+                    done['session_id'] = request.session_id
+                yield f"data: {json.dumps(done)}\n\n"
+            
             except GeneratorExit:
-                
+            
                 if stream_gen:
                     try:
-                        stream_gen.close()
+                        await stream_gen.aclose()
                     except:
                         pass
                 raise
-                
+            
             except Exception as e:
                 yield f"data: {json.dumps({'error': str(e)})}\n\n"
-                
+            
             finally:
-                
+            
                 if stream_gen:
                     try:
-                        stream_gen.close()
+                        await stream_gen.aclose()
                     except:
                         pass
         
@@ -150,7 +358,7 @@ async def chat_stream(request: ChatRequest):
                 "X-Accel-Buffering": "no"
             }
         )
-        
+    
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -166,7 +374,7 @@ async def health():
     Returns service status
     """
     try:
-       
+    
         return HealthResponse(
             status="ok",
             message="Agent is running"
@@ -178,6 +386,99 @@ async def health():
         )
 
 
+@app.get("/ready")
+async def ready():
+    """
+    Readiness endpoint
+    
+    503 until the startup warm-up has finished; reports per-step timings either way
+    """
+    snapshot = warmup_state.snapshot()
+    return JSONResponse(status_code=200 if snapshot["ready"] else 503, content=snapshot)
+
+
+@app.get("/stats", response_model=StatsResponse)
+async def stats():
+    """
+    Runtime statistics endpoint
+    
+    Reports in-process counters used to tune latency optimizations
+    """
+    from speculation import speculation_stats
+    from cache import get_embedding_cache
+    from response_cache import get_response_cache
+    from tools_setup import get_tavily_cache_stats
+    from supabase_vectorstore import get_vectorstore
+    from prerouter import get_prerouter_stats
+    from validation import validation_stats
+    from clients import get_pool_stats
+    from usage import usage_recorder, route_usage_stats
+    from context_packer import packing_stats
+    from sessions import get_session_store
+    from agent import get_coalescing_stats
+    
+    return StatsResponse(
+        speculation=speculation_stats.snapshot(),
+        embedding_cache=get_embedding_cache().stats(),
+        response_cache=get_response_cache().stats(),
+        tavily_cache=get_tavily_cache_stats(),
+        retrieval=get_vectorstore().retrieval_stats(),
+        prerouter=get_prerouter_stats(),
+        validation=validation_stats.snapshot(),
+        http_pools=get_pool_stats(),
+        context_packing=packing_stats.snapshot(),
+        llm_usage=usage_recorder.snapshot(),
+        route_usage=route_usage_stats.snapshot(),
+        sessions=get_session_store().stats(),
+        coalescing=get_coalescing_stats()
+    )
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """
+    Prometheus metrics endpoint
+    
+    Node and external-call latency histograms, LLM call latency per node,
+    route/validation decision counters and error counters
+    """
+    from metrics import render
+    
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.post("/cache/invalidate")
+async def invalidate_cache():
+    """
+    Drop all cached answers
+    
+    Call after re-ingesting the knowledge base so stale answers are not served
+    """
+    from response_cache import get_response_cache
+    
+    response_cache = get_response_cache()
+    response_cache.invalidate()
+    return {
+        "status": "ok",
+        "response_cache": response_cache.stats()
+    }
+
+
+@app.delete("/sessions/{session_id}")
+async def delete_session(session_id: str):
+    """
+    Forget a server-side session
+    
+    Removes it from memory and from the persistent backend, if one is configured
+    """
+    from sessions import get_session_store, valid_session_id
+    
+    if not valid_session_id(session_id):
+        raise HTTPException(status_code=400, detail="Invalid session_id")
+    get_session_store().delete(session_id)
+    return {"status": "ok", "session_id": session_id}
+
+
 @app.get("/info", response_model=InfoResponse)
 @app.get("/version", response_model=InfoResponse)
 async def info():
@@ -201,7 +502,10 @@ async def root():
         "version": "1.0.0",
         "docs": "/docs",
         "health": "/health",
-        "info": "/info"
+        "ready": "/ready",
+        "info": "/info",
+        "stats": "/stats",
+        "metrics": "/metrics"
     }
 
 
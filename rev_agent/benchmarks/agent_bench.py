@@ -0,0 +1,178 @@
+"""
+Offline latency benchmark for the compiled agent graph
+
+    python benchmarks/agent_bench.py                        # 350 requests, 16 concurrent
+    python benchmarks/agent_bench.py --requests 2000 --concurrency 64
+    python benchmarks/agent_bench.py --llm-latency 0.3 --tavily-latency 0.8 --json > bench.json
+
+Runs the real graph from graph.create_graph with the stand-ins in
+benchmarks/stubs.py for OpenAI, Supabase and Tavily, so it needs no network
+or API keys. Each request is labelled with the path it actually took (the
+router decision plus any validation retries) and latency percentiles and
+throughput are reported per path. Upstream caches are disabled unless
+--warm-caches is given, so every request pays the modelled upstream cost.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import math
+import random
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+
+from stubs import build_stubs, build_workload, configure_offline_environment
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def _observed_route(updates: List[Tuple[str, Dict[str, Any]]]) -> str:
+    """Path label from the node updates of one run, e.g. use_rag+try_tavily+generate_llm"""
+    parts = []
+    verdict = None
+    tool_nodes = 0
+    for node, values in updates:
+        values = values or {}
+        if node == "analyze_and_route":
+            parts.append(f"use_{values.get('tool_choice')}")
+        elif node.startswith("execute_"):
+            tool_nodes += 1
+            if tool_nodes > 1:
+                parts.append("try_rag" if node == "execute_rag_tool" else "try_tavily")
+        elif node == "validate_and_reason":
+            verdict = values.get("validation_result")
+    if verdict == "insufficient":
+        parts.append("generate_llm")
+    return "+".join(parts)
+
+
+async def _run_one(graph, query: str) -> Tuple[str, float]:
+    from agent import _build_inputs
+    
+    start = time.perf_counter()
+    updates = []
+    async for update in graph.astream(_build_inputs(query), stream_mode="updates"):
+        updates.extend(update.items())
+    return _observed_route(updates), time.perf_counter() - start
+
+
+async def run(graph, queries: List[str], concurrency: int) -> Tuple[List[Tuple[str, str, float]], float]:
+    """Closed-loop run: `concurrency` workers drain the query list; returns (query, route, seconds) and wall time"""
+    pending = list(queries)
+    samples = []
+    
+    async def worker():
+        while pending:
+            query = pending.pop()
+            route, seconds = await _run_one(graph, query)
+            samples.append((query, route, seconds))
+    
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples, time.perf_counter() - start
+
+
+def summarize(samples: List[Tuple[str, str, float]], wall_seconds: float, scenarios: Dict[str, Any]) -> Dict[str, Any]:
+    """Latency percentiles (ms) and throughput overall and per observed route"""
+    def stats(latencies: List[float]) -> Dict[str, Any]:
+        return {
+            "requests": len(latencies),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+            "mean_ms": round(sum(latencies) / len(latencies) * 1000, 1),
+            "throughput_rps": round(len(latencies) / wall_seconds, 2)
+        }
+    
+    by_route: Dict[str, List[float]] = {}
+    for _, route, seconds in samples:
+        by_route.setdefault(route, []).append(seconds)
+    
+    return {
+        "wall_seconds": round(wall_seconds, 3),
+        "overall": stats([seconds for _, _, seconds in samples]),
+        "routes": {route: stats(by_route[route]) for route in sorted(by_route)},
+        # Requests whose path differed from their scenario; non-zero means the graph's routing changed
+        "unexpected_routes": sum(1 for query, route, _ in samples if route != scenarios[query].route)
+    }
+
+
+def benchmark(args) -> Dict[str, Any]:
+    """Build the stand-ins and the graph, run the warm-up and the measured requests"""
+    configure_offline_environment(args.warm_caches)
+    from graph import create_graph
+    
+    scenarios = build_workload()
+    stubs = build_stubs(
+        scenarios,
+        llm_latency=args.llm_latency,
+        token_delay=args.token_delay,
+        embedding_latency=args.embedding_latency,
+        supabase_latency=args.supabase_latency,
+        tavily_latency=args.tavily_latency,
+        jitter=args.jitter,
+        seed=args.seed
+    )
+    graph = create_graph(llm=stubs["llm"], retriever=stubs["retriever"], tavily_tool=stubs["tavily_tool"])
+    
+    # Every route equally often, in a seeded shuffle
+    rng = random.Random(args.seed)
+    pool = list(scenarios)
+    queries = [pool[index % len(pool)] for index in range(args.requests)]
+    rng.shuffle(queries)
+    warmup = [rng.choice(pool) for _ in range(args.warmup)]
+    
+    async def session():
+        await run(graph, warmup, args.concurrency)
+        return await run(graph, queries, args.concurrency)
+    
+    samples, wall_seconds = asyncio.run(session())
+    result = summarize(samples, wall_seconds, scenarios)
+    result["config"] = {key: value for key, value in vars(args).items() if key != "json"}
+    return result
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the compiled agent graph against offline stand-ins")
+    parser.add_argument("--requests", type=int, default=350)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=20, help="Unrecorded requests run first")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Seconds per chat call (to first token when streaming)")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="Seconds per generated token after the first")
+    parser.add_argument("--embedding-latency", type=float, default=0.02)
+    parser.add_argument("--supabase-latency", type=float, default=0.02)
+    parser.add_argument("--tavily-latency", type=float, default=0.1)
+    parser.add_argument("--jitter", type=float, default=0.2, help="Uniform +/- fraction applied to each latency")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--warm-caches", action="store_true", help="Keep the embedding and Tavily caches enabled")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args(argv)
+    
+    # The app reports problems with print; keep stdout clean for --json
+    with contextlib.redirect_stdout(sys.stderr):
+        result = benchmark(args)
+    
+    # A path mismatch means the stand-ins no longer exercise the routes they claim to
+    status = 1 if result["unexpected_routes"] else 0
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return status
+    
+    print(f"{args.requests} requests, {args.concurrency} concurrent, {result['wall_seconds']} s "
+          f"({result['overall']['throughput_rps']} req/s)")
+    print(f"{'route':<34}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>9}")
+    for route, stats in list(result["routes"].items()) + [("overall", result["overall"])]:
+        print(f"{route:<34}{stats['requests']:>6}{stats['p50_ms']:>10}{stats['p95_ms']:>10}"
+              f"{stats['p99_ms']:>10}{stats['throughput_rps']:>9}")
+    if result["unexpected_routes"]:
+        print(f"[WARNING] {result['unexpected_routes']} requests took a different path than their scenario")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
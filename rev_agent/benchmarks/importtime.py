@@ -0,0 +1,88 @@
+"""
+Import-time benchmark for the serving entry point
+
+    python benchmarks/importtime.py                 # api, agent, config
+    python benchmarks/importtime.py api --top 15
+    python benchmarks/importtime.py --json > importtime.json
+
+Each module is imported in a fresh interpreter with ``-X importtime`` so
+numbers reflect a cold container start, not a warm module cache.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List
+
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_MODULES = ["config", "api", "agent"]
+
+
+def _run_once(module: str) -> Dict[str, int]:
+    """Cumulative import time (microseconds) per module for one cold import"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=APP_DIR,
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    
+    cumulative: Dict[str, int] = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line.split("|", 2)
+        cumulative[name.strip()] = int(cumulative_us)
+    return cumulative
+
+
+def measure(module: str, repeat: int, top: int) -> Dict[str, object]:
+    """Median total import time over repeat runs, plus the heaviest top-level imports"""
+    runs = [_run_once(module) for _ in range(repeat)]
+    totals = [run.get(module, 0) for run in runs]
+    last = runs[-1]
+    
+    heaviest = sorted(
+        ((name, us) for name, us in last.items() if name != module and "." not in name),
+        key=lambda item: item[1],
+        reverse=True
+    )[:top]
+    
+    return {
+        "module": module,
+        "median_ms": round(statistics.median(totals) / 1000, 1),
+        "min_ms": round(min(totals) / 1000, 1),
+        "modules_loaded": len(last),
+        "heaviest": [{"module": name, "ms": round(us / 1000, 1)} for name, us in heaviest]
+    }
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure cold import time of the serving modules")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=8, help="Heaviest top-level packages to list")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args(argv)
+    
+    results = [measure(module, args.repeat, args.top) for module in args.modules]
+    
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+    
+    for result in results:
+        print(f"import {result['module']}: {result['median_ms']} ms median "
+              f"(min {result['min_ms']} ms, {result['modules_loaded']} modules)")
+        for entry in result["heaviest"]:
+            print(f"    {entry['ms']:>8.1f} ms  {entry['module']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
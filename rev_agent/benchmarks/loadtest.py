@@ -0,0 +1,425 @@
+"""
+HTTP load test for api.app with stubbed upstreams
+
+    python benchmarks/loadtest.py run                                  # /chat + /chat/stream at 5,10,20,40 req/s
+    python benchmarks/loadtest.py run --endpoint stream --rates 10,50,100 --token-delay 0.02
+    python benchmarks/loadtest.py run --llm-latency 0.4 --json > base.json
+    python benchmarks/loadtest.py compare base.json new.json
+
+Starts the unmodified api.app under uvicorn in a child process whose OpenAI,
+Supabase and Tavily clients are the stand-ins from benchmarks/stubs.py, with
+injectable latency. Requests are offered open-loop: arrivals follow the
+target rate whether or not earlier requests have finished, so queueing shows
+up as latency instead of quietly lowering the offered load. Each rate stage
+reports throughput, latency percentiles, SSE time to first byte and first
+token, peak in-flight requests and the server's event-loop lag.
+
+The highest rate meeting --slo-p95-ms without errors, and the in-flight
+requests at that rate, are the measured inputs for Cloud Run's
+--concurrency (in-flight per instance) and --max-instances (peak traffic
+divided by that rate).
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from agent_bench import percentile
+from stubs import APP_DIR, build_stubs, build_workload, configure_offline_environment, install_stubs
+
+
+LAG_PATH = "/_loadtest/loop-lag"
+LATENCY_ARGS = ("llm_latency", "token_delay", "embedding_latency", "supabase_latency", "tavily_latency", "jitter", "seed")
+
+
+def _distribution(seconds: List[float]) -> Optional[Dict[str, float]]:
+    """p50/p95/p99/max in milliseconds, or None without samples"""
+    if not seconds:
+        return None
+    return {
+        "p50": round(percentile(seconds, 50) * 1000, 1),
+        "p95": round(percentile(seconds, 95) * 1000, 1),
+        "p99": round(percentile(seconds, 99) * 1000, 1),
+        "max": round(max(seconds) * 1000, 1)
+    }
+
+
+class LoopLagMonitor:
+    """Samples how late the event loop wakes a sleeping task; lag means callbacks are blocking the loop"""
+    
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.samples: List[float] = []
+        self._task = None
+    
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+    
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(time.perf_counter() - start - self.interval)
+    
+    async def report(self) -> Dict[str, Any]:
+        """Lag since the previous report (route handler on the server under test)"""
+        samples, self.samples = self.samples, []
+        return {"samples": len(samples), "lag_ms": _distribution(samples)}
+
+
+def serve(args) -> int:
+    """Child process: api.app on the stand-ins, plus the loop-lag route"""
+    configure_offline_environment(args.warm_caches)
+    stubs = build_stubs(build_workload(), **{name: getattr(args, name) for name in LATENCY_ARGS})
+    install_stubs(stubs)
+    
+    import uvicorn
+    from api import app
+    
+    monitor = LoopLagMonitor(args.lag_interval)
+    app.add_api_route(LAG_PATH, monitor.report, methods=["GET"], include_in_schema=False)
+    config = uvicorn.Config(
+        app,
+        host="127.0.0.1",
+        port=args.port,
+        log_level="warning",
+        access_log=False,
+        limit_concurrency=args.server_concurrency
+    )
+    server = uvicorn.Server(config)
+    config.setup_event_loop()
+    
+    async def main():
+        monitor.start()
+        await server.serve()
+    
+    asyncio.run(main())
+    return 0
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(args) -> subprocess.Popen:
+    """Launch the stubbed server and wait until /ready reports the warm-up finished"""
+    command = [sys.executable, os.path.abspath(__file__), "serve", "--port", str(args.port),
+               "--lag-interval", str(args.lag_interval)]
+    for name in LATENCY_ARGS:
+        command += [f"--{name.replace('_', '-')}", str(getattr(args, name))]
+    if args.server_concurrency:
+        command += ["--server-concurrency", str(args.server_concurrency)]
+    if args.warm_caches:
+        command.append("--warm-caches")
+    
+    log = open(args.server_log, "w") if args.server_log else subprocess.DEVNULL
+    process = subprocess.Popen(command, cwd=APP_DIR, stdout=log, stderr=subprocess.STDOUT)
+    
+    deadline = time.monotonic() + args.startup_timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode} (see --server-log)")
+        try:
+            if httpx.get(f"http://127.0.0.1:{args.port}/ready", timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"Server not ready after {args.startup_timeout}s")
+
+
+async def _chat(client: httpx.AsyncClient, query: str, record: Dict[str, Any]):
+    response = await client.post("/chat", json={"query": query})
+    record["ok"] = response.status_code == 200
+    record["status"] = response.status_code
+
+
+async def _chat_stream(client: httpx.AsyncClient, query: str, record: Dict[str, Any]):
+    async with client.stream("POST", "/chat/stream", json={"query": query}) as response:
+        record["status"] = response.status_code
+        if response.status_code != 200:
+            return
+        async for line in response.aiter_lines():
+            if not line:
+                continue
+            if "ttfb" not in record:
+                record["ttfb"] = time.perf_counter() - record["start"]
+            if not line.startswith("data: "):
+                continue
+            data = json.loads(line[len("data: "):])
+            if data.get("type") == "token" and "ttfc" not in record:
+                record["ttfc"] = time.perf_counter() - record["start"]
+            elif "error" in data:
+                return
+            elif data.get("done"):
+                record["ok"] = True
+
+
+async def run_stage(client: httpx.AsyncClient, rate: float, args, queries: List[str], rng: random.Random) -> Dict[str, Any]:
+    """Offer `rate` requests/s for args.duration seconds and wait for the stragglers"""
+    records: List[Dict[str, Any]] = []
+    tasks = []
+    in_flight = peak_in_flight = 0
+    max_slip = 0.0
+    
+    async def fire(endpoint: str, query: str):
+        nonlocal in_flight, peak_in_flight
+        record = {"endpoint": endpoint, "ok": False, "start": time.perf_counter()}
+        records.append(record)
+        in_flight += 1
+        peak_in_flight = max(peak_in_flight, in_flight)
+        try:
+            await (_chat(client, query, record) if endpoint == "chat" else _chat_stream(client, query, record))
+        except Exception as e:
+            record["error"] = type(e).__name__
+        finally:
+            record["end"] = time.perf_counter()
+            in_flight -= 1
+    
+    await client.get(LAG_PATH)
+    start = time.perf_counter()
+    scheduled = start
+    while scheduled - start < args.duration:
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        # Late sends mean the load generator, not the server, is the bottleneck
+        max_slip = max(max_slip, time.perf_counter() - scheduled)
+        endpoint = args.endpoint if args.endpoint != "mixed" else rng.choice(("chat", "stream"))
+        tasks.append(asyncio.ensure_future(fire(endpoint, rng.choice(queries))))
+        scheduled += rng.expovariate(rate) if args.poisson else 1 / rate
+    
+    await asyncio.gather(*tasks)
+    elapsed = max(record["end"] for record in records) - start if records else args.duration
+    lag = (await client.get(LAG_PATH)).json()
+    
+    endpoints = {}
+    for endpoint in sorted({record["endpoint"] for record in records}):
+        mine = [record for record in records if record["endpoint"] == endpoint]
+        ok = [record for record in mine if record["ok"]]
+        entry = {
+            "sent": len(mine),
+            "ok": len(ok),
+            "errors": len(mine) - len(ok),
+            "throughput_rps": round(len(ok) / elapsed, 2),
+            "latency_ms": _distribution([record["end"] - record["start"] for record in ok])
+        }
+        if endpoint == "stream":
+            entry["ttfb_ms"] = _distribution([record["ttfb"] for record in ok if "ttfb" in record])
+            entry["ttfc_ms"] = _distribution([record["ttfc"] for record in ok if "ttfc" in record])
+        endpoints[endpoint] = entry
+    
+    return {
+        "rate": rate,
+        "sent": len(records),
+        "offered_rps": round(len(records) / args.duration, 2),
+        "elapsed_s": round(elapsed, 2),
+        "peak_in_flight": peak_in_flight,
+        "max_send_slip_ms": round(max_slip * 1000, 1),
+        "loop_lag_ms": lag["lag_ms"],
+        "endpoints": endpoints
+    }
+
+
+def _sustainable(stages: List[Dict[str, Any]], slo_p95_ms: float) -> Dict[str, Any]:
+    """Highest stage with no errors whose p95 latency (every endpoint) is within the SLO"""
+    best = None
+    for stage in stages:
+        entries = stage["endpoints"].values()
+        if all(entry["errors"] == 0 and entry["latency_ms"] and entry["latency_ms"]["p95"] <= slo_p95_ms for entry in entries):
+            if best is None or stage["rate"] > best["rate"]:
+                best = stage
+    return {
+        "slo_p95_ms": slo_p95_ms,
+        "rate": best["rate"] if best else None,
+        "peak_in_flight": best["peak_in_flight"] if best else None
+    }
+
+
+async def drive(args) -> Dict[str, Any]:
+    queries = list(build_workload())
+    rng = random.Random(args.seed)
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    stages = []
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=args.timeout, limits=limits) as client:
+        for rate in args.rates:
+            stages.append(await run_stage(client, rate, args, queries, rng))
+            if not args.json:
+                _print_stage(stages[-1])
+            await asyncio.sleep(args.cooldown)
+    return {
+        "config": {key: value for key, value in vars(args).items() if key not in ("command", "json", "server_log")},
+        "stages": stages,
+        "sustainable": _sustainable(stages, args.slo_p95_ms)
+    }
+
+
+def _ms(distribution: Optional[Dict[str, float]], key: str) -> str:
+    return f"{distribution[key]:.0f}" if distribution else "-"
+
+
+def _print_stage(stage: Dict[str, Any]):
+    lag = stage["loop_lag_ms"]
+    print(f"rate {stage['rate']:g}/s: {stage['sent']} sent, peak {stage['peak_in_flight']} in flight, "
+          f"loop lag p99 {_ms(lag, 'p99')} ms (max {_ms(lag, 'max')}), send slip {stage['max_send_slip_ms']} ms")
+    for endpoint, entry in stage["endpoints"].items():
+        line = (f"    {endpoint:<7}{entry['ok']:>6} ok{entry['errors']:>5} err{entry['throughput_rps']:>9} req/s   "
+                f"p50 {_ms(entry['latency_ms'], 'p50')}  p95 {_ms(entry['latency_ms'], 'p95')}  "
+                f"p99 {_ms(entry['latency_ms'], 'p99')} ms")
+        if endpoint == "stream":
+            line += f"   ttfb p95 {_ms(entry['ttfb_ms'], 'p95')}  first token p50 {_ms(entry['ttfc_ms'], 'p50')} p95 {_ms(entry['ttfc_ms'], 'p95')} ms"
+        print(line)
+
+
+def run(args) -> int:
+    args.port = args.port or _free_port()
+    process = start_server(args)
+    try:
+        result = asyncio.run(drive(args))
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+    
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return 0
+    sustainable = result["sustainable"]
+    if sustainable["rate"] is None:
+        print(f"No stage met p95 <= {args.slo_p95_ms:g} ms without errors")
+    else:
+        print(f"Sustainable: {sustainable['rate']:g} req/s at p95 <= {args.slo_p95_ms:g} ms "
+              f"with {sustainable['peak_in_flight']} requests in flight")
+    return 0
+
+
+# (label, path into an endpoint entry or the stage, lower is better)
+COMPARED_METRICS = [
+    ("throughput req/s", ("throughput_rps",), False),
+    ("latency p50 ms", ("latency_ms", "p50"), True),
+    ("latency p95 ms", ("latency_ms", "p95"), True),
+    ("latency p99 ms", ("latency_ms", "p99"), True),
+    ("first token p50 ms", ("ttfc_ms", "p50"), True),
+    ("first token p95 ms", ("ttfc_ms", "p95"), True),
+    ("errors", ("errors",), True)
+]
+
+
+def _lookup(entry: Optional[Dict[str, Any]], path: tuple) -> Optional[float]:
+    for key in path:
+        if not isinstance(entry, dict):
+            return None
+        entry = entry.get(key)
+    return entry
+
+
+def compare_results(base: Dict[str, Any], new: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Metric-by-metric changes for every (rate, endpoint) present in both runs"""
+    new_stages = {stage["rate"]: stage for stage in new["stages"]}
+    rows = []
+    for base_stage in base["stages"]:
+        new_stage = new_stages.get(base_stage["rate"])
+        if new_stage is None:
+            continue
+        pairs = [("loop lag p99 ms", base_stage["loop_lag_ms"], new_stage["loop_lag_ms"], ("p99",), True, "server")]
+        for endpoint, base_entry in base_stage["endpoints"].items():
+            new_entry = new_stage["endpoints"].get(endpoint)
+            for label, path, lower_is_better in COMPARED_METRICS:
+                pairs.append((label, base_entry, new_entry, path, lower_is_better, endpoint))
+        for label, base_entry, new_entry, path, lower_is_better, endpoint in pairs:
+            before, after = _lookup(base_entry, path), _lookup(new_entry, path)
+            if before is None or after is None:
+                continue
+            change = round((after - before) / before * 100, 1) if before else None
+            rows.append({
+                "rate": base_stage["rate"],
+                "endpoint": endpoint,
+                "metric": label,
+                "base": before,
+                "new": after,
+                "change_pct": change,
+                "better": after < before if lower_is_better else after > before
+            })
+    return rows
+
+
+def compare(args) -> int:
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    rows = compare_results(base, new)
+    sustainable = {"base": base["sustainable"], "new": new["sustainable"]}
+    
+    if args.json:
+        print(json.dumps({"rows": rows, "sustainable": sustainable}, indent=2))
+        return 0
+    
+    print(f"{'rate':>6}  {'endpoint':<10}{'metric':<20}{'base':>10}{'new':>10}{'change':>10}")
+    for row in rows:
+        change = f"{row['change_pct']:+.1f}%" if row["change_pct"] is not None else "-"
+        marker = "" if row["base"] == row["new"] else ("  better" if row["better"] else "  worse")
+        print(f"{row['rate']:>6g}  {row['endpoint']:<10}{row['metric']:<20}{row['base']:>10g}{row['new']:>10g}{change:>10}{marker}")
+    print(f"Sustainable rate: {sustainable['base']['rate']} -> {sustainable['new']['rate']} req/s "
+          f"(p95 <= {sustainable['new']['slo_p95_ms']:g} ms)")
+    return 0
+
+
+def _add_upstream_args(parser: argparse.ArgumentParser):
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="Seconds per chat call (to first token when streaming)")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="Seconds per generated token after the first")
+    parser.add_argument("--embedding-latency", type=float, default=0.05)
+    parser.add_argument("--supabase-latency", type=float, default=0.05)
+    parser.add_argument("--tavily-latency", type=float, default=0.5)
+    parser.add_argument("--jitter", type=float, default=0.2, help="Uniform +/- fraction applied to each latency")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--warm-caches", action="store_true", help="Keep the embedding, Tavily and response caches enabled")
+    parser.add_argument("--server-concurrency", type=int, default=None,
+                        help="uvicorn limit_concurrency (503 beyond it), like Cloud Run's --concurrency")
+    parser.add_argument("--lag-interval", type=float, default=0.01, help="Event-loop lag sampling interval (s)")
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load-test the API with stubbed upstreams")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    run_parser = commands.add_parser("run", help="Start a stubbed server and drive open-loop load")
+    run_parser.add_argument("--rates", type=lambda value: [float(rate) for rate in value.split(",")], default=[5, 10, 20, 40],
+                            help="Comma-separated request rates (req/s), one stage each")
+    run_parser.add_argument("--duration", type=float, default=15, help="Seconds of arrivals per stage")
+    run_parser.add_argument("--endpoint", choices=["chat", "stream", "mixed"], default="mixed")
+    run_parser.add_argument("--poisson", action="store_true", help="Exponential inter-arrival times instead of a fixed interval")
+    run_parser.add_argument("--timeout", type=float, default=60, help="Per-request timeout (s)")
+    run_parser.add_argument("--cooldown", type=float, default=2, help="Pause between stages (s)")
+    run_parser.add_argument("--slo-p95-ms", type=float, default=2000)
+    run_parser.add_argument("--port", type=int, default=0, help="Server port (default: a free one)")
+    run_parser.add_argument("--startup-timeout", type=float, default=60)
+    run_parser.add_argument("--server-log", default=None, help="File for the server's output")
+    run_parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    _add_upstream_args(run_parser)
+    
+    serve_parser = commands.add_parser("serve", help="Only run the stubbed server (started by 'run')")
+    serve_parser.add_argument("--port", type=int, required=True)
+    _add_upstream_args(serve_parser)
+    
+    compare_parser = commands.add_parser("compare", help="Compare two 'run --json' results")
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    
+    args = parser.parse_args(argv)
+    return {"run": run, "serve": serve, "compare": compare}[args.command](args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,447 @@
+"""
+Offline stand-ins for the agent's upstreams (OpenAI, Supabase, Tavily)
+
+Shared by the benchmarks so the real graph runs on a plain Linux box with
+no network or API keys. Each stand-in waits for a modelled latency (base
+delay with seeded jitter), so timings are the agent's own overhead plus a
+known upstream cost.
+
+App modules are imported inside the functions that need them: settings are
+read on first use, so configure_offline_environment must run first.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import httpx
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EMBEDDING_DIM = 1536
+_WORD = re.compile(r"[a-z0-9]+")
+_QUESTION = re.compile(r"User query: (.*)")
+
+
+class Latency:
+    """Upstream latency model: base seconds with uniform +/- jitter (a fraction of base)"""
+    
+    def __init__(self, seconds: float, jitter: float = 0.0, seed: int = 0):
+        self.seconds = seconds
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+    
+    def sample(self) -> float:
+        if self.seconds <= 0:
+            return 0.0
+        with self._lock:
+            spread = self._random.uniform(-self.jitter, self.jitter)
+        return max(0.0, self.seconds * (1 + spread))
+    
+    def sleep(self):
+        delay = self.sample()
+        if delay:
+            time.sleep(delay)
+    
+    async def asleep(self):
+        delay = self.sample()
+        if delay:
+            await asyncio.sleep(delay)
+
+
+@dataclass
+class Scenario:
+    """How the stand-ins answer one query"""
+    route: str                  # path the query is expected to take, e.g. "use_rag+try_tavily"
+    tool_choice: str            # router decision
+    web_results: int = 3        # Tavily results returned (0 makes web search come back weak)
+
+
+DEFAULT_SCENARIO = Scenario(route="use_none", tool_choice="none")
+
+# Knowledge base topics; queries naming one retrieve it strongly, queries naming none retrieve nothing
+TOPICS = [
+    "customer acquisition cost payback",
+    "lifetime value cohort analysis",
+    "marketing qualified lead conversion",
+    "pipeline coverage ratio",
+    "channel budget allocation",
+    "annual recurring revenue forecasting",
+    "sales marketing alignment",
+    "kpi dashboard design"
+]
+OFF_TOPIC = [
+    "solar eclipse viewing",
+    "sourdough starter hydration",
+    "marathon tapering schedule",
+    "volcano eruption forecast"
+]
+
+# Path label -> (router decision, query names a topic, Tavily results)
+ROUTES = {
+    "use_rag": ("rag", True, 3),
+    "use_tavily": ("tavily", False, 3),
+    "use_both": ("both", True, 3),
+    "use_none": ("none", False, 0),
+    "use_rag+try_tavily": ("rag", False, 3),
+    "use_tavily+try_rag": ("tavily", True, 0),
+    "use_rag+try_tavily+generate_llm": ("rag", False, 0)
+}
+
+
+def build_workload() -> Dict[str, Scenario]:
+    """Scenario per benchmark query, a few phrasings per route"""
+    scenarios = {}
+    for label, (tool_choice, on_topic, web_results) in ROUTES.items():
+        subjects = TOPICS if on_topic else OFF_TOPIC
+        for index, subject in enumerate(subjects[:4]):
+            query = f"Please explain {subject} for {label.replace('_', ' ').replace('+', ' then ')} variant {index}"
+            scenarios[query] = Scenario(route=label, tool_choice=tool_choice, web_results=web_results)
+    return scenarios
+
+
+def configure_offline_environment(warm_caches: bool = False):
+    """Settings for running without upstreams; must run before the app modules load"""
+    if APP_DIR not in sys.path:
+        sys.path.insert(0, APP_DIR)
+    from config import load_env
+    
+    # .env as the app entry points load it; the offline overrides below are assigned over it
+    load_env()
+    os.environ.setdefault("TAVILY_API_KEY", "benchmark")
+    # The pre-router and the local/hybrid indexes would need live OpenAI or Supabase table reads
+    os.environ["PREROUTER_ENABLED"] = "false"
+    os.environ["RETRIEVAL_BACKEND"] = "remote"
+    os.environ["HYBRID_RETRIEVAL"] = "false"
+    if not warm_caches:
+        # Every request pays the modelled upstream cost
+        for name in ("EMBEDDING_CACHE_SIZE", "TAVILY_CACHE_SIZE", "RESPONSE_CACHE_SIZE"):
+            os.environ[name] = "0"
+        os.environ["RESPONSE_CACHE_ENABLED"] = "false"
+        os.environ["COALESCE_QUERIES"] = "false"
+
+
+def hashed_embedding(text: str, dim: int = EMBEDDING_DIM) -> np.ndarray:
+    """Unit bag-of-words vector: texts sharing words have proportionally similar embeddings"""
+    vector = np.zeros(dim)
+    for word in _WORD.findall(text.lower()):
+        vector[int(hashlib.md5(word.encode()).hexdigest()[:8], 16) % dim] += 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class FakeEmbeddings(Embeddings):
+    """Embeddings stand-in: one modelled round trip per call, hashed bag-of-words vectors"""
+    
+    def __init__(self, latency: Latency, dim: int = EMBEDDING_DIM):
+        self.latency = latency
+        self.dim = dim
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.latency.sleep()
+        return [hashed_embedding(text, self.dim).tolist() for text in texts]
+    
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+    
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        await self.latency.asleep()
+        return [hashed_embedding(text, self.dim).tolist() for text in texts]
+    
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+
+def make_rag_rows(topics: List[str], dim: int = EMBEDDING_DIM) -> List[Dict[str, Any]]:
+    """
+    One playbook-sized chunk per topic, embedded from the topic alone
+    
+    A query naming a topic therefore scores well above the validation
+    thresholds, and one sharing no words with any topic matches nothing.
+    """
+    rows = []
+    for index, topic in enumerate(topics):
+        content = f"{topic}. " + " ".join(
+            f"Section {n} of the playbook covers {topic} with worked examples, benchmarks and targets."
+            for n in range(1, 6)
+        )
+        rows.append({
+            "id": f"bench-{index}",
+            "content": content,
+            "metadata": {"source": "benchmark", "topic": topic},
+            "embedding": hashed_embedding(topic, dim)
+        })
+    return rows
+
+
+class InMemoryRagTable:
+    """The match_rag_table function over an in-memory rag_table (cosine similarity, like pgvector)"""
+    
+    def __init__(self, rows: List[Dict[str, Any]]):
+        self.rows = rows
+        self._matrix = np.array([row["embedding"] for row in rows]) if rows else np.zeros((0, EMBEDDING_DIM))
+    
+    def match(self, query_embedding: List[float], match_threshold: float, match_count: int) -> List[Dict[str, Any]]:
+        if not self.rows:
+            return []
+        query = np.asarray(query_embedding, dtype=float)
+        norm = np.linalg.norm(query)
+        if not norm:
+            return []
+        similarities = self._matrix @ (query / norm)
+        matches = []
+        for index in np.argsort(-similarities)[:match_count]:
+            if similarities[index] <= match_threshold:
+                break
+            row = self.rows[index]
+            matches.append({
+                "id": row["id"],
+                "content": row["content"],
+                "metadata": row["metadata"],
+                "similarity": float(similarities[index])
+            })
+        return matches
+
+
+class _RpcResult:
+    def __init__(self, data: List[Dict[str, Any]]):
+        self.data = data
+
+
+class _Rpc:
+    def __init__(self, table: InMemoryRagTable, latency: Latency, params: Dict[str, Any]):
+        self.table = table
+        self.latency = latency
+        self.params = params
+    
+    def _result(self) -> _RpcResult:
+        return _RpcResult(self.table.match(**self.params))
+
+
+class _SyncRpc(_Rpc):
+    def execute(self) -> _RpcResult:
+        self.latency.sleep()
+        return self._result()
+
+
+class _AsyncRpc(_Rpc):
+    async def execute(self) -> _RpcResult:
+        await self.latency.asleep()
+        return self._result()
+
+
+class FakeSupabase:
+    """Supabase client stand-in serving only the match_rag_table RPC"""
+    
+    def __init__(self, table: InMemoryRagTable, latency: Latency, asynchronous: bool = False):
+        self.table = table
+        self.latency = latency
+        self._rpc_class = _AsyncRpc if asynchronous else _SyncRpc
+    
+    def rpc(self, name: str, params: Dict[str, Any]):
+        if name != "match_rag_table":
+            raise NotImplementedError(f"FakeSupabase has no RPC {name!r}")
+        return self._rpc_class(self.table, self.latency, params)
+
+
+class FakeTavily:
+    """Tavily /search stand-in behind an httpx MockTransport, so the real tavily_search tool runs"""
+    
+    def __init__(self, scenarios: Dict[str, Scenario], latency: Latency):
+        self.scenarios = scenarios
+        self.latency = latency
+    
+    def _response(self, request: httpx.Request) -> httpx.Response:
+        query = json.loads(request.content)["query"]
+        scenario = self.scenarios.get(query, DEFAULT_SCENARIO)
+        results = [
+            {
+                "title": f"Result {n} for {query}",
+                "url": f"https://example.com/{n}",
+                "content": f"Recent coverage of {query}: analysts report figures, trends and commentary. " * 3
+            }
+            for n in range(1, scenario.web_results + 1)
+        ]
+        return httpx.Response(200, json={"query": query, "results": results})
+    
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        self.latency.sleep()
+        return self._response(request)
+    
+    async def ahandle(self, request: httpx.Request) -> httpx.Response:
+        await self.latency.asleep()
+        return self._response(request)
+    
+    def install(self):
+        """Create the pooled "tavily" HTTP clients on this stand-in's transport (before any real use)"""
+        from clients import get_http_client, get_async_http_client
+        from tools_setup import TAVILY_API_URL
+        
+        for get_client, handler in ((get_http_client, self.handle), (get_async_http_client, self.ahandle)):
+            transport = httpx.MockTransport(handler)
+            client = get_client("tavily", base_url=TAVILY_API_URL, transport=transport)
+            if client._transport is not transport:
+                raise RuntimeError("The tavily HTTP client was created before the stand-in was installed")
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model stand-in
+    
+    Structured-output calls (with_structured_output binds the schema as a
+    tool) are answered as tool calls: RouteDecision with the query's
+    Scenario tool_choice, ValidationResult sufficient when the prompt shows
+    any retrieved documents or web results. Plain calls return a canned
+    answer, streamed token by token.
+    """
+    
+    scenarios: Dict[str, Scenario]
+    latency: Any
+    token_delay: float = 0.0
+    answer_tokens: int = 40
+    model_name: str = "gpt-4o-mini"
+    
+    @property
+    def _llm_type(self) -> str:
+        return "benchmark-fake-chat"
+    
+    def bind_tools(self, tools, tool_choice: Optional[str] = None, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+    
+    def _scenario(self, messages) -> Scenario:
+        match = _QUESTION.search(str(messages[-1].content))
+        return self.scenarios.get(match.group(1).strip(), DEFAULT_SCENARIO) if match else DEFAULT_SCENARIO
+    
+    def _usage(self, messages, output_tokens: int) -> Dict[str, int]:
+        input_tokens = sum(len(str(message.content)) for message in messages) // 4
+        return {"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens}
+    
+    def _tool_call(self, messages, tools: List[dict]) -> Dict[str, Any]:
+        name = tools[0]["function"]["name"]
+        scenario = self._scenario(messages)
+        if name == "RouteDecision":
+            args = {"tool_choice": scenario.tool_choice, "reasoning": f"benchmark route {scenario.route}"}
+        else:
+            prompt = str(messages[-1].content)
+            sufficient = "RAG Documents Available: Yes" in prompt or (
+                "Tavily Results Available: Yes" in prompt and "No results found" not in prompt
+            )
+            args = {
+                "is_sufficient": sufficient,
+                "next_action": "generate" if sufficient else "generate_llm",
+                "reasoning": "benchmark verdict"
+            }
+        return {"name": name, "args": args, "id": f"call_{name}"}
+    
+    def _answer(self) -> List[str]:
+        return [f"token{n} " for n in range(self.answer_tokens)]
+    
+    def _message(self, messages, tools: Optional[List[dict]]) -> AIMessage:
+        if tools:
+            call = self._tool_call(messages, tools)
+            return AIMessage(content="", tool_calls=[call], usage_metadata=self._usage(messages, 20))
+        answer = self._answer()
+        return AIMessage(content="".join(answer), usage_metadata=self._usage(messages, len(answer)))
+    
+    def _result(self, message: AIMessage) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=message)], llm_output={"model_name": self.model_name})
+    
+    def _generate(self, messages, stop=None, run_manager=None, tools=None, **kwargs) -> ChatResult:
+        self.latency.sleep()
+        time.sleep(self.token_delay * (0 if tools else self.answer_tokens))
+        return self._result(self._message(messages, tools))
+    
+    async def _agenerate(self, messages, stop=None, run_manager=None, tools=None, **kwargs) -> ChatResult:
+        await self.latency.asleep()
+        await asyncio.sleep(self.token_delay * (0 if tools else self.answer_tokens))
+        return self._result(self._message(messages, tools))
+    
+    async def _astream(self, messages, stop=None, run_manager=None, tools=None, **kwargs):
+        # Latency is time to first token; each later token costs token_delay
+        await self.latency.asleep()
+        if tools:
+            call = self._tool_call(messages, tools)
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content="",
+                tool_call_chunks=[{"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": 0}],
+                usage_metadata=self._usage(messages, 20)
+            ))
+            return
+        
+        answer = self._answer()
+        for index, token in enumerate(answer):
+            if index:
+                await asyncio.sleep(self.token_delay)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._usage(messages, len(answer))))
+
+
+def build_stubs(scenarios: Dict[str, Scenario], llm_latency: float, token_delay: float,
+                embedding_latency: float, supabase_latency: float, tavily_latency: float,
+                jitter: float = 0.2, seed: int = 0, topics: List[str] = TOPICS) -> Dict[str, Any]:
+    """
+    Wire up every stand-in
+    
+    Returns:
+        llm, retriever and tavily_tool ready for graph.create_graph, the
+        embeddings and Supabase clients for install_stubs, the vectorstore
+        built on them and the in-memory table
+    """
+    from supabase_vectorstore import SupabaseVectorStore
+    from embeddings_setup import get_retriever
+    from tools_setup import tavily_search
+    from usage import usage_recorder
+    from metrics import llm_metrics
+    
+    table = InMemoryRagTable(make_rag_rows(topics))
+    supabase = FakeSupabase(table, Latency(supabase_latency, jitter, seed + 1))
+    async_supabase = FakeSupabase(table, Latency(supabase_latency, jitter, seed + 2), asynchronous=True)
+    embeddings = FakeEmbeddings(Latency(embedding_latency, jitter, seed + 3))
+    vectorstore = SupabaseVectorStore(supabase=supabase, async_supabase=async_supabase, embeddings=embeddings)
+    FakeTavily(scenarios, Latency(tavily_latency, jitter, seed + 4)).install()
+    
+    llm = FakeChatModel(
+        scenarios=scenarios,
+        latency=Latency(llm_latency, jitter, seed + 5),
+        token_delay=token_delay,
+        callbacks=[usage_recorder, llm_metrics]
+    )
+    return {
+        "llm": llm,
+        "retriever": get_retriever(vectorstore),
+        "tavily_tool": tavily_search,
+        "embeddings": embeddings,
+        "supabase": supabase,
+        "async_supabase": async_supabase,
+        "vectorstore": vectorstore,
+        "table": table
+    }
+
+
+def install_stubs(stubs: Dict[str, Any]):
+    """Make the stand-ins the process-wide clients, so the unmodified app (api.app) runs on them"""
+    from clients import install_stand_ins
+    
+    install_stand_ins(
+        chat_model=stubs["llm"],
+        embeddings=stubs["embeddings"],
+        supabase=stubs["supabase"],
+        async_supabase=stubs["async_supabase"]
+    )
@@ -0,0 +1,317 @@
+import math
+import re
+import threading
+import time
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from local_index import (
+    check_version_column,
+    fetch_rows_by_id,
+    fetch_table_ids,
+    fetch_table_rows,
+    later_cursor,
+    row_cursor,
+    start_refresher
+)
+from config import (
+    BM25_K1,
+    BM25_B,
+    BM25_COMPACT_DEAD_FRACTION,
+    LOCAL_INDEX_REFRESH_SECONDS,
+    LOCAL_INDEX_RECONCILE_SECONDS,
+    LOCAL_INDEX_VERSION_COLUMN
+)
+
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:['&][a-z0-9]+)*")
+
+_STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it its me my "
+    "of on or our should that the their this to we what when where which who "
+    "why will with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased terms with stopwords dropped and a light plural strip (MQLs -> mql)"""
+    terms = []
+    for token in _TOKEN.findall(text.lower()):
+        if token in _STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        terms.append(token)
+    return terms
+
+
+class BM25Index:
+    """
+    Compact in-memory BM25 inverted index over rag_table contents
+    
+    Postings are stored per term as parallel unsigned-int arrays (doc
+    positions and term frequencies). Documents are append-only; replacing or
+    deleting a row tombstones its old position, so incremental updates never
+    rebuild existing postings. Deletes are found by reconciling the indexed
+    IDs with the table's, like LocalVectorIndex. Once tombstones make up
+    compact_dead_fraction of the positions, reconcile rebuilds the postings
+    from the live documents.
+    """
+    
+    def __init__(
+        self,
+        supabase,
+        table_name: str,
+        version_column: str = LOCAL_INDEX_VERSION_COLUMN,
+        refresh_seconds: float = LOCAL_INDEX_REFRESH_SECONDS,
+        reconcile_seconds: float = LOCAL_INDEX_RECONCILE_SECONDS,
+        k1: float = BM25_K1,
+        b: float = BM25_B,
+        compact_dead_fraction: float = BM25_COMPACT_DEAD_FRACTION
+    ):
+        self.supabase = supabase
+        self.table_name = table_name
+        self.version_column = version_column
+        self.refresh_seconds = refresh_seconds
+        self.reconcile_seconds = reconcile_seconds
+        self.k1 = k1
+        self.b = b
+        self.compact_dead_fraction = compact_dead_fraction
+        self.incremental = True
+        
+        self._lock = threading.RLock()
+        self._reset_documents()
+        
+        self._load_lock = threading.Lock()
+        self._refresher: Optional[threading.Thread] = None
+        self.loaded = False
+        self.last_refresh: Optional[float] = None
+        self.last_reconcile: Optional[float] = None
+        self.refresh_errors = 0
+        self.compactions = 0
+    
+    def _reset_documents(self):
+        """Empty postings, document arrays and version (caller holds the lock, or is __init__)"""
+        self._postings: Dict[str, tuple] = {}
+        self._doc_lengths = array("I")
+        self._alive = array("b")
+        self._ids: List[str] = []
+        self._contents: List[str] = []
+        self._metadata: List[dict] = []
+        self._positions: Dict[str, int] = {}
+        self._total_length = 0
+        self._live_docs = 0
+        self._cursor: Optional[Tuple[Any, str]] = None
+    
+    @property
+    def _columns(self) -> str:
+        return f"id,content,metadata,{self.version_column}" if self.incremental else "id,content,metadata"
+    
+    def validate_version_column(self):
+        """Check the version column like LocalVectorIndex.validate_version_column (same fallback)"""
+        try:
+            check_version_column(self.supabase, self.table_name, self.version_column)
+        except Exception as e:
+            self.incremental = False
+            raise ValueError(
+                f"{self.table_name}.{self.version_column} is not usable for incremental keyword index refresh "
+                f"({str(e)}); reconciling by ID instead"
+            ) from e
+    
+    def _fetch_rows(self, after: Optional[Tuple[Any, str]] = None) -> List[Dict[str, Any]]:
+        return fetch_table_rows(
+            self.supabase,
+            self.table_name,
+            self._columns,
+            self.version_column if self.incremental else "id",
+            after=after if self.incremental else None
+        )
+    
+    def ensure_loaded(self):
+        """Build the index from rag_table on first use"""
+        if self.loaded:
+            return
+        with self._load_lock:
+            if not self.loaded:
+                self.add_rows(self._fetch_rows())
+                self.loaded = True
+                self.last_refresh = self.last_reconcile = time.time()
+                if self.refresh_seconds > 0 and self._refresher is None:
+                    self._refresher = start_refresher(
+                        "bm25-index-refresh", self.refresh_seconds, self.refresh, self._on_refresh_error
+                    )
+    
+    def refresh(self):
+        """
+        Index rows after the last seen (version, id)
+        
+        The indexed IDs are reconciled with the table's when the row counts
+        differ and otherwise every reconcile_seconds, so deleted rows drop out.
+        """
+        if self.incremental:
+            self.add_rows(self._fetch_rows(after=self._cursor))
+        
+        overdue = self.last_reconcile is None or time.time() - self.last_reconcile >= self.reconcile_seconds
+        if not self.incremental or overdue or self._remote_count() != self._live_docs:
+            self.reconcile()
+        self.last_refresh = time.time()
+    
+    def _remote_count(self) -> int:
+        result = self.supabase.table(self.table_name).select("id", count="exact").limit(1).execute()
+        return result.count or 0
+    
+    def reconcile(self):
+        """Tombstone indexed rows no longer in the table and index rows the index lacks"""
+        remote_ids = fetch_table_ids(self.supabase, self.table_name)
+        with self._lock:
+            local_ids = set(self._positions)
+        self.add_rows(fetch_rows_by_id(self.supabase, self.table_name, self._columns, remote_ids - local_ids))
+        # Rows added meanwhile by add_rows are not in local_ids and are kept
+        self.remove_ids(local_ids - remote_ids)
+        with self._lock:
+            dead = len(self._ids) - self._live_docs
+            if dead and dead >= self.compact_dead_fraction * len(self._ids):
+                self.compact()
+        self.last_reconcile = time.time()
+    
+    def remove_ids(self, ids: Iterable[str]):
+        """Tombstone rows by ID"""
+        with self._lock:
+            for doc_id in ids:
+                position = self._positions.pop(doc_id, None)
+                if position is None or not self._alive[position]:
+                    continue
+                self._alive[position] = 0
+                self._total_length -= self._doc_lengths[position]
+                self._live_docs -= 1
+    
+    def compact(self):
+        """Rebuild postings and document arrays from the live documents, dropping tombstones"""
+        with self._lock:
+            live = [
+                {"id": self._ids[position], "content": self._contents[position], "metadata": self._metadata[position]}
+                for position in sorted(self._positions.values())
+                if self._alive[position]
+            ]
+            cursor = self._cursor
+            self._reset_documents()
+            self._cursor = cursor
+            self.add_rows(live)
+            self.compactions += 1
+    
+    def _on_refresh_error(self, error: Exception):
+        self.refresh_errors += 1
+        print(f"BM25 index refresh error: {str(error)}")
+    
+    def add_rows(self, rows: List[Dict[str, Any]]):
+        """Index new or changed rows (id, content, metadata)"""
+        with self._lock:
+            for row in rows:
+                position = self._positions.get(row["id"])
+                if position is not None:
+                    if self._contents[position] == row["content"]:
+                        self._metadata[position] = row.get("metadata") or {}
+                        continue
+                    self._alive[position] = 0
+                    self._total_length -= self._doc_lengths[position]
+                    self._live_docs -= 1
+                
+                terms = tokenize(row["content"])
+                position = len(self._ids)
+                self._positions[row["id"]] = position
+                self._ids.append(row["id"])
+                self._contents.append(row["content"])
+                self._metadata.append(row.get("metadata") or {})
+                self._doc_lengths.append(len(terms))
+                self._alive.append(1)
+                self._total_length += len(terms)
+                self._live_docs += 1
+                
+                frequencies: Dict[str, int] = {}
+                for term in terms:
+                    frequencies[term] = frequencies.get(term, 0) + 1
+                for term, tf in frequencies.items():
+                    postings = self._postings.get(term)
+                    if postings is None:
+                        postings = (array("I"), array("I"))
+                        self._postings[term] = postings
+                    postings[0].append(position)
+                    postings[1].append(tf)
+                
+                if self.incremental:
+                    self._cursor = later_cursor(self._cursor, row_cursor(row, self.version_column))
+    
+    def clear(self):
+        """Drop every indexed document; the lock, loaded flag and refresher thread are kept"""
+        with self._lock:
+            self._reset_documents()
+    
+    def search(self, query: str, k: int) -> List[Dict[str, Any]]:
+        """
+        Top-k BM25 matches
+        
+        Returns:
+            Rows with id, content, metadata and bm25_score, best first
+        """
+        terms = set(tokenize(query))
+        
+        with self._lock:
+            n_docs = len(self._ids)
+            if not terms or self._live_docs == 0:
+                return []
+            
+            avgdl = self._total_length / self._live_docs
+            doc_lengths = np.frombuffer(self._doc_lengths, dtype=np.uint32).astype(np.float32)
+            length_norm = self.k1 * (1 - self.b + self.b * doc_lengths / avgdl)
+            scores = np.zeros(n_docs, dtype=np.float32)
+            
+            for term in terms:
+                postings = self._postings.get(term)
+                if postings is None:
+                    continue
+                docs = np.frombuffer(postings[0], dtype=np.uint32)
+                tfs = np.frombuffer(postings[1], dtype=np.uint32).astype(np.float32)
+                alive = np.frombuffer(self._alive, dtype=np.int8)[docs] == 1
+                df = int(alive.sum())
+                if df == 0:
+                    continue
+                idf = math.log(1 + (self._live_docs - df + 0.5) / (df + 0.5))
+                contribution = idf * tfs * (self.k1 + 1) / (tfs + length_norm[docs])
+                scores[docs[alive]] += contribution[alive]
+            
+            candidates = np.flatnonzero(scores > 0)
+            if len(candidates) > k:
+                candidates = candidates[np.argpartition(-scores[candidates], k)[:k]]
+            candidates = candidates[np.argsort(-scores[candidates])]
+            
+            return [
+                {
+                    "id": self._ids[i],
+                    "content": self._contents[i],
+                    "metadata": self._metadata[i],
+                    "bm25_score": float(scores[i])
+                }
+                for i in candidates
+            ]
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            postings_bytes = sum(
+                docs.itemsize * len(docs) + tfs.itemsize * len(tfs)
+                for docs, tfs in self._postings.values()
+            )
+            return {
+                "loaded": self.loaded,
+                "documents": self._live_docs,
+                "tombstones": len(self._ids) - self._live_docs,
+                "compactions": self.compactions,
+                "terms": len(self._postings),
+                "postings_bytes": postings_bytes,
+                "version": self._cursor[0] if self._cursor else None,
+                "incremental": self.incremental,
+                "last_refresh": self.last_refresh,
+                "last_reconcile": self.last_reconcile,
+                "refresh_errors": self.refresh_errors
+            }
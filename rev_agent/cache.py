@@ -0,0 +1,318 @@
+import asyncio
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional
+
+from config import (
+    EMBEDDING_MODEL,
+    EMBEDDING_CACHE_SIZE,
+    EMBEDDING_CACHE_TTL,
+    EMBEDDING_CACHE_FLOAT32
+)
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text for cache keys: case-folded with collapsed whitespace"""
+    return " ".join(text.split()).casefold()
+
+
+class TTLCache:
+    """Thread-safe bounded LRU cache whose entries also expire after a TTL"""
+    
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+    
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value, or None when missing or expired"""
+        entry = self.get_entry(key)
+        return entry[0] if entry else None
+    
+    def get_entry(self, key: Hashable) -> Optional[tuple]:
+        """Return (value, stored_at) so callers can report the entry's age"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            
+            value, stored_at = entry
+            if now - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value, stored_at
+    
+    def set(self, key: Hashable, value: Any):
+        """Store a value, evicting the least recently used entries past max_size"""
+        if self.max_size <= 0:
+            return
+        
+        with self._lock:
+            self._entries[key] = (value, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def clear(self):
+        """Drop every entry (counters are kept)"""
+        with self._lock:
+            self._entries.clear()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent identical calls so N callers share one upstream call
+    
+    Sync callers block on the leader's result; async callers await a shared
+    task through asyncio.shield, so a cancelled caller does not cancel the
+    call the others are waiting on.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Dict[str, Any]] = {}
+        self._tasks: Dict[Hashable, "asyncio.Future"] = {}
+        self.executions = 0
+        self.shared = 0
+    
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Run fn once per key at a time; concurrent callers get the same result or error"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = {"event": threading.Event(), "result": None, "error": None}
+                self._calls[key] = call
+                self.executions += 1
+            else:
+                self.shared += 1
+        
+        if not leader:
+            call["event"].wait()
+            if call["error"] is not None:
+                raise call["error"]
+            return call["result"]
+        
+        try:
+            call["result"] = fn()
+            return call["result"]
+        except BaseException as e:
+            call["error"] = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call["event"].set()
+    
+    async def ado(self, key: Hashable, coro_fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Async variant of do; the shared call runs as its own task on the current loop"""
+        task_key = (id(asyncio.get_running_loop()), key)
+        
+        with self._lock:
+            task = self._tasks.get(task_key)
+            if task is None:
+                task = asyncio.ensure_future(coro_fn())
+                self._tasks[task_key] = task
+                task.add_done_callback(lambda done: self._finish_task(task_key, done))
+                self.executions += 1
+            else:
+                self.shared += 1
+        
+        return await asyncio.shield(task)
+    
+    def _finish_task(self, task_key: Hashable, task: "asyncio.Future"):
+        with self._lock:
+            self._tasks.pop(task_key, None)
+        # Mark the outcome retrieved even if every waiter was cancelled
+        if not task.cancelled():
+            task.exception()
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            calls = self.executions + self.shared
+            return {
+                "executions": self.executions,
+                "shared": self.shared,
+                "coalescing_ratio": round(self.shared / calls, 4) if calls else 0.0,
+                "in_flight": len(self._calls) + len(self._tasks)
+            }
+
+
+class StreamFanout:
+    """
+    Share one async event stream among concurrent identical subscribers
+    
+    The first subscriber for a key starts the stream as a task; later ones
+    replay the events produced so far and then follow it live. The stream
+    keeps running while anyone is subscribed and is cancelled once the last
+    subscriber leaves. Finished streams are forgotten, so only concurrent
+    subscribers share.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._streams: Dict[Hashable, Dict[str, Any]] = {}
+        self.executions = 0
+        self.shared = 0
+    
+    async def subscribe(self, key: Hashable, gen_fn: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        """Yield the events of the shared stream for key, starting it if none is running"""
+        stream_key = (id(asyncio.get_running_loop()), key)
+        
+        with self._lock:
+            stream = self._streams.get(stream_key)
+            if stream is None:
+                stream = {
+                    "events": [],
+                    "done": False,
+                    "error": None,
+                    "subscribers": 0,
+                    "changed": asyncio.Condition()
+                }
+                stream["task"] = asyncio.ensure_future(self._produce(stream_key, stream, gen_fn))
+                self._streams[stream_key] = stream
+                self.executions += 1
+            else:
+                self.shared += 1
+            stream["subscribers"] += 1
+        
+        position = 0
+        try:
+            while True:
+                async with stream["changed"]:
+                    await stream["changed"].wait_for(lambda: len(stream["events"]) > position or stream["done"])
+                events = stream["events"][position:]
+                position += len(events)
+                for event in events:
+                    yield event
+                if stream["done"] and position == len(stream["events"]):
+                    break
+            if stream["error"] is not None:
+                raise stream["error"]
+        finally:
+            with self._lock:
+                stream["subscribers"] -= 1
+                abandoned = stream["subscribers"] == 0 and not stream["done"]
+                if abandoned and self._streams.get(stream_key) is stream:
+                    # The task may be cancelled before it ever runs its cleanup
+                    del self._streams[stream_key]
+            if abandoned:
+                stream["task"].cancel()
+    
+    async def _produce(self, stream_key: Hashable, stream: Dict[str, Any], gen_fn: Callable[[], AsyncIterator[Any]]):
+        try:
+            async for event in gen_fn():
+                async with stream["changed"]:
+                    stream["events"].append(event)
+                    stream["changed"].notify_all()
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            stream["error"] = e
+        finally:
+            with self._lock:
+                if self._streams.get(stream_key) is stream:
+                    del self._streams[stream_key]
+            async with stream["changed"]:
+                stream["done"] = True
+                stream["changed"].notify_all()
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            calls = self.executions + self.shared
+            return {
+                "executions": self.executions,
+                "shared": self.shared,
+                "coalescing_ratio": round(self.shared / calls, 4) if calls else 0.0,
+                "in_flight": len(self._streams)
+            }
+
+
+class EmbeddingCache:
+    """
+    Query-embedding cache keyed on normalized text and embedding model
+    
+    Vectors can be stored as compact float32 arrays (half the memory of
+    Python float lists); they are returned as plain lists either way.
+    """
+    
+    def __init__(self, model: str, max_size: int, ttl_seconds: float, use_float32: bool = True):
+        self.model = model
+        self.use_float32 = use_float32
+        self._cache = TTLCache(max_size, ttl_seconds)
+    
+    def _key(self, text: str) -> tuple:
+        return (self.model, normalize_text(text))
+    
+    def get(self, text: str) -> Optional[List[float]]:
+        """Cached embedding for the text, if any"""
+        vector = self._cache.get(self._key(text))
+        if vector is None:
+            return None
+        return vector.tolist() if isinstance(vector, array) else list(vector)
+    
+    def set(self, text: str, embedding: List[float]):
+        """Cache an embedding for the text"""
+        vector = array("f", embedding) if self.use_float32 else list(embedding)
+        self._cache.set(self._key(text), vector)
+    
+    def clear(self):
+        self._cache.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        stats = self._cache.stats()
+        stats["model"] = self.model
+        stats["float32"] = self.use_float32
+        return stats
+
+
+_embedding_cache: Optional[EmbeddingCache] = None
+_embedding_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Process-wide query-embedding cache"""
+    global _embedding_cache
+    if _embedding_cache is None:
+        with _embedding_cache_lock:
+            if _embedding_cache is None:
+                _embedding_cache = EmbeddingCache(
+                    model=EMBEDDING_MODEL,
+                    max_size=EMBEDDING_CACHE_SIZE,
+                    ttl_seconds=EMBEDDING_CACHE_TTL,
+                    use_float32=EMBEDDING_CACHE_FLOAT32
+                )
+    return _embedding_cache
@@ -0,0 +1,338 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Any, Dict, Iterator, Optional, Tuple
+
+import httpx
+
+if TYPE_CHECKING:
+    from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+    from supabase.client import Client, AsyncClient
+
+from config import (
+    OPENAI_API_KEY,
+    SUPABASE_URL,
+    SUPABASE_KEY,
+    EMBEDDING_MODEL,
+    HTTP2_ENABLED,
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    HTTP_KEEPALIVE_EXPIRY,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_READ_TIMEOUT
+)
+
+
+class PoolStats:
+    """Request and connection counters for one pooled client, fed by event hooks and httpcore traces"""
+    
+    def __init__(self):
+        self.requests = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.errors = 0
+        self.tcp_connects = 0
+        self.tls_handshakes = 0
+        self._lock = threading.Lock()
+    
+    def _on_request(self):
+        with self._lock:
+            self.requests += 1
+    
+    def _on_response(self, response: httpx.Response):
+        with self._lock:
+            if response.status_code >= 400:
+                self.errors += 1
+    
+    def _on_trace(self, event: str):
+        # In-flight spans request headers sent -> response closed, which also fires on failures
+        with self._lock:
+            if event == "connection.connect_tcp.complete":
+                self.tcp_connects += 1
+            elif event == "connection.start_tls.complete":
+                self.tls_handshakes += 1
+            elif event.endswith(".send_request_headers.started"):
+                self.in_flight += 1
+                self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            elif event.endswith(".response_closed.started"):
+                self.in_flight -= 1
+    
+    def sync_hooks(self) -> Dict[str, list]:
+        def trace(event: str, info: dict):
+            self._on_trace(event)
+        
+        def on_request(request: httpx.Request):
+            request.extensions["trace"] = trace
+            self._on_request()
+        
+        return {"request": [on_request], "response": [self._on_response]}
+    
+    def async_hooks(self) -> Dict[str, list]:
+        async def trace(event: str, info: dict):
+            self._on_trace(event)
+        
+        async def on_request(request: httpx.Request):
+            request.extensions["trace"] = trace
+            self._on_request()
+        
+        async def on_response(response: httpx.Response):
+            self._on_response(response)
+        
+        return {"request": [on_request], "response": [on_response]}
+    
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+                "errors": self.errors,
+                "tcp_connects": self.tcp_connects,
+                "tls_handshakes": self.tls_handshakes,
+                # Requests per new connection; grows as keep-alive does its job
+                "requests_per_connection": round(self.requests / self.tcp_connects, 2) if self.tcp_connects else None
+            }
+
+
+_lock = threading.Lock()
+_http_clients: Dict[Tuple[str, bool], Any] = {}
+_pool_stats: Dict[str, PoolStats] = {}
+_chat_models: Dict[Tuple[str, float], "ChatOpenAI"] = {}
+_embeddings: Optional["OpenAIEmbeddings"] = None
+_supabase: Optional["Client"] = None
+_async_supabase: Optional["AsyncClient"] = None
+_chat_model_stand_in: Optional[Any] = None
+
+# Absolute time.monotonic() deadline for pooled HTTP requests made in the current context
+_call_deadline: ContextVar[Optional[float]] = ContextVar("call_deadline", default=None)
+
+
+@contextmanager
+def call_deadline(seconds: float) -> Iterator[None]:
+    """
+    Make every pooled HTTP request inside the block finish within `seconds`
+    
+    Each request's connect/read/write/pool timeouts are capped at the time
+    left, and requests started after the deadline fail at once. This is what
+    frees a tool-pool worker whose caller has already given up on it.
+    """
+    token = _call_deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _call_deadline.reset(token)
+
+
+def _apply_deadline(request: httpx.Request):
+    deadline = _call_deadline.get()
+    if deadline is None:
+        return
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise httpx.PoolTimeout("Call deadline exceeded before the request was sent", request=request)
+    timeout = request.extensions.get("timeout") or {}
+    request.extensions["timeout"] = {
+        phase: min(timeout.get(phase) or remaining, remaining) for phase in ("connect", "read", "write", "pool")
+    }
+
+
+async def _aapply_deadline(request: httpx.Request):
+    _apply_deadline(request)
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+    )
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+
+
+def _stats_for(name: str) -> PoolStats:
+    if name not in _pool_stats:
+        _pool_stats[name] = PoolStats()
+    return _pool_stats[name]
+
+
+def get_http_client(name: str, **kwargs) -> httpx.Client:
+    """
+    Process-wide pooled sync HTTP client for one backend
+    
+    Args:
+        name: Pool name ("openai", "supabase", "tavily")
+        **kwargs: Extra httpx.Client arguments (base_url, headers), used on first creation only
+    """
+    key = (name, False)
+    client = _http_clients.get(key)
+    if client is None:
+        with _lock:
+            client = _http_clients.get(key)
+            if client is None:
+                hooks = _stats_for(name).sync_hooks()
+                hooks["request"].insert(0, _apply_deadline)
+                client = httpx.Client(
+                    http2=HTTP2_ENABLED,
+                    limits=_limits(),
+                    timeout=kwargs.pop("timeout", _timeout()),
+                    event_hooks=hooks,
+                    **kwargs
+                )
+                _http_clients[key] = client
+    return client
+
+
+def get_async_http_client(name: str, **kwargs) -> httpx.AsyncClient:
+    """Async variant of get_http_client; the pool is bound to the serving event loop"""
+    key = (name, True)
+    client = _http_clients.get(key)
+    if client is None:
+        with _lock:
+            client = _http_clients.get(key)
+            if client is None:
+                hooks = _stats_for(name).async_hooks()
+                hooks["request"].insert(0, _aapply_deadline)
+                client = httpx.AsyncClient(
+                    http2=HTTP2_ENABLED,
+                    limits=_limits(),
+                    timeout=kwargs.pop("timeout", _timeout()),
+                    event_hooks=hooks,
+                    **kwargs
+                )
+                _http_clients[key] = client
+    return client
+
+
+def get_chat_model(model: str = "gpt-4o-mini", temperature: float = 0.5) -> "ChatOpenAI":
+    """
+    Shared ChatOpenAI per (model, temperature) on the pooled OpenAI transport
+    
+    Token usage (including streamed calls) is recorded per graph node by usage_recorder,
+    call latency by llm_metrics.
+    """
+    if _chat_model_stand_in is not None:
+        return _chat_model_stand_in
+    key = (model, temperature)
+    if key not in _chat_models:
+        from langchain_openai import ChatOpenAI
+        from usage import usage_recorder
+        from metrics import llm_metrics
+        
+        _chat_models[key] = ChatOpenAI(
+            model=model,
+            temperature=temperature,
+            stream_usage=True,
+            callbacks=[usage_recorder, llm_metrics],
+            http_client=get_http_client("openai"),
+            http_async_client=get_async_http_client("openai")
+        )
+    return _chat_models[key]
+
+
+def install_stand_ins(chat_model=None, embeddings=None, supabase=None, async_supabase=None):
+    """
+    Serve the shared clients from offline stand-ins instead of OpenAI and Supabase
+    
+    Used by benchmarks/loadtest.py to run the API without network access. Call it
+    before anything fetches a client; the chat model stands in for every model and temperature.
+    """
+    global _chat_model_stand_in, _embeddings, _supabase, _async_supabase
+    if chat_model is not None:
+        _chat_model_stand_in = chat_model
+    if embeddings is not None:
+        _embeddings = embeddings
+    if supabase is not None:
+        _supabase = supabase
+    if async_supabase is not None:
+        _async_supabase = async_supabase
+
+
+def get_embeddings() -> "OpenAIEmbeddings":
+    """Shared OpenAIEmbeddings on the pooled OpenAI transport"""
+    global _embeddings
+    if _embeddings is None:
+        from langchain_openai import OpenAIEmbeddings
+        
+        _embeddings = OpenAIEmbeddings(
+            model=EMBEDDING_MODEL,
+            openai_api_key=OPENAI_API_KEY,
+            http_client=get_http_client("openai"),
+            http_async_client=get_async_http_client("openai")
+        )
+    return _embeddings
+
+
+def get_supabase_client() -> "Client":
+    """
+    Shared Supabase client whose PostgREST session uses the tuned "supabase" pool
+    
+    supabase-py takes no custom HTTP client, so the default PostgREST session
+    is swapped for a pooled one carrying the same base URL and auth headers.
+    """
+    global _supabase
+    if _supabase is None:
+        from supabase import create_client
+        
+        client = create_client(SUPABASE_URL, SUPABASE_KEY)
+        default_session = client.postgrest.session
+        client.postgrest.session = get_http_client(
+            "supabase",
+            base_url=default_session.base_url,
+            headers=default_session.headers,
+            follow_redirects=True
+        )
+        default_session.close()
+        _supabase = client
+    return _supabase
+
+
+async def aget_supabase_client() -> "AsyncClient":
+    """Async variant of get_supabase_client, created on the running event loop"""
+    global _async_supabase
+    if _async_supabase is None:
+        from supabase import acreate_client
+        
+        client = await acreate_client(SUPABASE_URL, SUPABASE_KEY)
+        default_session = client.postgrest.session
+        client.postgrest.session = get_async_http_client(
+            "supabase",
+            base_url=default_session.base_url,
+            headers=default_session.headers,
+            follow_redirects=True
+        )
+        await default_session.aclose()
+        _async_supabase = client
+    return _async_supabase
+
+
+def _connection_counts(client) -> Dict[str, int]:
+    """Open and idle connections in the client's httpcore pool"""
+    pool = getattr(getattr(client, "_transport", None), "_pool", None)
+    connections = list(getattr(pool, "connections", []) or [])
+    return {
+        "connections": len(connections),
+        "idle_connections": sum(1 for connection in connections if connection.is_idle())
+    }
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Per-backend request counters, handshakes and current pool occupancy"""
+    stats: Dict[str, Any] = {
+        "http2": HTTP2_ENABLED,
+        "max_connections": HTTP_MAX_CONNECTIONS,
+        "max_keepalive_connections": HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        "keepalive_expiry": HTTP_KEEPALIVE_EXPIRY,
+        "pools": {}
+    }
+    for name, pool_stats in list(_pool_stats.items()):
+        entry = pool_stats.snapshot()
+        for is_async in (False, True):
+            client = _http_clients.get((name, is_async))
+            if client is not None:
+                entry["async" if is_async else "sync"] = _connection_counts(client)
+        stats["pools"][name] = entry
+    return stats
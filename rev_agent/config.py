@@ -1,45 +1,228 @@
 import os
-from dotenv import load_dotenv
-
-
-load_dotenv()
-
-
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-if not OPENAI_API_KEY:
-    print("[WARNING] OPENAI_API_KEY not found - API functionality will be limited")
-
-
-SUPABASE_URL = os.getenv("SUPABASE_URL", "https://keblvjnepumswxlfgquv.supabase.co")
-SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
-if not SUPABASE_KEY:
-    print("[WARNING] SUPABASE_SERVICE_KEY not found - Vector search will not work")
-
-
-LANGCHAIN_TRACING_V2 = os.getenv("LANGCHAIN_TRACING_V2", "true")
-LANGCHAIN_API_KEY = os.getenv("LANGCHAIN_API_KEY")
-LANGCHAIN_PROJECT = os.getenv("LANGCHAIN_PROJECT", "revenue-planning-agent")
-LANGCHAIN_ENDPOINT = os.getenv("LANGCHAIN_ENDPOINT", "https://api.smith.langchain.com")
-
-
-os.environ["LANGCHAIN_TRACING_V2"] = LANGCHAIN_TRACING_V2
-os.environ["LANGCHAIN_ENDPOINT"] = LANGCHAIN_ENDPOINT
-os.environ["LANGCHAIN_PROJECT"] = LANGCHAIN_PROJECT
-
-if LANGCHAIN_API_KEY:
-    os.environ["LANGCHAIN_API_KEY"] = LANGCHAIN_API_KEY
-    print(f"[OK] LangSmith tracing enabled - Project: {LANGCHAIN_PROJECT}")
-else:
-    print("[WARNING] LANGCHAIN_API_KEY not set - LangSmith tracing disabled")
-    os.environ["LANGCHAIN_TRACING_V2"] = "false"
-
-
-
-
-EMBEDDING_MODEL = "text-embedding-3-small"  
-EMBEDDING_DIMENSIONS = 1536
-
-
-CHUNK_SIZE = 600 
-CHUNK_OVERLAP = 200 
-RETRIEVER_K = 5  
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+
+# Settings are read from the environment on first use, not at import time, so importing
+# config is cheap and has no side effects. Entry points call load_env() first to pick up .env.
+
+
+def _env_str(name: str, default: Optional[str] = None, lower: bool = False):
+    def read():
+        value = os.getenv(name, default)
+        return value.lower() if lower and value is not None else value
+    return field(default_factory=read)
+
+
+def _env_int(name: str, default: int):
+    return field(default_factory=lambda: int(os.getenv(name, str(default))))
+
+
+def _env_float(name: str, default: float):
+    return field(default_factory=lambda: float(os.getenv(name, str(default))))
+
+
+def _env_bool(name: str, default: bool):
+    return field(default_factory=lambda: os.getenv(name, "true" if default else "false").lower() == "true")
+
+
+@dataclass(frozen=True)
+class Settings:
+    """Process configuration, one attribute per setting (names match the environment variables)"""
+    
+    OPENAI_API_KEY: Optional[str] = _env_str("OPENAI_API_KEY")
+    SUPABASE_URL: str = _env_str("SUPABASE_URL", "https://keblvjnepumswxlfgquv.supabase.co")
+    SUPABASE_KEY: Optional[str] = _env_str("SUPABASE_SERVICE_KEY")
+    
+    LANGCHAIN_TRACING_V2: str = _env_str("LANGCHAIN_TRACING_V2", "true")
+    LANGCHAIN_API_KEY: Optional[str] = _env_str("LANGCHAIN_API_KEY")
+    LANGCHAIN_PROJECT: str = _env_str("LANGCHAIN_PROJECT", "revenue-planning-agent")
+    LANGCHAIN_ENDPOINT: str = _env_str("LANGCHAIN_ENDPOINT", "https://api.smith.langchain.com")
+    
+    
+    
+    # Shared HTTP/2 connection pools for OpenAI, Supabase and Tavily (one per backend)
+    HTTP2_ENABLED: bool = _env_bool("HTTP2_ENABLED", True)
+    HTTP_MAX_CONNECTIONS: int = _env_int("HTTP_MAX_CONNECTIONS", 100)
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = _env_int("HTTP_MAX_KEEPALIVE_CONNECTIONS", 20)
+    HTTP_KEEPALIVE_EXPIRY: float = _env_float("HTTP_KEEPALIVE_EXPIRY", 60)
+    HTTP_CONNECT_TIMEOUT: float = _env_float("HTTP_CONNECT_TIMEOUT", 5)
+    HTTP_READ_TIMEOUT: float = _env_float("HTTP_READ_TIMEOUT", 60)
+    
+    LLM_MODEL: str = "gpt-4o-mini"
+    EMBEDDING_MODEL: str = "text-embedding-3-small"
+    EMBEDDING_DIMENSIONS: int = 1536
+    
+    # Query-embedding cache (LRU + TTL); float32 storage halves memory per vector
+    EMBEDDING_CACHE_SIZE: int = _env_int("EMBEDDING_CACHE_SIZE", 4096)
+    EMBEDDING_CACHE_TTL: float = _env_float("EMBEDDING_CACHE_TTL", 86400)
+    EMBEDDING_CACHE_FLOAT32: bool = _env_bool("EMBEDDING_CACHE_FLOAT32", True)
+    
+    # Semantic answer cache checked before routing (history-free queries only)
+    RESPONSE_CACHE_ENABLED: bool = _env_bool("RESPONSE_CACHE_ENABLED", True)
+    RESPONSE_CACHE_SIZE: int = _env_int("RESPONSE_CACHE_SIZE", 1000)
+    RESPONSE_CACHE_THRESHOLD: float = _env_float("RESPONSE_CACHE_THRESHOLD", 0.95)
+    RESPONSE_CACHE_TTL: float = _env_float("RESPONSE_CACHE_TTL", 3600)
+    RESPONSE_CACHE_VOLATILE_TTL: float = _env_float("RESPONSE_CACHE_VOLATILE_TTL", 300)  # tavily/both/none answers; 0 disables
+    
+    # Singleflight: identical concurrent queries (same history/session context) share one graph run
+    COALESCE_QUERIES: bool = _env_bool("COALESCE_QUERIES", True)
+    
+    # /chat/batch: items per request and concurrent graph runs per batch
+    BATCH_MAX_ITEMS: int = _env_int("BATCH_MAX_ITEMS", 500)
+    BATCH_CONCURRENCY: int = _env_int("BATCH_CONCURRENCY", 8)
+    
+    CHUNK_SIZE: int = 600
+    CHUNK_OVERLAP: int = 200
+    RETRIEVER_K: int = 5
+    
+    # Retrieval backend: "remote" (match_rag_table RPC) or "local" (in-process mirror of rag_table)
+    RETRIEVAL_BACKEND: str = _env_str("RETRIEVAL_BACKEND", "remote", lower=True)
+    LOCAL_INDEX_REFRESH_SECONDS: float = _env_float("LOCAL_INDEX_REFRESH_SECONDS", 60)
+    LOCAL_INDEX_VERSION_COLUMN: str = _env_str("LOCAL_INDEX_VERSION_COLUMN", "created_at")  # checked at warm-up
+    LOCAL_INDEX_PAGE_SIZE: int = _env_int("LOCAL_INDEX_PAGE_SIZE", 1000)
+    LOCAL_INDEX_RECONCILE_SECONDS: float = _env_float("LOCAL_INDEX_RECONCILE_SECONDS", 600)  # full id-set comparison
+    
+    # Hybrid retrieval: BM25 keyword index fused with vector results by reciprocal rank
+    HYBRID_RETRIEVAL: bool = _env_bool("HYBRID_RETRIEVAL", False)
+    HYBRID_CANDIDATES: int = _env_int("HYBRID_CANDIDATES", 20)  # per retriever, before fusion
+    RRF_K: int = _env_int("RRF_K", 60)
+    BM25_K1: float = _env_float("BM25_K1", 1.5)
+    BM25_B: float = _env_float("BM25_B", 0.75)
+    BM25_COMPACT_DEAD_FRACTION: float = _env_float("BM25_COMPACT_DEAD_FRACTION", 0.25)  # tombstoned share that triggers a rebuild
+    
+    # Generator context packing: dedupe overlapping chunks, rank by score, per-source token budgets
+    CONTEXT_PACKING: bool = _env_bool("CONTEXT_PACKING", True)
+    PACK_RAG_TOKENS: int = _env_int("PACK_RAG_TOKENS", 1200)
+    PACK_WEB_TOKENS: int = _env_int("PACK_WEB_TOKENS", 1000)
+    PACK_HISTORY_TOKENS: int = _env_int("PACK_HISTORY_TOKENS", 600)
+    PACK_HISTORY_MESSAGES: int = _env_int("PACK_HISTORY_MESSAGES", 6)
+    PACK_DUPLICATE_THRESHOLD: float = _env_float("PACK_DUPLICATE_THRESHOLD", 0.8)  # word-trigram Jaccard
+    PACK_MIN_OVERLAP_CHARS: int = _env_int("PACK_MIN_OVERLAP_CHARS", 40)
+    PACK_MIN_PASSAGE_TOKENS: int = _env_int("PACK_MIN_PASSAGE_TOKENS", 50)  # smaller leftovers are dropped, not truncated
+    
+    # Prompt layout: static instructions first, request-specific context after, the datetime last.
+    # It is rounded to this many minutes (1 = exact minute, 1440 = date only); questions that
+    # mention the date or time always get the exact minute
+    PROMPT_TIME_GRANULARITY_MINUTES: int = _env_int("PROMPT_TIME_GRANULARITY_MINUTES", 24 * 60)
+    
+    # Server-side sessions: recent messages kept verbatim, older ones folded into a rolling summary
+    SESSION_BACKEND: str = _env_str("SESSION_BACKEND", "memory", lower=True)  # "memory" or "file"
+    SESSION_DIR: str = _env_str("SESSION_DIR", ".sessions")  # one JSON file per session when SESSION_BACKEND=file
+    SESSION_MAX_SESSIONS: int = _env_int("SESSION_MAX_SESSIONS", 10000)  # in-memory LRU bound
+    SESSION_TTL: float = _env_float("SESSION_TTL", 86400)  # idle seconds before a session expires; 0 disables
+    SESSION_RECENT_MESSAGES: int = _env_int("SESSION_RECENT_MESSAGES", 6)
+    SESSION_SUMMARIZE_AFTER: int = _env_int("SESSION_SUMMARIZE_AFTER", 4)  # older messages pending before a summary update
+    SESSION_MAX_MESSAGES: int = _env_int("SESSION_MAX_MESSAGES", 40)  # hard cap if summarization keeps failing
+    SESSION_SUMMARY_MAX_TOKENS: int = _env_int("SESSION_SUMMARY_MAX_TOKENS", 300)
+    
+    # Latency histograms and outcome counters for nodes and external calls, served on /metrics
+    METRICS_ENABLED: bool = _env_bool("METRICS_ENABLED", True)
+    
+    # Per-request trace (node path and timings, cache hits, retries), returned when a request sets include_trace
+    REQUEST_TRACE_ENABLED: bool = _env_bool("REQUEST_TRACE_ENABLED", True)
+    
+    # Token/cost accounting: rolling per-route averages cover this many recent requests per route
+    USAGE_ROUTE_WINDOW: int = _env_int("USAGE_ROUTE_WINDOW", 1000)
+    
+    # Startup warm-up run from the FastAPI lifespan; /ready returns 503 until it finishes
+    WARMUP_ENABLED: bool = _env_bool("WARMUP_ENABLED", True)
+    WARMUP_BLOCKING: bool = _env_bool("WARMUP_BLOCKING", True)  # false: serve immediately, gate on /ready
+    WARMUP_QUERY: str = _env_str("WARMUP_QUERY", "What is customer acquisition cost?")
+    WARMUP_STEP_TIMEOUT: float = _env_float("WARMUP_STEP_TIMEOUT", 30)
+    WARMUP_PRELOAD_INDEXES: bool = _env_bool("WARMUP_PRELOAD_INDEXES", True)
+    
+    # Bulk ingestion: token-bounded embedding batches, multi-row upserts, bounded concurrency
+    INGEST_BATCH_TOKENS: int = _env_int("INGEST_BATCH_TOKENS", 50000)
+    INGEST_BATCH_SIZE: int = _env_int("INGEST_BATCH_SIZE", 128)
+    INGEST_CONCURRENCY: int = _env_int("INGEST_CONCURRENCY", 4)
+    INGEST_MAX_RETRIES: int = _env_int("INGEST_MAX_RETRIES", 3)
+    
+    # Per-tool deadlines (seconds) for tool fan-out; partial results are kept on timeout
+    RAG_TOOL_TIMEOUT: float = _env_float("RAG_TOOL_TIMEOUT", 5)
+    TAVILY_TOOL_TIMEOUT: float = _env_float("TAVILY_TOOL_TIMEOUT", 8)
+    TOOL_EXECUTOR_WORKERS: int = _env_int("TOOL_EXECUTOR_WORKERS", 16)
+    
+    # Start retrieval while the router LLM runs; unused work is cancelled or discarded
+    SPECULATIVE_RETRIEVAL: bool = _env_bool("SPECULATIVE_RETRIEVAL", True)
+    SPECULATIVE_TAVILY: bool = _env_bool("SPECULATIVE_TAVILY", False)
+    
+    # Tavily search parameters and result cache (results are shared across identical queries)
+    TAVILY_SEARCH_DEPTH: str = _env_str("TAVILY_SEARCH_DEPTH", "advanced")
+    TAVILY_MAX_RESULTS: int = _env_int("TAVILY_MAX_RESULTS", 5)
+    TAVILY_CACHE_SIZE: int = _env_int("TAVILY_CACHE_SIZE", 512)
+    TAVILY_CACHE_TTL: float = _env_float("TAVILY_CACHE_TTL", 900)
+    
+    # Zero-LLM pre-router: lexical rules + nearest-centroid over logged router decisions
+    PREROUTER_ENABLED: bool = _env_bool("PREROUTER_ENABLED", True)
+    PREROUTER_LOG_PATH: Optional[str] = _env_str("PREROUTER_LOG_PATH")  # JSONL of router decisions; unset keeps them in memory
+    PREROUTER_MAX_EXAMPLES: int = _env_int("PREROUTER_MAX_EXAMPLES", 5000)
+    PREROUTER_MIN_EXAMPLES: int = _env_int("PREROUTER_MIN_EXAMPLES", 25)  # per class before its centroid is used
+    PREROUTER_MIN_SIMILARITY: float = _env_float("PREROUTER_MIN_SIMILARITY", 0.5)
+    PREROUTER_MIN_MARGIN: float = _env_float("PREROUTER_MIN_MARGIN", 0.08)
+    PREROUTER_SHADOW_RATE: float = _env_float("PREROUTER_SHADOW_RATE", 0.05)  # confident routes also checked by the LLM
+    PREROUTER_MIN_AGREEMENT: float = _env_float("PREROUTER_MIN_AGREEMENT", 0.9)  # below this, centroid routes are suspended
+    PREROUTER_AGREEMENT_WINDOW: int = _env_int("PREROUTER_AGREEMENT_WINDOW", 50)  # recent checked predictions
+    
+    # Validation: "deterministic" decides from similarity scores / result counts and only
+    # calls the LLM validator in the ambiguous band; "llm" always calls it
+    VALIDATION_MODE: str = _env_str("VALIDATION_MODE", "deterministic", lower=True)
+    VALIDATION_HIGH_SCORE: float = _env_float("VALIDATION_HIGH_SCORE", 0.45)
+    VALIDATION_LOW_SCORE: float = _env_float("VALIDATION_LOW_SCORE", 0.3)
+    VALIDATION_MIN_CONTENT_CHARS: int = _env_int("VALIDATION_MIN_CONTENT_CHARS", 300)
+    VALIDATION_MIN_TAVILY_RESULTS: int = _env_int("VALIDATION_MIN_TAVILY_RESULTS", 2)
+    
+    def missing_credentials(self) -> list:
+        """Warnings for unset API keys"""
+        warnings = []
+        if not self.OPENAI_API_KEY:
+            warnings.append("OPENAI_API_KEY not found - API functionality will be limited")
+        if not self.SUPABASE_KEY:
+            warnings.append("SUPABASE_SERVICE_KEY not found - Vector search will not work")
+        return warnings
+
+
+_settings: Optional[Settings] = None
+
+
+def load_env():
+    """Load .env into the environment; entry points call this before settings are first read"""
+    from dotenv import load_dotenv
+    load_dotenv()
+
+
+def get_settings() -> Settings:
+    """Build the process-wide Settings from the environment on first call"""
+    global _settings
+    if _settings is None:
+        _settings = Settings()
+    return _settings
+
+
+def configure_tracing(settings: Optional[Settings] = None):
+    """
+    Export LangSmith settings to the environment and report credential status
+    
+    Call once from the entry point (the API lifespan does) before any chain runs.
+    """
+    settings = settings or get_settings()
+    for warning in settings.missing_credentials():
+        print(f"[WARNING] {warning}")
+    
+    os.environ["LANGCHAIN_TRACING_V2"] = settings.LANGCHAIN_TRACING_V2
+    os.environ["LANGCHAIN_ENDPOINT"] = settings.LANGCHAIN_ENDPOINT
+    os.environ["LANGCHAIN_PROJECT"] = settings.LANGCHAIN_PROJECT
+    
+    if settings.LANGCHAIN_API_KEY:
+        os.environ["LANGCHAIN_API_KEY"] = settings.LANGCHAIN_API_KEY
+        print(f"[OK] LangSmith tracing enabled - Project: {settings.LANGCHAIN_PROJECT}")
+    else:
+        print("[WARNING] LANGCHAIN_API_KEY not set - LangSmith tracing disabled")
+        os.environ["LANGCHAIN_TRACING_V2"] = "false"
+
+
+def __getattr__(name: str) -> Any:
+    # Keeps `from config import RETRIEVER_K` working: module constants resolve through Settings
+    if name.isupper() and name in Settings.__dataclass_fields__:
+        return getattr(get_settings(), name)
+    raise AttributeError(f"module 'config' has no attribute '{name}'")
@@ -0,0 +1,225 @@
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from tokens import count_tokens, truncate_to_tokens
+from config import (
+    LLM_MODEL,
+    CHUNK_OVERLAP,
+    PACK_RAG_TOKENS,
+    PACK_WEB_TOKENS,
+    PACK_HISTORY_TOKENS,
+    PACK_HISTORY_MESSAGES,
+    PACK_DUPLICATE_THRESHOLD,
+    PACK_MIN_OVERLAP_CHARS,
+    PACK_MIN_PASSAGE_TOKENS
+)
+
+
+_WORD = re.compile(r"\w+")
+
+
+def _shingles(text: str, size: int = 3) -> set:
+    words = _WORD.findall(text.lower())
+    if len(words) < size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def _jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _overlap(left: str, right: str, max_chars: int) -> int:
+    """Length of the longest suffix of left that is also a prefix of right"""
+    for size in range(min(len(left), len(right), max_chars), PACK_MIN_OVERLAP_CHARS - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def _relevance(doc, position: int) -> Tuple[float, int]:
+    """Sort key: fused rank score, then vector similarity, then retrieval order"""
+    metadata = getattr(doc, "metadata", None) or {}
+    for key in ("rrf_score", "similarity", "bm25_score"):
+        if metadata.get(key) is not None:
+            return (-float(metadata[key]), position)
+    return (0.0, position)
+
+
+class PackingStats:
+    """Tokens before/after packing per source, plus what was removed and why"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.packed = 0
+        self.sources: Dict[str, Dict[str, int]] = {}
+    
+    def record_packed(self):
+        with self._lock:
+            self.packed += 1
+    
+    def record(self, source: str, **counts: int):
+        with self._lock:
+            stats = self.sources.setdefault(source, {
+                "tokens_in": 0,
+                "tokens_out": 0,
+                "duplicates_removed": 0,
+                "overlap_chars_trimmed": 0,
+                "passages_truncated": 0,
+                "passages_dropped": 0
+            })
+            for key, value in counts.items():
+                stats[key] += value
+    
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            sources = {source: dict(stats) for source, stats in self.sources.items()}
+            packed = self.packed
+        tokens_in = sum(stats["tokens_in"] for stats in sources.values())
+        tokens_out = sum(stats["tokens_out"] for stats in sources.values())
+        for stats in sources.values():
+            stats["tokens_saved"] = stats["tokens_in"] - stats["tokens_out"]
+        return {
+            "packed": packed,
+            "tokens_in": tokens_in,
+            "tokens_out": tokens_out,
+            "tokens_saved": tokens_in - tokens_out,
+            "saved_ratio": round((tokens_in - tokens_out) / tokens_in, 4) if tokens_in else 0.0,
+            "sources": sources
+        }
+
+
+packing_stats = PackingStats()
+
+
+def _fill_budget(passages: List[str], budget: int, source: str) -> List[str]:
+    """
+    Remove duplicate/overlapping passages and fill the token budget in order
+    
+    Passages must already be ranked best first. A passage that does not fit
+    is truncated if enough budget remains, otherwise dropped.
+    """
+    tokens_in = sum(count_tokens(passage, LLM_MODEL) for passage in passages)
+    kept: List[str] = []
+    kept_shingles: List[set] = []
+    duplicates = trimmed_chars = truncated = dropped = 0
+    remaining = budget
+    
+    for passage in passages:
+        shingles = _shingles(passage)
+        if any(_jaccard(shingles, other) >= PACK_DUPLICATE_THRESHOLD for other in kept_shingles):
+            duplicates += 1
+            continue
+        
+        # Neighbouring chunks share CHUNK_OVERLAP characters at their boundary; keep that text once
+        for other in kept:
+            size = _overlap(other, passage, 2 * CHUNK_OVERLAP)
+            if size:
+                passage = passage[size:].lstrip()
+                trimmed_chars += size
+            size = _overlap(passage, other, 2 * CHUNK_OVERLAP)
+            if size:
+                passage = passage[:-size].rstrip()
+                trimmed_chars += size
+        if not passage:
+            duplicates += 1
+            continue
+        
+        tokens = count_tokens(passage, LLM_MODEL)
+        if tokens > remaining:
+            if remaining < PACK_MIN_PASSAGE_TOKENS:
+                dropped += 1
+                continue
+            passage = truncate_to_tokens(passage, remaining - 1, LLM_MODEL).rstrip() + " ..."
+            tokens = count_tokens(passage, LLM_MODEL)
+            truncated += 1
+        
+        kept.append(passage)
+        kept_shingles.append(shingles)
+        remaining -= tokens
+    
+    packing_stats.record(
+        source,
+        tokens_in=tokens_in,
+        tokens_out=budget - remaining,
+        duplicates_removed=duplicates,
+        overlap_chars_trimmed=trimmed_chars,
+        passages_truncated=truncated,
+        passages_dropped=dropped
+    )
+    return kept
+
+
+def pack_rag(rag_docs: Optional[list], budget: int = PACK_RAG_TOKENS) -> List[str]:
+    """Knowledge-base passages ranked by relevance score and fitted to the budget"""
+    if not rag_docs:
+        return []
+    ranked = sorted(enumerate(rag_docs), key=lambda item: _relevance(item[1], item[0]))
+    passages = [
+        doc.page_content if hasattr(doc, "page_content") else str(doc)
+        for _, doc in ranked
+    ]
+    return _fill_budget(passages, budget, "rag")
+
+
+def pack_web(tavily_results: Optional[str], budget: int = PACK_WEB_TOKENS) -> str:
+    """Tavily results (already in relevance order) deduplicated and fitted to the budget"""
+    if not tavily_results or not tavily_results.strip():
+        return ""
+    
+    blocks = [block.strip() for block in re.split(r"\n\s*\n", tavily_results) if block.strip()]
+    # Keep the freshness header ("Web results retrieved ...") outside the budgeted results
+    header = blocks.pop(0) if blocks and blocks[0].startswith("(") else ""
+    kept = _fill_budget(blocks, budget, "web")
+    return "\n\n".join(([header] if header else []) + kept)
+
+
+def pack_history(conversation_history: Optional[List[Dict[str, str]]], budget: int = PACK_HISTORY_TOKENS) -> List[Dict[str, str]]:
+    """Most recent messages that fit the budget, in chronological order"""
+    if not conversation_history:
+        return []
+    
+    recent = conversation_history[-PACK_HISTORY_MESSAGES:]
+    tokens_in = sum(count_tokens(msg.get("content", ""), LLM_MODEL) for msg in recent)
+    kept: List[Dict[str, str]] = []
+    remaining = budget
+    truncated = 0
+    
+    for msg in reversed(recent):
+        content = msg.get("content", "")
+        tokens = count_tokens(content, LLM_MODEL)
+        if tokens > remaining:
+            if remaining < PACK_MIN_PASSAGE_TOKENS:
+                break
+            content = truncate_to_tokens(content, remaining - 1, LLM_MODEL).rstrip() + " ..."
+            tokens = count_tokens(content, LLM_MODEL)
+            truncated += 1
+        kept.append({**msg, "content": content})
+        remaining -= tokens
+    
+    packing_stats.record(
+        "history",
+        tokens_in=tokens_in,
+        tokens_out=budget - remaining,
+        passages_truncated=truncated,
+        passages_dropped=len(recent) - len(kept)
+    )
+    return list(reversed(kept))
+
+
+def pack_context(rag_docs: Optional[list], tavily_results: Optional[str], conversation_history: Optional[List[Dict[str, str]]]) -> Dict[str, Any]:
+    """
+    Pack all generator inputs under their per-source token budgets
+    
+    Returns:
+        rag_passages (list of str), web_results (str) and history (list of messages)
+    """
+    packing_stats.record_packed()
+    return {
+        "rag_passages": pack_rag(rag_docs),
+        "web_results": pack_web(tavily_results),
+        "history": pack_history(conversation_history)
+    }
@@ -1,29 +1,26 @@
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import Docx2txtLoader
-from supabase_vectorstore import get_supabase_retriever, SupabaseVectorStore
-import os
-from config import RETRIEVER_K
+from supabase_vectorstore import get_supabase_retriever, get_hybrid_retriever, get_vectorstore
+from config import HYBRID_RETRIEVAL
 
 
 def load_and_create_vectorstore():
     """
     Load vectorstore from Supabase
-    NOTE: Documents must be migrated first using migrate_to_supabase.py
+    NOTE: Documents must be ingested first using ingest.py
     """
     try:
-        vectorstore = SupabaseVectorStore()
+        vectorstore = get_vectorstore()
         doc_count = vectorstore.get_document_count()
         
         if doc_count == 0:
-            raise ValueError("No documents found in Supabase. Run migration first: python migrate_to_supabase.py")
+            raise ValueError("No documents found in Supabase. Run ingestion first: python ingest.py <file>")
         
         return vectorstore
-        
+    
     except Exception as e:
         raise Exception(f"Error loading Supabase vectorstore: {str(e)}")
 
 
-def get_retriever():
-    """Get retriever from Supabase vectorstore"""
-    retriever = get_supabase_retriever()
+def get_retriever(vectorstore=None):
+    """Get retriever from Supabase vectorstore (vector + BM25 when HYBRID_RETRIEVAL is on)"""
+    retriever = get_hybrid_retriever(vectorstore) if HYBRID_RETRIEVAL else get_supabase_retriever(vectorstore)
     return retriever
@@ -1,33 +1,61 @@
 from langgraph.graph import END, StateGraph, START
-from langchain_openai import ChatOpenAI
+from langchain_core.runnables import RunnableLambda
 from state import AgentState
 from nodes import create_nodes
 from embeddings_setup import get_retriever
+from clients import get_chat_model
 from tools_setup import tavily_search
+from prerouter import get_prerouter
+from metrics import instrument_node, count_decisions
+from request_trace import trace_node, trace_decisions
+from config import PREROUTER_ENABLED, LLM_MODEL
 
 
-def create_graph():
-    """Create and compile the OPTIMIZED Agentic RAG workflow graph"""
+def _node(nodes, name):
+    """Pair a node with its async variant so the graph serves both invoke and ainvoke (both timed and traced)"""
+    func, afunc = trace_node(name, *instrument_node(name, nodes[name], nodes[f"a{name}"]))
+    return RunnableLambda(func, afunc=afunc, name=name)
+
+
+def create_graph(llm=None, retriever=None, tavily_tool=None, prerouter=None):
+    """
+    Create and compile the OPTIMIZED Agentic RAG workflow graph
+    
+    Every dependency defaults to the shared production one; passing stand-ins
+    runs the same compiled graph offline (see benchmarks/agent_bench.py).
+    
+    Args:
+        llm: Chat model for the router, validator and generator
+        retriever: Knowledge base retriever (invoke/ainvoke)
+        tavily_tool: Web search tool (invoke/ainvoke)
+        prerouter: PreRouter consulted before the router LLM
+    """
+    
+    
+    if llm is None:
+        llm = get_chat_model(LLM_MODEL, temperature=0.5)
     
     
-    llm = ChatOpenAI(model="gpt-4o-mini", temperature=0.5)
+    if retriever is None:
+        retriever = get_retriever()
     
     
-    retriever = get_retriever()
+    if prerouter is None and PREROUTER_ENABLED:
+        prerouter = get_prerouter()
     
     
-    nodes = create_nodes(llm, retriever, tavily_search)
+    nodes = create_nodes(llm, retriever, tavily_tool or tavily_search, prerouter=prerouter)
     
     
     workflow = StateGraph(AgentState)
     
     # OPTIMIZED: Single routing node instead of assess + route
-    workflow.add_node("analyze_and_route", nodes["analyze_and_route"])
-    workflow.add_node("execute_rag_tool", nodes["execute_rag_tool"])
-    workflow.add_node("execute_tavily_tool", nodes["execute_tavily_tool"])
-    workflow.add_node("execute_both_tools", nodes["execute_both_tools"])
-    workflow.add_node("validate_and_reason", nodes["validate_and_reason"])
-    workflow.add_node("generate_response", nodes["generate_response"])
+    workflow.add_node("analyze_and_route", _node(nodes, "analyze_and_route"))
+    workflow.add_node("execute_rag_tool", _node(nodes, "execute_rag_tool"))
+    workflow.add_node("execute_tavily_tool", _node(nodes, "execute_tavily_tool"))
+    workflow.add_node("execute_both_tools", _node(nodes, "execute_both_tools"))
+    workflow.add_node("validate_and_reason", _node(nodes, "validate_and_reason"))
+    workflow.add_node("generate_response", _node(nodes, "generate_response"))
     
     
     # OPTIMIZED: Start directly with single routing node
@@ -37,7 +65,7 @@ def create_graph():
     # OPTIMIZED: Direct routing from single node
     workflow.add_conditional_edges(
         "analyze_and_route",
-        nodes["route_decision"],
+        trace_decisions("route", count_decisions("route", nodes["route_decision"])),
         {
             "use_rag": "execute_rag_tool",
             "use_tavily": "execute_tavily_tool",
@@ -54,7 +82,7 @@ def create_graph():
     
     workflow.add_conditional_edges(
         "validate_and_reason",
-        nodes["validation_decision"],
+        trace_decisions("validation", count_decisions("validation", nodes["validation_decision"])),
         {
             "generate": "generate_response",
             "try_rag": "execute_rag_tool",
@@ -0,0 +1,89 @@
+"""
+Knowledge-base ingestion CLI
+
+    python ingest.py cmo_revenue_playbook.md [more files...]
+    python ingest.py --prune cmo_revenue_playbook.md   # also drop chunks the file no longer produces
+    python ingest.py --backfill-ids                    # one-off: re-key rows stored with random IDs
+
+Loads, chunks and upserts documents into rag_table. Document loaders and text
+splitters are only imported here, keeping them out of the serving import graph.
+
+Row IDs are a hash of the chunk content. Tables filled before that carry
+random IDs; ingesting a file re-keys its own legacy rows, and --backfill-ids
+does the same for the whole table (deleting rows with duplicate content).
+Pruning is scoped by the stored "source" (the path as given), so pass files
+with the same path each time.
+"""
+import argparse
+import json
+import os
+import sys
+from typing import List
+
+from config import load_env
+
+
+def load_documents(paths: List[str]) -> list:
+    """Load .docx files with Docx2txtLoader and anything else as plain text"""
+    from langchain_community.document_loaders import Docx2txtLoader, TextLoader
+    
+    documents = []
+    for path in paths:
+        if path.lower().endswith(".docx"):
+            loader = Docx2txtLoader(path)
+        else:
+            loader = TextLoader(path, encoding="utf-8")
+        documents.extend(loader.load())
+    return documents
+
+
+def split_documents(documents: list, chunk_size: int, chunk_overlap: int) -> list:
+    """Split documents into overlapping chunks for embedding"""
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    return splitter.split_documents(documents)
+
+
+def main(argv: List[str] = None) -> int:
+    load_env()
+    from config import CHUNK_SIZE, CHUNK_OVERLAP
+    
+    parser = argparse.ArgumentParser(description="Ingest documents into the Supabase knowledge base")
+    parser.add_argument("paths", nargs="*", help="Files to ingest (.docx, .md, .txt)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--chunk-overlap", type=int, default=CHUNK_OVERLAP)
+    parser.add_argument("--no-skip-existing", action="store_true", help="Re-embed chunks already stored")
+    parser.add_argument("--prune", action="store_true", help="Delete stored chunks of these files that are no longer produced")
+    parser.add_argument("--backfill-ids", action="store_true", help="Re-key every row to its content-hash ID and drop duplicates")
+    args = parser.parse_args(argv)
+    
+    if not args.paths and not args.backfill_ids:
+        parser.error("give files to ingest or --backfill-ids")
+    
+    missing = [path for path in args.paths if not os.path.exists(path)]
+    if missing:
+        print(f"File not found: {', '.join(missing)}")
+        return 1
+    
+    from supabase_vectorstore import get_vectorstore
+    
+    if args.backfill_ids:
+        result = get_vectorstore().reconcile_content_ids()
+        print(f"[OK] Backfill: {result['migrated']} rows re-keyed, {result['duplicates']} duplicates deleted, "
+              f"{len(result['existing'])} rows keyed by content")
+        if not args.paths:
+            return 0
+    
+    chunks = split_documents(load_documents(args.paths), args.chunk_size, args.chunk_overlap)
+    print(f"[OK] Loaded {len(args.paths)} file(s) into {len(chunks)} chunks")
+    
+    report = get_vectorstore().ingest_documents(chunks, skip_existing=not args.no_skip_existing, prune=args.prune)
+    report.pop("ids", None)
+    print(json.dumps(report, indent=2))
+    
+    return 1 if report.get("failed") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,429 @@
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from config import (
+    LOCAL_INDEX_REFRESH_SECONDS,
+    LOCAL_INDEX_VERSION_COLUMN,
+    LOCAL_INDEX_PAGE_SIZE,
+    LOCAL_INDEX_RECONCILE_SECONDS
+)
+
+
+def _parse_embedding(value: Any) -> List[float]:
+    """pgvector columns come back from PostgREST as "[0.1,0.2,...]" strings"""
+    if isinstance(value, str):
+        return json.loads(value)
+    return value
+
+
+def version_key(value: Any) -> Tuple[int, Any]:
+    """Sort key for version column values: numbers and timestamps compare by value, not as text"""
+    if isinstance(value, (int, float)):
+        return (0, float(value))
+    text = str(value)
+    try:
+        parsed = datetime.fromisoformat(text)
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return (0, parsed.timestamp())
+    except ValueError:
+        pass
+    try:
+        return (0, float(text))
+    except ValueError:
+        return (1, text)
+
+
+def _postgrest_literal(value: Any) -> str:
+    """Double-quoted value for a PostgREST or=() filter (timestamps contain reserved . and :)"""
+    text = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{text}"'
+
+
+def _after_cursor_filter(version_column: str, cursor: Tuple[Any, str], include_nulls: bool) -> str:
+    """or=() filter for rows sorting after a (version, id) cursor in (version, id) order, NULL versions last"""
+    version, row_id = cursor
+    if version is None:
+        return f"and({version_column}.is.null,id.gt.{_postgrest_literal(row_id)})"
+    version = _postgrest_literal(version)
+    conditions = [f"{version_column}.gt.{version}", f"and({version_column}.eq.{version},id.gt.{_postgrest_literal(row_id)})"]
+    if include_nulls:
+        conditions.append(f"{version_column}.is.null")
+    return ",".join(conditions)
+
+
+def row_cursor(row: Dict[str, Any], version_column: str) -> Optional[Tuple[Any, str]]:
+    """A row's (version, id) position, or None if it has no version"""
+    version = row.get(version_column)
+    return None if version is None else (version, row["id"])
+
+
+def later_cursor(current: Optional[Tuple[Any, str]], candidate: Optional[Tuple[Any, str]]) -> Optional[Tuple[Any, str]]:
+    """The later of two (version, id) cursors, comparing versions by value"""
+    if candidate is None:
+        return current
+    if current is None or (version_key(candidate[0]), candidate[1]) > (version_key(current[0]), current[1]):
+        return candidate
+    return current
+
+
+def fetch_table_rows(
+    supabase,
+    table_name: str,
+    columns: str,
+    version_column: str,
+    after: Optional[Tuple[Any, str]] = None,
+    page_size: int = LOCAL_INDEX_PAGE_SIZE
+) -> List[Dict[str, Any]]:
+    """
+    Page through a table in (version column, id) order, optionally only rows after a cursor
+    
+    Keyset pagination: each page starts after the (version, id) of the last
+    row seen, so rows sharing a version are neither skipped nor fetched
+    twice, and an incremental refresh with nothing new returns no rows.
+    Rows without a version are included in full loads only (an incremental
+    refresh picks them up through reconciliation).
+    """
+    rows = []
+    cursor = after
+    include_nulls = after is None
+    
+    while True:
+        query = supabase.table(table_name).select(columns)
+        if version_column == "id":
+            if cursor is not None:
+                query = query.gt("id", cursor[1])
+            query = query.order("id")
+        else:
+            if cursor is not None:
+                query = query.or_(_after_cursor_filter(version_column, cursor, include_nulls))
+            query = query.order(version_column).order("id")
+        page = query.limit(page_size).execute().data
+        rows.extend(page)
+        if len(page) < page_size:
+            break
+        cursor = (page[-1].get(version_column), page[-1]["id"])
+    
+    return rows
+
+
+def fetch_table_ids(supabase, table_name: str, page_size: int = LOCAL_INDEX_PAGE_SIZE) -> Set[str]:
+    """Every row ID in the table (one narrow column, paged)"""
+    ids: Set[str] = set()
+    offset = 0
+    
+    while True:
+        result = supabase.table(table_name).select("id").order("id").range(offset, offset + page_size - 1).execute()
+        ids.update(row["id"] for row in result.data)
+        if len(result.data) < page_size:
+            break
+        offset += page_size
+    
+    return ids
+
+
+def fetch_rows_by_id(supabase, table_name: str, columns: str, ids: Iterable[str]) -> List[Dict[str, Any]]:
+    """Rows for specific IDs, looked up in chunks"""
+    ids = list(ids)
+    rows = []
+    for offset in range(0, len(ids), 200):
+        rows.extend(supabase.table(table_name).select(columns).in_("id", ids[offset:offset + 200]).execute().data)
+    return rows
+
+
+def check_version_column(supabase, table_name: str, version_column: str):
+    """Raise if the version column cannot be selected and ordered on (e.g. it does not exist)"""
+    supabase.table(table_name).select(f"id,{version_column}").order(version_column).limit(1).execute()
+
+
+def start_refresher(name: str, interval: float, refresh: Callable[[], None], on_error: Callable[[Exception], None]) -> threading.Thread:
+    """Daemon thread calling refresh every interval seconds"""
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                refresh()
+            except Exception as e:
+                on_error(e)
+    
+    thread = threading.Thread(target=run, name=name, daemon=True)
+    thread.start()
+    return thread
+
+
+class LocalVectorIndex:
+    """
+    In-process mirror of rag_table for sub-millisecond retrieval
+    
+    Embeddings are kept L2-normalized in one contiguous float32 matrix with
+    parallel id/content/metadata arrays. Searches read an immutable snapshot,
+    so refreshes (full or incremental by LOCAL_INDEX_VERSION_COLUMN) swap in
+    new arrays without blocking readers. The version column cannot show
+    deletes, so the mirror's ID set is also reconciled with the table's
+    whenever the row counts differ and every reconcile_seconds.
+    """
+    
+    def __init__(
+        self,
+        supabase,
+        table_name: str,
+        version_column: str = LOCAL_INDEX_VERSION_COLUMN,
+        page_size: int = LOCAL_INDEX_PAGE_SIZE,
+        refresh_seconds: float = LOCAL_INDEX_REFRESH_SECONDS,
+        reconcile_seconds: float = LOCAL_INDEX_RECONCILE_SECONDS
+    ):
+        self.supabase = supabase
+        self.table_name = table_name
+        self.version_column = version_column
+        self.page_size = page_size
+        self.refresh_seconds = refresh_seconds
+        self.reconcile_seconds = reconcile_seconds
+        # False once the version column failed validation: refreshes then only reconcile by ID
+        self.incremental = True
+        
+        self._snapshot: Optional[Tuple[np.ndarray, List[str], List[str], List[dict]]] = None
+        # (version, id) of the newest row seen; incremental refreshes fetch rows after it
+        self._cursor: Optional[Tuple[Any, str]] = None
+        self._write_lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._refresher: Optional[threading.Thread] = None
+        self.loaded_at: Optional[float] = None
+        self.last_refresh: Optional[float] = None
+        self.last_reconcile: Optional[float] = None
+        self.refresh_errors = 0
+        self.reconciled_removed = 0
+        self.reconciled_added = 0
+    
+    @property
+    def loaded(self) -> bool:
+        return self._snapshot is not None
+    
+    @property
+    def _columns(self) -> str:
+        columns = "id,content,metadata,embedding"
+        return f"{columns},{self.version_column}" if self.incremental else columns
+    
+    def validate_version_column(self):
+        """
+        Check that LOCAL_INDEX_VERSION_COLUMN exists and can be ordered on
+        
+        On failure incremental refresh is switched off (refreshes reconcile
+        by ID instead) and the error is re-raised for the warm-up report.
+        """
+        try:
+            check_version_column(self.supabase, self.table_name, self.version_column)
+        except Exception as e:
+            self.incremental = False
+            raise ValueError(
+                f"{self.table_name}.{self.version_column} is not usable for incremental refresh "
+                f"({str(e)}); reconciling by ID instead"
+            ) from e
+    
+    def _fetch_rows(self, after: Optional[Tuple[Any, str]] = None) -> List[Dict[str, Any]]:
+        return fetch_table_rows(
+            self.supabase,
+            self.table_name,
+            self._columns,
+            self.version_column if self.incremental else "id",
+            after=after if self.incremental else None,
+            page_size=self.page_size
+        )
+    
+    def _remote_count(self) -> int:
+        result = self.supabase.table(self.table_name).select("id", count="exact").limit(1).execute()
+        return result.count or 0
+    
+    def load(self):
+        """Full load of the table into memory"""
+        rows = self._fetch_rows()
+        with self._write_lock:
+            self._snapshot = None
+            self._cursor = None
+            self._apply(rows)
+            self.loaded_at = time.time()
+            self.last_refresh = self.loaded_at
+            self.last_reconcile = self.loaded_at
+        self._start_refresher()
+    
+    def ensure_loaded(self):
+        """Load on first use; concurrent first callers wait for a single load"""
+        if self.loaded:
+            return
+        with self._load_lock:
+            if not self.loaded:
+                self.load()
+    
+    def refresh(self):
+        """
+        Incrementally pull rows after the last seen (version, id)
+        
+        Deletes (and rows the version column missed) only show up in the ID
+        set, so it is reconciled when the remote row count differs from the
+        mirror's and otherwise every reconcile_seconds.
+        """
+        if self.incremental:
+            rows = self._fetch_rows(after=self._cursor)
+            with self._write_lock:
+                self._apply(rows)
+        
+        overdue = self.last_reconcile is None or time.time() - self.last_reconcile >= self.reconcile_seconds
+        if not self.incremental or overdue or self._remote_count() != self.size:
+            self.reconcile()
+        self.last_refresh = time.time()
+    
+    def reconcile(self):
+        """Drop mirrored rows no longer in the table and fetch rows the mirror lacks"""
+        remote_ids = fetch_table_ids(self.supabase, self.table_name, self.page_size)
+        snapshot = self._snapshot
+        local_ids = set(snapshot[1]) if snapshot else set()
+        missing = fetch_rows_by_id(self.supabase, self.table_name, self._columns, remote_ids - local_ids)
+        
+        with self._write_lock:
+            # Rows written meanwhile by upsert_rows are in neither set and are kept
+            self._remove(local_ids - remote_ids)
+            self._apply(missing)
+            self.last_reconcile = time.time()
+        self.reconciled_removed += len(local_ids - remote_ids)
+        self.reconciled_added += len(missing)
+    
+    def upsert_rows(self, rows: List[Dict[str, Any]]):
+        """Apply freshly written rows (with embeddings) without a round trip"""
+        if not self.loaded:
+            return
+        with self._write_lock:
+            self._apply(rows)
+    
+    def clear(self):
+        with self._write_lock:
+            self._snapshot = None
+            self._cursor = None
+    
+    def _remove(self, ids: Set[str]):
+        """Drop rows from a new snapshot (caller holds the write lock)"""
+        if not ids or self._snapshot is None:
+            return
+        matrix, row_ids, contents, metadata = self._snapshot
+        keep = [i for i, doc_id in enumerate(row_ids) if doc_id not in ids]
+        self._snapshot = (
+            np.ascontiguousarray(matrix[keep], dtype=np.float32),
+            [row_ids[i] for i in keep],
+            [contents[i] for i in keep],
+            [metadata[i] for i in keep]
+        )
+    
+    def _apply(self, rows: List[Dict[str, Any]]):
+        """Merge rows into a new snapshot (caller holds the write lock)"""
+        if self._snapshot is None:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+            ids, contents, metadata = [], [], []
+        else:
+            matrix, ids, contents, metadata = self._snapshot
+            ids, contents, metadata = list(ids), list(contents), list(metadata)
+        
+        positions = {doc_id: i for i, doc_id in enumerate(ids)}
+        replaced: Dict[int, np.ndarray] = {}
+        appended: List[np.ndarray] = []
+        
+        for row in rows:
+            vector = np.asarray(_parse_embedding(row["embedding"]), dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            if norm:
+                vector = vector / norm
+            
+            position = positions.get(row["id"])
+            if position is None:
+                positions[row["id"]] = len(ids)
+                ids.append(row["id"])
+                contents.append(row["content"])
+                metadata.append(row.get("metadata") or {})
+                appended.append(vector)
+            elif position < len(matrix):
+                replaced[position] = vector
+                contents[position] = row["content"]
+                metadata[position] = row.get("metadata") or {}
+            else:
+                # Duplicate of a row appended earlier in this batch
+                appended[position - len(matrix)] = vector
+            
+            if self.incremental:
+                self._cursor = later_cursor(self._cursor, row_cursor(row, self.version_column))
+        
+        if replaced:
+            matrix = matrix.copy()
+            for position, vector in replaced.items():
+                matrix[position] = vector
+        if appended:
+            new_rows = np.vstack(appended)
+            matrix = new_rows if matrix.size == 0 else np.vstack([matrix, new_rows])
+        
+        self._snapshot = (np.ascontiguousarray(matrix, dtype=np.float32), ids, contents, metadata)
+    
+    @property
+    def size(self) -> int:
+        return len(self._snapshot[1]) if self._snapshot else 0
+    
+    def search(self, query_embedding: List[float], k: int, threshold: float) -> List[Dict[str, Any]]:
+        """
+        Top-k cosine similarity over the mirror
+        
+        Returns:
+            Rows shaped like match_rag_table results (id, content, metadata, similarity)
+        """
+        snapshot = self._snapshot
+        if snapshot is None or len(snapshot[1]) == 0:
+            return []
+        
+        matrix, ids, contents, metadata = snapshot
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        
+        scores = matrix @ query
+        if k < len(scores):
+            top = np.argpartition(-scores, k)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top])]
+        
+        return [
+            {
+                "id": ids[i],
+                "content": contents[i],
+                "metadata": metadata[i],
+                "similarity": float(scores[i])
+            }
+            for i in top
+            if scores[i] > threshold
+        ]
+    
+    def _start_refresher(self):
+        """Background thread pulling incremental updates every refresh_seconds"""
+        if self._refresher is not None or self.refresh_seconds <= 0:
+            return
+        self._refresher = start_refresher("local-index-refresh", self.refresh_seconds, self.refresh, self._on_refresh_error)
+    
+    def _on_refresh_error(self, error: Exception):
+        self.refresh_errors += 1
+        print(f"Local index refresh error: {str(error)}")
+    
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return {
+            "loaded": snapshot is not None,
+            "rows": self.size,
+            "memory_bytes": int(snapshot[0].nbytes) if snapshot else 0,
+            "version": self._cursor[0] if self._cursor else None,
+            "incremental": self.incremental,
+            "loaded_at": self.loaded_at,
+            "last_refresh": self.last_refresh,
+            "last_reconcile": self.last_reconcile,
+            "reconciled_removed": self.reconciled_removed,
+            "reconciled_added": self.reconciled_added,
+            "refresh_errors": self.refresh_errors
+        }
@@ -0,0 +1,236 @@
+"""
+In-process latency and outcome metrics in the Prometheus text format
+
+Served by GET /metrics. Counters and histograms are plain dicts keyed on
+label values behind a lock per metric, so recording costs a dict lookup and
+a bisect.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from config import METRICS_ENABLED
+from request_trace import current_trace
+
+
+# Seconds; covers cache hits (~1 ms) up to slow generations
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+    
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+    
+    def inc(self, amount: float = 1, **labels: str):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+    
+    def collect(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value:g}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels"""
+    
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket (last is +Inf), sum]
+        self._values: Dict[Tuple[str, ...], List[Any]] = {}
+        self._lock = threading.Lock()
+    
+    def observe(self, value: float, **labels: str):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+    
+    def collect(self) -> List[str]:
+        with self._lock:
+            values = {key: (list(counts), total) for key, (counts, total) in self._values.items()}
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                labels = _format_labels(self.labelnames, key, 'le="' + le + '"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total:.6f}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+NODE_DURATION = Histogram("agent_node_duration_seconds", "Graph node latency", ("node",))
+NODE_ERRORS = Counter("agent_node_errors_total", "Graph node exceptions", ("node",))
+EXTERNAL_CALL_DURATION = Histogram(
+    "agent_external_call_duration_seconds", "Latency of calls to OpenAI embeddings, Supabase and Tavily", ("call",)
+)
+EXTERNAL_CALL_ERRORS = Counter("agent_external_call_errors_total", "Failed external calls", ("call",))
+LLM_CALL_DURATION = Histogram("agent_llm_call_duration_seconds", "Chat model call latency per graph node", ("node",))
+LLM_CALL_ERRORS = Counter("agent_llm_call_errors_total", "Failed chat model calls per graph node", ("node",))
+DECISIONS = Counter("agent_decisions_total", "Routing and validation edge decisions", ("edge", "decision"))
+TOOL_FAILURES = Counter(
+    "agent_tool_failures_total", "Tool calls that timed out or failed and were continued without", ("tool", "reason")
+)
+TOOL_ABANDONED = Counter(
+    "agent_tool_abandoned_total", "Timed-out tool calls left running on the tool pool until their HTTP deadline", ("tool",)
+)
+
+REGISTRY = [
+    NODE_DURATION,
+    NODE_ERRORS,
+    EXTERNAL_CALL_DURATION,
+    EXTERNAL_CALL_ERRORS,
+    LLM_CALL_DURATION,
+    LLM_CALL_ERRORS,
+    DECISIONS,
+    TOOL_FAILURES,
+    TOOL_ABANDONED
+]
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format (version 0.0.4)"""
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.collect())
+    return "\n".join(lines) + "\n"
+
+
+@contextmanager
+def external_call(call: str):
+    """Time an external call (works around sync code and around awaits alike); also adds it to the request trace"""
+    trace = current_trace()
+    if not METRICS_ENABLED and trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        if METRICS_ENABLED:
+            EXTERNAL_CALL_ERRORS.inc(call=call)
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        if METRICS_ENABLED:
+            EXTERNAL_CALL_DURATION.observe(duration, call=call)
+        if trace is not None:
+            trace.add_external_call(call, duration)
+
+
+def record_tool_failure(tool: str, reason: str):
+    if METRICS_ENABLED:
+        TOOL_FAILURES.inc(tool=tool, reason=reason)
+
+
+def record_abandoned_tool_call(tool: str):
+    if METRICS_ENABLED:
+        TOOL_ABANDONED.inc(tool=tool)
+
+
+def instrument_node(name: str, func: Callable, afunc: Callable) -> Tuple[Callable, Callable]:
+    """Wrap a node's sync and async functions with latency and error recording"""
+    if not METRICS_ENABLED:
+        return func, afunc
+    
+    def timed(state):
+        start = time.perf_counter()
+        try:
+            return func(state)
+        except Exception:
+            NODE_ERRORS.inc(node=name)
+            raise
+        finally:
+            NODE_DURATION.observe(time.perf_counter() - start, node=name)
+    
+    async def atimed(state):
+        start = time.perf_counter()
+        try:
+            return await afunc(state)
+        except Exception:
+            NODE_ERRORS.inc(node=name)
+            raise
+        finally:
+            NODE_DURATION.observe(time.perf_counter() - start, node=name)
+    
+    return timed, atimed
+
+
+def count_decisions(edge: str, decide: Callable) -> Callable:
+    """Wrap a conditional-edge function so each decision it returns is counted"""
+    if not METRICS_ENABLED:
+        return decide
+    
+    def counted(state):
+        decision = decide(state)
+        DECISIONS.inc(edge=edge, decision=decision)
+        return decision
+    
+    return counted
+
+
+class LLMMetricsCallback(BaseCallbackHandler):
+    """Chat model callback timing every LLM call, labelled with its graph node"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started: Dict[UUID, Tuple[float, str]] = {}
+    
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, metadata: Optional[Dict[str, Any]] = None, **kwargs):
+        with self._lock:
+            self._started[run_id] = (time.perf_counter(), (metadata or {}).get("langgraph_node", "other"))
+    
+    def _finish(self, run_id: UUID, error: bool):
+        with self._lock:
+            started = self._started.pop(run_id, None)
+        if started is None:
+            return
+        start, node = started
+        LLM_CALL_DURATION.observe(time.perf_counter() - start, node=node)
+        if error:
+            LLM_CALL_ERRORS.inc(node=node)
+    
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs):
+        self._finish(run_id, error=False)
+    
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs):
+        self._finish(run_id, error=True)
+
+
+llm_metrics = LLMMetricsCallback()
@@ -1,13 +1,90 @@
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables.config import ContextThreadPoolExecutor
 from pydantic import BaseModel, Field
 from typing import List, Literal
+from concurrent.futures import TimeoutError as FutureTimeoutError
+import asyncio
+import time
 from state import AgentState
-from utils import get_current_datetime_context
+from utils import get_coarse_datetime_context, mentions_datetime
+from validation import score_based_validation, document_score
+from context_packer import pack_context
+from metrics import record_tool_failure, record_abandoned_tool_call
+from clients import call_deadline
+from speculation import speculation_stats, settle_speculation, cancel_speculation, as_awaitable
+from config import (
+    RAG_TOOL_TIMEOUT,
+    TAVILY_TOOL_TIMEOUT,
+    TOOL_EXECUTOR_WORKERS,
+    SPECULATIVE_RETRIEVAL,
+    SPECULATIVE_TAVILY,
+    VALIDATION_MODE,
+    PROMPT_TIME_GRANULARITY_MINUTES,
+    CONTEXT_PACKING
+)
 
 
-def create_nodes(llm, retriever, tavily_search_tool):
-    """Create all node functions for Agentic RAG workflow"""
+# Shared pool for running blocking tool calls concurrently on the sync path
+# (context-propagating so tracing callbacks follow the call into the worker)
+_tool_executor = ContextThreadPoolExecutor(max_workers=TOOL_EXECUTOR_WORKERS, thread_name_prefix="agent-tool")
+
+
+def _submit_with_deadline(func, timeout: float, *args):
+    """
+    Run a blocking tool call on the pool with its HTTP requests bounded by timeout
+    
+    A future cannot be cancelled once running, so the deadline is enforced at
+    the HTTP client instead: the worker returns (with a timeout error) soon
+    after the caller stops waiting, rather than holding a pool slot.
+    """
+    def bounded():
+        with call_deadline(timeout):
+            return func(*args)
+    return _tool_executor.submit(bounded)
+
+
+def _wait_for_future(future, deadline: float, label: str):
+    """Collect a tool future by an absolute deadline, returning None on timeout or error"""
+    try:
+        return future.result(timeout=max(0.0, deadline - time.monotonic()))
+    except FutureTimeoutError:
+        if not future.cancel():
+            # Already running: it keeps its worker until the HTTP deadline fires
+            record_abandoned_tool_call(label)
+        record_tool_failure(label, "timeout")
+        print(f"{label} timed out, continuing with partial results")
+        return None
+    except Exception as e:
+        record_tool_failure(label, "error")
+        print(f"{label} error: {str(e)}")
+        return None
+
+
+async def _await_with_timeout(coro, timeout: float, label: str):
+    """Await a tool coroutine with a deadline, returning None on timeout or error"""
+    try:
+        return await asyncio.wait_for(coro, timeout)
+    except asyncio.TimeoutError:
+        record_tool_failure(label, "timeout")
+        print(f"{label} timed out after {timeout}s, continuing with partial results")
+        return None
+    except Exception as e:
+        record_tool_failure(label, "error")
+        print(f"{label} error: {str(e)}")
+        return None
+
+
+def create_nodes(llm, retriever, tavily_search_tool, prerouter=None):
+    """
+    Create all node functions for Agentic RAG workflow
+    
+    Args:
+        llm: Chat model shared by the router, validator and generator chains
+        retriever: Knowledge base retriever (invoke/ainvoke)
+        tavily_search_tool: Web search tool (invoke/ainvoke)
+        prerouter: Optional PreRouter consulted before the router LLM
+    """
     
     
     # OPTIMIZED: Combined routing decision - single LLM call instead of two
@@ -52,19 +129,102 @@ Analyze the query and make the best routing decision."""),
     
     router_chain = router_prompt | structured_router
     
+    # Sync and async entry points for each tool, keyed by the names used in tools_tried
+    tool_calls = {
+        "rag": (retriever.invoke, retriever.ainvoke),
+        "tavily": (tavily_search_tool.invoke, tavily_search_tool.ainvoke)
+    }
+    tool_timeouts = {"rag": RAG_TOOL_TIMEOUT, "tavily": TAVILY_TOOL_TIMEOUT}
+    
+    speculative_tools = []
+    if SPECULATIVE_RETRIEVAL:
+        speculative_tools.append("rag")
+    if SPECULATIVE_TAVILY:
+        speculative_tools.append("tavily")
+    
+    def _submit_tool(tool: str, question: str, speculative: dict):
+        """Reuse the speculative future for a tool, or submit a fresh call to the pool"""
+        handle = speculative.pop(tool, None)
+        if handle is not None:
+            speculation_stats.record(tool, "used")
+            return handle
+        return _submit_with_deadline(tool_calls[tool][0], tool_timeouts[tool], question)
+    
+    def _atool_call(tool: str, question: str, speculative: dict):
+        """Reuse the speculative task for a tool, or start a fresh async call"""
+        handle = speculative.pop(tool, None)
+        if handle is not None:
+            speculation_stats.record(tool, "used")
+            return as_awaitable(handle)
+        return tool_calls[tool][1](question)
+    
+    def _routed(question: str, tool_choice: str, speculative: dict) -> dict:
+        return {
+            "question": question,
+            "tool_choice": tool_choice,
+            "time_sensitive": mentions_datetime(question),
+            "speculative": settle_speculation(speculative, tool_choice),
+            "tools_tried": []
+        }
+    
     def analyze_and_route(state: AgentState) -> dict:
         """OPTIMIZED: Single-step analysis and routing (replaces assess + route)"""
         messages = state["messages"]
         question = messages[-1].content
+        speculative = dict(state.get("speculative") or {})
+        
+        # OPTIMIZED: Confident pre-router decisions skip the router LLM call entirely
+        pre = prerouter.route(question) if prerouter else None
+        shadow = bool(pre and pre["tool_choice"]) and prerouter.should_shadow()
+        if pre and pre["tool_choice"] and not shadow:
+            prerouter.record_hit(pre)
+            return _routed(question, pre["tool_choice"], speculative)
+        
+        # OPTIMIZED: Speculatively start retrieval while the router LLM runs
+        for tool in speculative_tools:
+            if tool not in speculative:
+                speculative[tool] = _submit_with_deadline(tool_calls[tool][0], tool_timeouts[tool], question)
+                speculation_stats.record(tool, "launched")
         
         # Single LLM call for routing decision
-        decision = router_chain.invoke({"question": question})
+        try:
+            decision = router_chain.invoke({"question": question})
+        except Exception:
+            cancel_speculation(speculative)
+            raise
         
-        return {
-            "question": question,
-            "tool_choice": decision.tool_choice,
-            "tools_tried": []
-        }
+        if prerouter:
+            prerouter.record_llm_decision(question, decision.tool_choice, pre, shadow=shadow)
+        
+        return _routed(question, decision.tool_choice, speculative)
+    
+    async def aanalyze_and_route(state: AgentState) -> dict:
+        """Async variant of analyze_and_route"""
+        messages = state["messages"]
+        question = messages[-1].content
+        speculative = dict(state.get("speculative") or {})
+        
+        pre = await prerouter.aroute(question) if prerouter else None
+        shadow = bool(pre and pre["tool_choice"]) and prerouter.should_shadow()
+        if pre and pre["tool_choice"] and not shadow:
+            prerouter.record_hit(pre)
+            return _routed(question, pre["tool_choice"], speculative)
+        
+        for tool in speculative_tools:
+            if tool not in speculative:
+                speculative[tool] = asyncio.ensure_future(tool_calls[tool][1](question))
+                speculation_stats.record(tool, "launched")
+        
+        try:
+            decision = await router_chain.ainvoke({"question": question})
+        except BaseException:
+            cancel_speculation(speculative)
+            raise
+        
+        if prerouter:
+            prerouter.record_llm_decision(question, decision.tool_choice, pre, shadow=shadow)
+        
+        return _routed(question, decision.tool_choice, speculative)
     
     
     
@@ -72,72 +232,114 @@ Analyze the query and make the best routing decision."""),
         """Execute RAG retrieval from knowledge base"""
         question = state["question"]
         tools_tried = state.get("tools_tried", [])
+        speculative = dict(state.get("speculative") or {})
         
-        try:
-            documents = retriever.invoke(question)
-            
-            if "rag" not in tools_tried:
-                tools_tried.append("rag")
-            
-            return {
-                "rag_documents": documents if documents else [],
-                "tools_tried": tools_tried
-            }
-        except Exception as e:
-            print(f"RAG retrieval error: {str(e)}")
-            
-            if "rag" not in tools_tried:
-                tools_tried.append("rag")
-            
-            return {
-                "rag_documents": [],
-                "tools_tried": tools_tried
-            }
+        future = _submit_tool("rag", question, speculative)
+        documents = _wait_for_future(future, time.monotonic() + RAG_TOOL_TIMEOUT, "RAG retrieval")
+        
+        if "rag" not in tools_tried:
+            tools_tried.append("rag")
+        
+        return {
+            "rag_documents": documents if documents else [],
+            "speculative": speculative,
+            "tools_tried": tools_tried
+        }
     
     def execute_tavily_tool(state: AgentState) -> dict:
         """Execute Tavily web search"""
         question = state["question"]
         tools_tried = state.get("tools_tried", [])
+        speculative = dict(state.get("speculative") or {})
         
-        try:
-            results = tavily_search_tool.invoke(question)
-            
-            if "tavily" not in tools_tried:
-                tools_tried.append("tavily")
-            
-            return {
-                "tavily_results": results if results else "",
-                "tools_tried": tools_tried
-            }
-        except Exception as e:
-            print(f"Tavily search error: {str(e)}")
-           
-            if "tavily" not in tools_tried:
-                tools_tried.append("tavily")
-            
-            return {
-                "tavily_results": "",
-                "tools_tried": tools_tried
-            }
+        future = _submit_tool("tavily", question, speculative)
+        results = _wait_for_future(future, time.monotonic() + TAVILY_TOOL_TIMEOUT, "Tavily search")
+        
+        if "tavily" not in tools_tried:
+            tools_tried.append("tavily")
+        
+        return {
+            "tavily_results": results if results else "",
+            "speculative": speculative,
+            "tools_tried": tools_tried
+        }
+    
+    async def aexecute_rag_tool(state: AgentState) -> dict:
+        """Async variant of execute_rag_tool"""
+        question = state["question"]
+        tools_tried = state.get("tools_tried", [])
+        speculative = dict(state.get("speculative") or {})
+        
+        documents = await _await_with_timeout(
+            _atool_call("rag", question, speculative), RAG_TOOL_TIMEOUT, "RAG retrieval"
+        )
+        
+        if "rag" not in tools_tried:
+            tools_tried.append("rag")
+        
+        return {
+            "rag_documents": documents if documents else [],
+            "speculative": speculative,
+            "tools_tried": tools_tried
+        }
+    
+    async def aexecute_tavily_tool(state: AgentState) -> dict:
+        """Async variant of execute_tavily_tool"""
+        question = state["question"]
+        tools_tried = state.get("tools_tried", [])
+        speculative = dict(state.get("speculative") or {})
+        
+        results = await _await_with_timeout(
+            _atool_call("tavily", question, speculative), TAVILY_TOOL_TIMEOUT, "Tavily search"
+        )
+        
+        if "tavily" not in tools_tried:
+            tools_tried.append("tavily")
+        
+        return {
+            "tavily_results": results if results else "",
+            "speculative": speculative,
+            "tools_tried": tools_tried
+        }
     
     def execute_both_tools(state: AgentState) -> dict:
-        """Execute both RAG and Tavily tools in parallel"""
+        """Execute both RAG and Tavily tools in parallel, each bounded by its own timeout"""
         question = state["question"]
         tools_tried = state.get("tools_tried", [])
+        speculative = dict(state.get("speculative") or {})
         
         
-        rag_docs = []
-        try:
-            rag_docs = retriever.invoke(question)
-        except Exception as e:
-            print(f"RAG retrieval error: {str(e)}")
+        start = time.monotonic()
+        rag_future = _submit_tool("rag", question, speculative)
+        tavily_future = _submit_tool("tavily", question, speculative)
         
+        rag_docs = _wait_for_future(rag_future, start + RAG_TOOL_TIMEOUT, "RAG retrieval")
+        tavily_res = _wait_for_future(tavily_future, start + TAVILY_TOOL_TIMEOUT, "Tavily search")
+        
+        
+        if "rag" not in tools_tried:
+            tools_tried.append("rag")
+        if "tavily" not in tools_tried:
+            tools_tried.append("tavily")
+        
+        return {
+            "rag_documents": rag_docs if rag_docs else [],
+            "tavily_results": tavily_res if tavily_res else "",
+            "speculative": speculative,
+            "tools_tried": tools_tried
+        }
+    
+    async def aexecute_both_tools(state: AgentState) -> dict:
+        """Async variant of execute_both_tools; costs max(rag, tavily) rather than the sum"""
+        question = state["question"]
+        tools_tried = state.get("tools_tried", [])
+        speculative = dict(state.get("speculative") or {})
         
-        tavily_res = ""
-        try:
-            tavily_res = tavily_search_tool.invoke(question)
-        except Exception as e:
-            print(f"Tavily search error: {str(e)}")
+        
+        rag_docs, tavily_res = await asyncio.gather(
+            _await_with_timeout(_atool_call("rag", question, speculative), RAG_TOOL_TIMEOUT, "RAG retrieval"),
+            _await_with_timeout(_atool_call("tavily", question, speculative), TAVILY_TOOL_TIMEOUT, "Tavily search")
+        )
         
         
         if "rag" not in tools_tried:
@@ -148,6 +350,7 @@ Analyze the query and make the best routing decision."""),
         return {
             "rag_documents": rag_docs if rag_docs else [],
             "tavily_results": tavily_res if tavily_res else "",
+            "speculative": speculative,
             "tools_tried": tools_tried
         }
     
@@ -200,13 +403,12 @@ Assess the quality and decide the next action.""")
     
     validator_chain = validator_prompt | structured_validator
     
-    def validate_and_reason(state: AgentState) -> dict:
-        """Validate tool outputs and decide next action"""
+    def _validation_inputs(state: AgentState) -> dict:
+        """Build the validator prompt inputs from the current tool outputs"""
         question = state["question"]
         tool_choice = state.get("tool_choice", "none")
         rag_docs = state.get("rag_documents", [])
         tavily_res = state.get("tavily_results", "")
-        tools_tried = state.get("tools_tried", [])
         
         
         has_rag = rag_docs is not None and len(rag_docs) > 0
@@ -214,24 +416,38 @@ Assess the quality and decide the next action.""")
         
         
         rag_sample = ""
+        rag_summary = "No"
         if has_rag:
             first_doc = rag_docs[0]
             content = first_doc.page_content if hasattr(first_doc, 'page_content') else str(first_doc)
             rag_sample = content[:200] + "..." if len(content) > 200 else content
+            
+            scores = [score for score in (document_score(doc) for doc in rag_docs) if score is not None]
+            rag_summary = f"Yes ({len(rag_docs)} documents"
+            rag_summary += f", top similarity {max(scores):.2f})" if scores else ")"
         
         tavily_sample = ""
         if has_tavily:
             tavily_sample = tavily_res[:200] + "..." if len(tavily_res) > 200 else tavily_res
         
-        
-        validation = validator_chain.invoke({
+        return {
             "question": question,
-            "has_rag": "Yes" if has_rag else "No",
+            "has_rag": rag_summary,
             "rag_sample": rag_sample or "None",
             "has_tavily": "Yes" if has_tavily else "No",
             "tavily_sample": tavily_sample or "None",
             "tool_choice": tool_choice
-        })
+        }
+    
+    def validate_and_reason(state: AgentState) -> dict:
+        """Validate tool outputs and decide next action"""
+        # OPTIMIZED: Settle clear-cut cases from scores; the LLM only sees the ambiguous band
+        if VALIDATION_MODE == "deterministic":
+            verdict, _ = score_based_validation(state)
+            if verdict:
+                return {"validation_result": verdict}
+        
+        validation = validator_chain.invoke(_validation_inputs(state))
         
        
         validation_result = "sufficient" if validation.is_sufficient else "insufficient"
@@ -240,13 +456,30 @@ Assess the quality and decide the next action.""")
             "validation_result": validation_result
         }
     
+    async def avalidate_and_reason(state: AgentState) -> dict:
+        """Async variant of validate_and_reason"""
+        if VALIDATION_MODE == "deterministic":
+            verdict, _ = score_based_validation(state)
+            if verdict:
+                return {"validation_result": verdict}
+        
+        validation = await validator_chain.ainvoke(_validation_inputs(state))
+        
+        validation_result = "sufficient" if validation.is_sufficient else "insufficient"
+        
+        return {
+            "validation_result": validation_result
+        }
+    
     
     
     generator_prompt = ChatPromptTemplate.from_messages([
+        # Static instructions first and byte-identical across requests; everything request-specific
+        # follows in a second message. This prefix (~300 tokens) is below OpenAI's 1024-token
+        # minimum for prompt caching, so it gets no cache hits today; cached_tokens in usage
+        # shows when a longer prompt (e.g. long history) does cross the threshold
         ("system", """You are a specialized Revenue Planning AI Assistant for CMOs and marketing leaders.
 
-{datetime_context}
-
 **Your Expertise:**
 - Revenue planning strategies and frameworks
 - Marketing metrics (CAC, LTV, ARR, MQL, pipeline calculations)
@@ -262,37 +495,46 @@ Assess the quality and decide the next action.""")
 - Be concise but comprehensive (aim for 3-5 sentences for simple queries, more for complex ones)
 - Use data-driven insights and specific examples when available
 - When using web search results, cite sources naturally (e.g., "According to recent data...")
+- Web search results state when they were retrieved; for time-sensitive figures, mention how fresh they are
 - When synthesizing from multiple sources, integrate them smoothly
 - If you don't have enough information, acknowledge it rather than guessing
 - Maintain a professional, advisory tone suitable for C-level executives
-- For date/time queries, use the current system information provided above
-
-{context_instruction}
-
-{history_context}"""),
+- For date/time queries, use the current system information provided below"""),
+        ("system", "{request_context}"),
         ("human", "{question}")
     ])
     
     generator_chain = generator_prompt | llm | StrOutputParser()
     
-    def generate_response(state: AgentState) -> dict:
-        """Generate final response using available context"""
+    def _generation_inputs(state: AgentState) -> dict:
+        """Assemble the generator prompt inputs from tool outputs and history"""
         question = state["question"]
         rag_docs = state.get("rag_documents", [])
         tavily_res = state.get("tavily_results", "")
         conversation_history = state.get("conversation_history", [])
-        tool_choice = state.get("tool_choice", "none")
-        
-        # OPTIMIZED: Get current date/time context
-        datetime_context = get_current_datetime_context()
+        conversation_summary = state.get("conversation_summary") or ""
+        
+        # Date only by default; the exact minute only when the question mentions the date or time
+        granularity = 1 if state.get("time_sensitive") else PROMPT_TIME_GRANULARITY_MINUTES
+        datetime_context = get_coarse_datetime_context(granularity)
+        
+        # OPTIMIZED: Dedupe overlapping chunks and fit each source to its token budget
+        if CONTEXT_PACKING:
+            packed = pack_context(rag_docs, tavily_res, conversation_history)
+            rag_passages = packed["rag_passages"]
+            tavily_res = packed["web_results"]
+            conversation_history = packed["history"]
+        else:
+            rag_passages = [
+                doc.page_content if hasattr(doc, 'page_content') else str(doc)
+                for doc in (rag_docs or [])[:5]
+            ]
+            conversation_history = (conversation_history or [])[-6:]
         
         context_parts = []
         
-        if rag_docs is not None and len(rag_docs) > 0:
-            rag_context = "\n\n".join([
-                doc.page_content if hasattr(doc, 'page_content') else str(doc)
-                for doc in rag_docs[:5]  
-            ])
+        if rag_passages:
+            rag_context = "\n\n".join(rag_passages)
             context_parts.append(f"**Knowledge Base Context:**\n{rag_context}")
         
         if tavily_res is not None and isinstance(tavily_res, str) and len(tavily_res.strip()) > 0:
@@ -305,21 +547,39 @@ Assess the quality and decide the next action.""")
         
        
         history_text = ""
+        if conversation_summary:
+            # Rolling summary of a server-side session's older turns (bounded by SESSION_SUMMARY_MAX_TOKENS)
+            history_text = f"\n**Conversation Summary:**\n{conversation_summary}\n"
         if conversation_history:
-            history_text = "\n**Previous Conversation:**\n"
-            for msg in conversation_history[-6:]:  
+            history_text += "\n**Previous Conversation:**\n"
+            for msg in conversation_history:
                 role = msg.get("role", "unknown")
                 content = msg.get("content", "")
                 history_text += f"{role.capitalize()}: {content}\n"
             history_text += "\nConsider this conversation history for contextually relevant answers."
         
+        # Most to least stable: summary and history (grow append-only within a
+        # conversation), this request's retrieved context, then the datetime
+        request_context = "\n\n".join(
+            part for part in (history_text.strip(), context_instruction, datetime_context) if part
+        )
         
-        generation = generator_chain.invoke({
+        return {
             "question": question,
-            "datetime_context": datetime_context,
-            "context_instruction": context_instruction,
-            "history_context": history_text
-        })
+            "request_context": request_context
+        }
+    
+    def generate_response(state: AgentState) -> dict:
+        """Generate final response using available context"""
+        generation = generator_chain.invoke(_generation_inputs(state))
+        
+        return {
+            "messages": [generation]
+        }
+    
+    async def agenerate_response(state: AgentState) -> dict:
+        """Async variant of generate_response"""
+        generation = await generator_chain.ainvoke(_generation_inputs(state))
         
         return {
             "messages": [generation]
@@ -389,6 +649,14 @@ Assess the quality and decide the next action.""")
         "validate_and_reason": validate_and_reason,
         "generate_response": generate_response,
         
+        # Async variants used by ainvoke/astream
+        "aanalyze_and_route": aanalyze_and_route,
+        "aexecute_rag_tool": aexecute_rag_tool,
+        "aexecute_tavily_tool": aexecute_tavily_tool,
+        "aexecute_both_tools": aexecute_both_tools,
+        "avalidate_and_reason": avalidate_and_reason,
+        "agenerate_response": agenerate_response,
+        
         # Decision functions
         "route_decision": route_decision,
         "validation_decision": validation_decision
@@ -0,0 +1,366 @@
+import base64
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from cache import normalize_text
+from utils import is_datetime_question
+from supabase_vectorstore import get_vectorstore
+from config import (
+    EMBEDDING_DIMENSIONS,
+    PREROUTER_LOG_PATH,
+    PREROUTER_MAX_EXAMPLES,
+    PREROUTER_MIN_EXAMPLES,
+    PREROUTER_MIN_SIMILARITY,
+    PREROUTER_MIN_MARGIN,
+    PREROUTER_SHADOW_RATE,
+    PREROUTER_MIN_AGREEMENT,
+    PREROUTER_AGREEMENT_WINDOW
+)
+
+
+TOOL_CHOICES = ["rag", "tavily", "both", "none"]
+
+# Checked predictions needed before the agreement rate can suspend centroid routing
+_MIN_AGREEMENT_CHECKS = 20
+
+# Short conversational queries the router prompt always sends to "none"
+_LEXICAL_NONE = re.compile(
+    r"^(?:"
+    r"(?:hi|hello|hey|hiya|howdy|greetings|yo)(?: there)?"
+    r"|good (?:morning|afternoon|evening|day)"
+    r"|(?:many )?thanks?(?: you)?(?: (?:so|very) much)?(?: a lot)?|thx|ty|cheers|much appreciated"
+    r"|(?:ok|okay|cool|great|nice|perfect|awesome|got it|sounds good|makes sense)"
+    r"|(?:bye|goodbye|see you|see ya)"
+    r"|how are you(?: doing)?(?: today)?"
+    r")[\s!.?,]*$"
+)
+
+
+class PreRouter:
+    """
+    Zero-LLM routing tier in front of router_chain
+    
+    Trivial conversational queries are routed by lexical rules. Everything
+    else goes through a nearest-centroid classifier over query embeddings,
+    trained online from the LLM router's own decisions; it only answers when
+    the best centroid is both similar enough and clearly ahead of the
+    runner-up. Low-confidence queries fall back to the LLM router.
+    
+    Confident predictions checked against the LLM router (shadow samples, and
+    every prediction while suspended) feed a rolling agreement rate. Below
+    min_agreement centroid routing is suspended, so every query goes to the
+    LLM router, until the rate recovers.
+    """
+    
+    def __init__(
+        self,
+        embed_query: Callable[[str], List[float]],
+        aembed_query: Optional[Callable] = None,
+        log_path: Optional[str] = PREROUTER_LOG_PATH,
+        max_examples: int = PREROUTER_MAX_EXAMPLES,
+        min_examples: int = PREROUTER_MIN_EXAMPLES,
+        min_similarity: float = PREROUTER_MIN_SIMILARITY,
+        min_margin: float = PREROUTER_MIN_MARGIN,
+        shadow_rate: float = PREROUTER_SHADOW_RATE,
+        min_agreement: float = PREROUTER_MIN_AGREEMENT,
+        agreement_window: int = PREROUTER_AGREEMENT_WINDOW,
+        dimensions: int = EMBEDDING_DIMENSIONS
+    ):
+        self.embed_query = embed_query
+        self.aembed_query = aembed_query
+        self.log_path = log_path
+        self.min_examples = min_examples
+        self.min_similarity = min_similarity
+        self.min_margin = min_margin
+        self.shadow_rate = shadow_rate
+        self.min_agreement = min_agreement
+        self.suspended = False
+        self._agreement: deque = deque(maxlen=max(1, agreement_window))
+        
+        # The log only has to hold the examples the learner keeps; it is compacted past 10% slack
+        self._log_limit = max_examples + max(100, max_examples // 10)
+        self._log_lines = 0
+        
+        # Running per-class sums make the centroids incremental: no retraining pass
+        self._examples: deque = deque(maxlen=max_examples)
+        self._sums = np.zeros((len(TOOL_CHOICES), dimensions), dtype=np.float64)
+        self._counts = np.zeros(len(TOOL_CHOICES), dtype=np.int64)
+        self._lock = threading.Lock()
+        self._learner = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prerouter")
+        
+        self._stats = {
+            "decisions": 0,
+            "lexical_hits": 0,
+            "centroid_hits": 0,
+            "llm_fallbacks": 0,
+            "shadow_checks": 0,
+            "shadow_agreements": 0,
+            "fallback_predictions": 0,
+            "fallback_agreements": 0,
+            "suspensions": 0
+        }
+        
+        if log_path:
+            self._load_log(log_path)
+    
+    # ---- classification -------------------------------------------------
+    
+    @staticmethod
+    def lexical_route(question: str) -> Optional[str]:
+        """Rule-based route for obvious conversational queries"""
+        if _LEXICAL_NONE.match(normalize_text(question)) or is_datetime_question(question):
+            return "none"
+        return None
+    
+    @property
+    def trained(self) -> bool:
+        """At least two classes have enough logged examples to compare centroids"""
+        return int((self._counts >= self.min_examples).sum()) >= 2
+    
+    def _classify(self, embedding: List[float]) -> Dict[str, Any]:
+        query = np.asarray(embedding, dtype=np.float64)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        
+        with self._lock:
+            sums = self._sums.copy()
+            eligible = self._counts >= self.min_examples
+        
+        norms = np.linalg.norm(sums, axis=1)
+        norms[norms == 0] = 1.0
+        scores = (sums / norms[:, None]) @ query
+        scores[~eligible] = -1.0
+        
+        order = np.argsort(-scores)
+        best, runner_up = float(scores[order[0]]), float(scores[order[1]])
+        confident = best >= self.min_similarity and best - runner_up >= self.min_margin
+        return {
+            "predicted": TOOL_CHOICES[order[0]],
+            "confidence": round(best - runner_up, 4),
+            "similarity": round(best, 4),
+            "confident": confident
+        }
+    
+    def _decide(self, question: str, embedding: Optional[List[float]]) -> Dict[str, Any]:
+        if embedding is None:
+            return {"tool_choice": None, "predicted": None, "source": None, "embedding": None}
+        
+        result = self._classify(embedding)
+        return {
+            # While suspended, confident predictions are only checked against the LLM router
+            "tool_choice": result["predicted"] if result["confident"] and not self.suspended else None,
+            "predicted": result["predicted"],
+            "confident": result["confident"],
+            "source": "centroid",
+            "confidence": result["confidence"],
+            "similarity": result["similarity"],
+            "embedding": embedding
+        }
+    
+    def route(self, question: str) -> Dict[str, Any]:
+        """
+        Pre-route a question
+        
+        Returns:
+            Dict whose "tool_choice" is set only for confident decisions; the
+            query embedding (if computed) is included for reuse and learning
+        """
+        lexical = self.lexical_route(question)
+        if lexical:
+            return {"tool_choice": lexical, "predicted": lexical, "source": "lexical", "embedding": None}
+        
+        embedding = None
+        if self.trained:
+            try:
+                embedding = self.embed_query(question)
+            except Exception as e:
+                print(f"Pre-router embedding error: {str(e)}")
+        return self._decide(question, embedding)
+    
+    async def aroute(self, question: str) -> Dict[str, Any]:
+        """Async variant of route"""
+        lexical = self.lexical_route(question)
+        if lexical:
+            return {"tool_choice": lexical, "predicted": lexical, "source": "lexical", "embedding": None}
+        
+        embedding = None
+        if self.trained:
+            try:
+                embedding = await self.aembed_query(question) if self.aembed_query else self.embed_query(question)
+            except Exception as e:
+                print(f"Pre-router embedding error: {str(e)}")
+        return self._decide(question, embedding)
+    
+    def should_shadow(self) -> bool:
+        """Sample confident decisions to also run the LLM router and measure agreement"""
+        return random.random() < self.shadow_rate
+    
+    # ---- outcomes and learning -----------------------------------------
+    
+    def record_hit(self, pre: Dict[str, Any]):
+        """A confident pre-route was used and the LLM router was skipped"""
+        with self._lock:
+            self._stats["decisions"] += 1
+            self._stats["lexical_hits" if pre["source"] == "lexical" else "centroid_hits"] += 1
+    
+    def record_llm_decision(self, question: str, tool_choice: str, pre: Optional[Dict[str, Any]], shadow: bool = False):
+        """
+        Log an LLM router decision: update agreement counters and learn from it
+        
+        Args:
+            question: Routed question
+            tool_choice: LLM router decision (the training label)
+            pre: Pre-router result for the same question, if any
+            shadow: True when the pre-route was confident but sampled for checking
+        """
+        with self._lock:
+            self._stats["decisions"] += 1
+            if shadow:
+                self._stats["shadow_checks"] += 1
+                self._stats["shadow_agreements"] += int(pre["tool_choice"] == tool_choice)
+            else:
+                self._stats["llm_fallbacks"] += 1
+                if pre and pre.get("predicted"):
+                    self._stats["fallback_predictions"] += 1
+                    self._stats["fallback_agreements"] += int(pre["predicted"] == tool_choice)
+            
+            if pre and pre.get("source") == "centroid" and (shadow or pre.get("confident")):
+                self._agreement.append(pre["predicted"] == tool_choice)
+                self._update_suspension()
+        
+        if tool_choice not in TOOL_CHOICES or (pre and pre.get("source") == "lexical"):
+            return
+        
+        embedding = pre.get("embedding") if pre else None
+        self._learner.submit(self._learn, question, tool_choice, embedding)
+    
+    def _update_suspension(self):
+        """Suspend or resume centroid routing from the recent agreement rate (caller holds the lock)"""
+        if len(self._agreement) < min(_MIN_AGREEMENT_CHECKS, self._agreement.maxlen):
+            return
+        rate = sum(self._agreement) / len(self._agreement)
+        if not self.suspended and rate < self.min_agreement:
+            self.suspended = True
+            self._stats["suspensions"] += 1
+            print(f"[WARNING] Pre-router agreement {rate:.2f} below {self.min_agreement}; routing with the LLM until it recovers")
+        elif self.suspended and rate >= self.min_agreement:
+            self.suspended = False
+            print(f"[OK] Pre-router agreement recovered to {rate:.2f}; centroid routing resumed")
+    
+    def _learn(self, question: str, tool_choice: str, embedding: Optional[List[float]]):
+        """Add a labelled example (embedding computed here, off the request path, if needed)"""
+        try:
+            if embedding is None:
+                embedding = self.embed_query(question)
+            self._add_example(question, tool_choice, embedding)
+            if self.log_path:
+                self._append_log({
+                    "question": question,
+                    "tool_choice": tool_choice,
+                    # float16 is ample for centroids and keeps a line ~4 KB instead of ~15 KB
+                    "embedding_f16": base64.b64encode(np.asarray(embedding, dtype=np.float16).tobytes()).decode("ascii"),
+                    "ts": time.time()
+                })
+        except Exception as e:
+            print(f"Pre-router learning error: {str(e)}")
+    
+    def _append_log(self, record: Dict[str, Any]):
+        """Append to the decision log, keeping only the newest max_examples lines once it outgrows the limit"""
+        with open(self.log_path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+        self._log_lines += 1
+        if self._log_lines <= self._log_limit:
+            return
+        
+        with open(self.log_path) as f:
+            lines = f.readlines()[-self._examples.maxlen:]
+        temp_path = f"{self.log_path}.tmp"
+        with open(temp_path, "w") as f:
+            f.writelines(lines)
+        os.replace(temp_path, self.log_path)
+        self._log_lines = len(lines)
+    
+    def _add_example(self, question: str, tool_choice: str, embedding: List[float]):
+        # OPTIMIZED: examples are kept as float32 like the embedding cache (half the memory); the
+        # per-class sums stay float64 so adding and later subtracting the same vector is exact
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector = vector / norm
+        label = TOOL_CHOICES.index(tool_choice)
+        
+        with self._lock:
+            if len(self._examples) == self._examples.maxlen:
+                old_label, old_vector = self._examples[0]
+                self._sums[old_label] -= old_vector
+                self._counts[old_label] -= 1
+            self._examples.append((label, vector))
+            self._sums[label] += vector
+            self._counts[label] += 1
+    
+    def _load_log(self, path: str):
+        """Train from previously logged router decisions"""
+        try:
+            with open(path) as f:
+                for line in f:
+                    self._log_lines += 1
+                    record = json.loads(line)
+                    embedding = record.get("embedding")
+                    if record.get("embedding_f16"):
+                        embedding = np.frombuffer(base64.b64decode(record["embedding_f16"]), dtype=np.float16)
+                    if record.get("tool_choice") in TOOL_CHOICES and embedding is not None and len(embedding):
+                        self._add_example(record["question"], record["tool_choice"], embedding)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"[WARNING] Could not load pre-router log {path}: {str(e)}")
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            agreement = list(self._agreement)
+            counts = {choice: int(self._counts[i]) for i, choice in enumerate(TOOL_CHOICES)}
+        
+        hits = stats["lexical_hits"] + stats["centroid_hits"]
+        stats["hit_rate"] = round(hits / stats["decisions"], 4) if stats["decisions"] else 0.0
+        stats["agreement_rate"] = (
+            round(stats["shadow_agreements"] / stats["shadow_checks"], 4) if stats["shadow_checks"] else None
+        )
+        stats["fallback_agreement_rate"] = (
+            round(stats["fallback_agreements"] / stats["fallback_predictions"], 4) if stats["fallback_predictions"] else None
+        )
+        stats["recent_agreement_rate"] = round(sum(agreement) / len(agreement), 4) if agreement else None
+        stats["suspended"] = self.suspended
+        stats["trained"] = self.trained
+        stats["examples"] = counts
+        return stats
+
+
+_prerouter: Optional[PreRouter] = None
+
+
+def get_prerouter() -> PreRouter:
+    """Process-wide pre-router sharing the vector store's cached query embeddings"""
+    global _prerouter
+    if _prerouter is None:
+        vectorstore = get_vectorstore()
+        _prerouter = PreRouter(
+            embed_query=vectorstore.embed_query,
+            aembed_query=vectorstore.aembed_query
+        )
+    return _prerouter
+
+
+def get_prerouter_stats() -> Dict[str, Any]:
+    """Pre-router counters, or an empty dict when it has not been created"""
+    return _prerouter.stats() if _prerouter is not None else {}
@@ -0,0 +1,176 @@
+"""
+Per-request trace of one agent run
+
+Records the node path actually taken, each node's wall time, routing and
+validation decisions (retry hops), cache hits and external call timings.
+Collection is a few appends per node through a context variable, so every
+run is traced; the trace is only returned when a request asks for it
+(Server-Timing on /chat, a final "trace" event on /chat/stream, or the
+JSON "trace" field).
+"""
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from config import REQUEST_TRACE_ENABLED
+
+
+# Validation decisions that send the run somewhere other than straight to generation
+RETRY_DECISIONS = ("try_rag", "try_tavily", "generate_llm")
+
+
+class RequestTrace:
+    """What one agent run did and how long each part took"""
+    
+    def __init__(self):
+        self.start = time.perf_counter()
+        self._lock = threading.Lock()
+        self.nodes: List[Tuple[str, float, float, bool]] = []
+        self.decisions: List[Tuple[str, str]] = []
+        self.cache: Dict[str, Dict[str, int]] = {}
+        self.calls: List[Tuple[str, float]] = []
+    
+    def add_node(self, name: str, started: float, duration: float, failed: bool = False):
+        with self._lock:
+            self.nodes.append((name, started - self.start, duration, failed))
+    
+    def add_decision(self, edge: str, decision: str):
+        with self._lock:
+            self.decisions.append((edge, decision))
+    
+    def add_cache_lookup(self, cache: str, hit: bool):
+        with self._lock:
+            counts = self.cache.setdefault(cache, {"hits": 0, "misses": 0})
+            counts["hits" if hit else "misses"] += 1
+    
+    def add_external_call(self, call: str, duration: float):
+        with self._lock:
+            self.calls.append((call, duration))
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Milliseconds throughout; node start_ms is the offset from the start of the run"""
+        with self._lock:
+            nodes = sorted(self.nodes, key=lambda node: node[1])
+            decisions = list(self.decisions)
+            cache = {name: dict(counts) for name, counts in self.cache.items()}
+            calls = list(self.calls)
+        
+        route = next((decision for edge, decision in decisions if edge == "route"), None)
+        return {
+            "total_ms": round((time.perf_counter() - self.start) * 1000, 1),
+            "path": [name for name, _, _, _ in nodes],
+            "route": route,
+            "retries": [decision for edge, decision in decisions if edge == "validation" and decision in RETRY_DECISIONS],
+            "nodes": [
+                {"node": name, "start_ms": round(offset * 1000, 1), "duration_ms": round(duration * 1000, 1), "error": failed}
+                for name, offset, duration, failed in nodes
+            ],
+            "cache": cache,
+            "external_calls": [{"call": call, "duration_ms": round(duration * 1000, 1)} for call, duration in calls]
+        }
+
+
+_request_trace: ContextVar[Optional[RequestTrace]] = ContextVar("request_trace", default=None)
+
+
+@contextmanager
+def track_request_trace() -> Iterator[Optional[RequestTrace]]:
+    """Trace every node, decision, cache lookup and external call made inside the block"""
+    if not REQUEST_TRACE_ENABLED:
+        yield None
+        return
+    trace = RequestTrace()
+    token = _request_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        try:
+            _request_trace.reset(token)
+        except ValueError:
+            # An async generator resumed in another context; that context never saw the set
+            pass
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return _request_trace.get()
+
+
+def record_cache_lookup(cache: str, hit: bool):
+    trace = _request_trace.get()
+    if trace is not None:
+        trace.add_cache_lookup(cache, hit)
+
+
+def trace_node(name: str, func: Callable, afunc: Callable) -> Tuple[Callable, Callable]:
+    """Wrap a node's sync and async functions so each run is added to the request's trace"""
+    if not REQUEST_TRACE_ENABLED:
+        return func, afunc
+    
+    def traced(state):
+        trace = _request_trace.get()
+        if trace is None:
+            return func(state)
+        start = time.perf_counter()
+        failed = True
+        try:
+            result = func(state)
+            failed = False
+            return result
+        finally:
+            trace.add_node(name, start, time.perf_counter() - start, failed)
+    
+    async def atraced(state):
+        trace = _request_trace.get()
+        if trace is None:
+            return await afunc(state)
+        start = time.perf_counter()
+        failed = True
+        try:
+            result = await afunc(state)
+            failed = False
+            return result
+        finally:
+            trace.add_node(name, start, time.perf_counter() - start, failed)
+    
+    return traced, atraced
+
+
+def trace_decisions(edge: str, decide: Callable) -> Callable:
+    """Wrap a conditional-edge function so its decisions are added to the request's trace"""
+    if not REQUEST_TRACE_ENABLED:
+        return decide
+    
+    def traced(state):
+        decision = decide(state)
+        trace = _request_trace.get()
+        if trace is not None:
+            trace.add_decision(edge, decision)
+        return decision
+    
+    return traced
+
+
+def _token(name: str) -> str:
+    return "".join(char if char.isalnum() or char in "-_" else "-" for char in name)
+
+
+def server_timing(trace: Dict[str, Any]) -> str:
+    """
+    Server-Timing header value for a trace
+    
+    One entry per node in path order (repeated nodes are retries), then the
+    route and retry hops, cache hit counts and the total.
+    """
+    entries = [f"{_token(node['node'])};dur={node['duration_ms']}" for node in trace["nodes"]]
+    if trace["route"]:
+        entries.append(f'route;desc="{_token(trace["route"])}"')
+    if trace["retries"]:
+        entries.append(f'retries;desc="{" ".join(_token(hop) for hop in trace["retries"])}"')
+    for cache, counts in trace["cache"].items():
+        entries.append(f'{_token(cache)}-cache;desc="{counts["hits"]} hit {counts["misses"]} miss"')
+    for call in trace["external_calls"]:
+        entries.append(f"{_token(call['call'])};dur={call['duration_ms']}")
+    entries.append(f"total;dur={trace['total_ms']}")
+    return ", ".join(entries)
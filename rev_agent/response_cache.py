@@ -0,0 +1,196 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from config import (
+    EMBEDDING_DIMENSIONS,
+    RESPONSE_CACHE_SIZE,
+    RESPONSE_CACHE_THRESHOLD,
+    RESPONSE_CACHE_TTL,
+    RESPONSE_CACHE_VOLATILE_TTL
+)
+
+
+# Routes whose answers must expire quickly: live web results, and direct
+# answers, which are written from the prompt's current-date context
+VOLATILE_TOOL_CHOICES = {"tavily", "both", "none"}
+
+
+class SemanticResponseCache:
+    """
+    Answer cache matched on query-embedding cosine similarity
+    
+    Embeddings live in a preallocated float32 matrix (one row per slot) so a
+    lookup is a single matrix-vector product over all cached questions.
+    """
+    
+    def __init__(
+        self,
+        max_size: int,
+        threshold: float,
+        ttl_seconds: float,
+        volatile_ttl_seconds: float,
+        dimensions: int = EMBEDDING_DIMENSIONS
+    ):
+        self.max_size = max_size
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.volatile_ttl_seconds = volatile_ttl_seconds
+        self._matrix = np.zeros((max(max_size, 1), dimensions), dtype=np.float32)
+        self._active = np.zeros(max(max_size, 1), dtype=bool)
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._free_slots = list(range(max_size - 1, -1, -1))
+        self._lock = threading.Lock()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.invalidations = 0
+        self.stale_writes = 0
+    
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+    
+    def _release(self, slot: int):
+        self._active[slot] = False
+        del self._entries[slot]
+        self._free_slots.append(slot)
+    
+    def lookup(self, embedding: List[float]) -> Optional[Dict[str, Any]]:
+        """
+        Find the closest cached answer above the similarity threshold
+        
+        Returns:
+            Dict with answer, similarity, question, tool_choice and age_seconds, or None
+        """
+        query = self._normalize(embedding)
+        now = time.time()
+        
+        with self._lock:
+            if not self._entries:
+                self.misses += 1
+                return None
+            
+            scores = self._matrix @ query
+            scores[~self._active] = -1.0
+            
+            while True:
+                slot = int(np.argmax(scores))
+                similarity = float(scores[slot])
+                if similarity < self.threshold:
+                    self.misses += 1
+                    return None
+                
+                entry = self._entries[slot]
+                if now - entry["stored_at"] <= entry["ttl"]:
+                    break
+                
+                # Expired entries are dropped lazily and the next best match is tried
+                self._release(slot)
+                scores[slot] = -1.0
+            
+            self._entries.move_to_end(slot)
+            self.hits += 1
+            return {
+                "answer": entry["answer"],
+                "similarity": round(similarity, 4),
+                "question": entry["question"],
+                "tool_choice": entry["tool_choice"],
+                "age_seconds": round(now - entry["stored_at"], 1)
+            }
+    
+    def store(
+        self,
+        question: str,
+        embedding: List[float],
+        answer: str,
+        tool_choice: Optional[str],
+        time_sensitive: bool = False,
+        generation: Optional[int] = None
+    ):
+        """
+        Cache an answer
+        
+        Web-backed and direct (no-tool) answers get the short volatile TTL
+        (0 = never cached). Answers to questions mentioning the date or time
+        are never cached: they are stale within minutes whichever route
+        produced them. Pass the generation read before the answer was
+        computed; if invalidate() ran since, the answer may come from the old
+        knowledge base and is dropped.
+        """
+        ttl = self.volatile_ttl_seconds if tool_choice in VOLATILE_TOOL_CHOICES else self.ttl_seconds
+        if time_sensitive or ttl <= 0 or self.max_size <= 0:
+            self.bypassed += 1
+            return
+        
+        vector = self._normalize(embedding)
+        
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                self.stale_writes += 1
+                return
+            
+            if not self._free_slots:
+                oldest_slot = next(iter(self._entries))
+                self._release(oldest_slot)
+            
+            slot = self._free_slots.pop()
+            self._matrix[slot] = vector
+            self._active[slot] = True
+            self._entries[slot] = {
+                "question": question,
+                "answer": answer,
+                "tool_choice": tool_choice,
+                "stored_at": time.time(),
+                "ttl": ttl
+            }
+    
+    def invalidate(self):
+        """Drop every cached answer, e.g. after the knowledge base is re-ingested"""
+        with self._lock:
+            self._entries.clear()
+            self._active[:] = False
+            self._free_slots = list(range(self.max_size - 1, -1, -1))
+            self.generation += 1
+            self.invalidations += 1
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "bypassed": self.bypassed,
+                "invalidations": self.invalidations,
+                "stale_writes": self.stale_writes,
+                "generation": self.generation
+            }
+
+
+_response_cache: Optional[SemanticResponseCache] = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> SemanticResponseCache:
+    """Process-wide semantic response cache"""
+    global _response_cache
+    if _response_cache is None:
+        with _response_cache_lock:
+            if _response_cache is None:
+                _response_cache = SemanticResponseCache(
+                    max_size=RESPONSE_CACHE_SIZE,
+                    threshold=RESPONSE_CACHE_THRESHOLD,
+                    ttl_seconds=RESPONSE_CACHE_TTL,
+                    volatile_ttl_seconds=RESPONSE_CACHE_VOLATILE_TTL
+                )
+    return _response_cache
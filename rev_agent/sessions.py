@@ -0,0 +1,302 @@
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config import (
+    LLM_MODEL,
+    SESSION_BACKEND,
+    SESSION_DIR,
+    SESSION_MAX_SESSIONS,
+    SESSION_TTL,
+    SESSION_RECENT_MESSAGES,
+    SESSION_SUMMARIZE_AFTER,
+    SESSION_MAX_MESSAGES,
+    SESSION_SUMMARY_MAX_TOKENS
+)
+
+
+SESSION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,128}$")
+
+
+def valid_session_id(session_id: str) -> bool:
+    """Session IDs double as file names for the file backend, so keep them to a safe charset"""
+    return bool(SESSION_ID_PATTERN.match(session_id or ""))
+
+
+class SessionBackend:
+    """Persistent session storage behind the in-memory store (the default keeps nothing)"""
+    
+    def load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        return None
+    
+    def save(self, session_id: str, data: Dict[str, Any]):
+        pass
+    
+    def delete(self, session_id: str):
+        pass
+
+
+class FileSessionBackend(SessionBackend):
+    """One JSON file per session, written atomically"""
+    
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+    
+    def _path(self, session_id: str) -> str:
+        return os.path.join(self.directory, f"{session_id}.json")
+    
+    def load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(session_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+    
+    def save(self, session_id: str, data: Dict[str, Any]):
+        path = self._path(session_id)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    
+    def delete(self, session_id: str):
+        try:
+            os.remove(self._path(session_id))
+        except FileNotFoundError:
+            pass
+
+
+def _llm_summarizer(previous_summary: str, messages: List[Dict[str, str]]) -> str:
+    """Fold older messages into the running summary with one short LLM call"""
+    from clients import get_chat_model
+    
+    transcript = "\n".join(f"{msg.get('role', 'unknown').capitalize()}: {msg.get('content', '')}" for msg in messages)
+    prompt = (
+        "You maintain a running summary of a conversation between a user and a Revenue Planning AI Assistant.\n"
+        "Update the summary with the new messages. Keep facts, figures, decisions, the user's goals and open "
+        f"questions; drop pleasantries. Stay under {SESSION_SUMMARY_MAX_TOKENS} tokens and reply with the summary only.\n\n"
+        f"Current summary:\n{previous_summary or '(none)'}\n\n"
+        f"New messages:\n{transcript}"
+    )
+    llm = get_chat_model(LLM_MODEL, temperature=0.0).bind(max_tokens=SESSION_SUMMARY_MAX_TOKENS)
+    return llm.invoke(prompt).content.strip()
+
+
+class SessionStore:
+    """
+    Bounded LRU of conversation sessions with a rolling summary
+    
+    Each session keeps the last SESSION_RECENT_MESSAGES messages verbatim.
+    Once more than SESSION_SUMMARIZE_AFTER older messages have accumulated,
+    they are folded into the summary on a background thread, so the prompt
+    cost of a conversation stays roughly constant however long it runs.
+    """
+    
+    def __init__(
+        self,
+        backend: Optional[SessionBackend] = None,
+        summarizer: Callable[[str, List[Dict[str, str]]], str] = _llm_summarizer,
+        max_sessions: int = SESSION_MAX_SESSIONS,
+        ttl_seconds: float = SESSION_TTL
+    ):
+        self.backend = backend or SessionBackend()
+        self.summarizer = summarizer
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._summarizing: set = set()
+        # Session IDs whose backend delete is queued; loads must not read the old file meanwhile
+        self._pending_deletes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        # One writer thread keeps backend saves ordered; summaries run beside it
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="session-writer")
+        self._summarizer_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="session-summary")
+        self.summaries = 0
+        self.summary_errors = 0
+        self.evictions = 0
+    
+    @staticmethod
+    def _new_session() -> Dict[str, Any]:
+        # first_seq is the sequence number of messages[0]: how many messages were ever dropped from the front
+        return {"summary": "", "messages": [], "summarized_messages": 0, "first_seq": 0, "updated_at": time.time()}
+    
+    @staticmethod
+    def _drop_front(session: Dict[str, Any], count: int):
+        """Remove the oldest `count` messages (caller holds the lock)"""
+        if count > 0:
+            del session["messages"][:count]
+            session["first_seq"] = session.get("first_seq", 0) + count
+    
+    def _get_cached(self, session_id: str) -> Optional[Dict[str, Any]]:
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        if self.ttl_seconds > 0 and time.time() - session["updated_at"] > self.ttl_seconds:
+            del self._sessions[session_id]
+            return None
+        self._sessions.move_to_end(session_id)
+        return session
+    
+    def _put(self, session_id: str, session: Dict[str, Any]):
+        self._sessions[session_id] = session
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self.evictions += 1
+    
+    def _load(self, session_id: str) -> Dict[str, Any]:
+        with self._lock:
+            session = self._get_cached(session_id)
+        if session is not None:
+            return session
+        
+        with self._lock:
+            deleting = session_id in self._pending_deletes
+        try:
+            stored = None if deleting else self.backend.load(session_id)
+        except Exception as e:
+            print(f"Session load error: {str(e)}")
+            stored = None
+        
+        with self._lock:
+            session = self._get_cached(session_id)
+            if session is None:
+                session = stored if stored and (
+                    self.ttl_seconds <= 0 or time.time() - stored.get("updated_at", 0) <= self.ttl_seconds
+                ) else self._new_session()
+                self._put(session_id, session)
+            return session
+    
+    def get_context(self, session_id: str) -> Tuple[str, List[Dict[str, str]]]:
+        """
+        Conversation context for the next turn
+        
+        Returns:
+            (rolling summary, recent messages)
+        """
+        session = self._load(session_id)
+        with self._lock:
+            return session["summary"], list(session["messages"][-SESSION_RECENT_MESSAGES:])
+    
+    def seed(self, session_id: str, messages: List[Dict[str, str]]):
+        """Start an empty session from client-supplied history (first call of a migrated client)"""
+        session = self._load(session_id)
+        with self._lock:
+            if session["messages"] or session["summary"]:
+                return
+            session["messages"] = [dict(msg) for msg in messages][-SESSION_MAX_MESSAGES:]
+        self._after_update(session_id, session)
+    
+    def append_turn(self, session_id: str, question: str, answer: str):
+        """Record a completed question/answer turn and schedule summarization if due"""
+        session = self._load(session_id)
+        with self._lock:
+            session["messages"].append({"role": "user", "content": question})
+            session["messages"].append({"role": "assistant", "content": answer})
+            # Hard cap in case summarization keeps failing
+            self._drop_front(session, len(session["messages"]) - SESSION_MAX_MESSAGES)
+        self._after_update(session_id, session)
+    
+    def _after_update(self, session_id: str, session: Dict[str, Any]):
+        with self._lock:
+            if session.get("deleted"):
+                # Deleted while this update was in flight; saving it would write the session back
+                return
+            session["updated_at"] = time.time()
+            snapshot = json.loads(json.dumps(session))
+            due = (
+                len(session["messages"]) - SESSION_RECENT_MESSAGES >= SESSION_SUMMARIZE_AFTER
+                and session_id not in self._summarizing
+            )
+            if due:
+                self._summarizing.add(session_id)
+            # Queued under the lock so a concurrent delete() is always ordered after this save
+            self._writer.submit(self._save, session_id, snapshot)
+        
+        if due:
+            self._summarizer_pool.submit(self._summarize, session_id, session)
+    
+    def _save(self, session_id: str, data: Dict[str, Any]):
+        try:
+            self.backend.save(session_id, data)
+        except Exception as e:
+            print(f"Session save error: {str(e)}")
+    
+    def _summarize(self, session_id: str, session: Dict[str, Any]):
+        """Fold everything but the recent window into the summary (runs off the request path)"""
+        try:
+            with self._lock:
+                previous_summary = session["summary"]
+                older = session["messages"][:-SESSION_RECENT_MESSAGES]
+                # Sequence number just past the last message being folded
+                folded_until = session.get("first_seq", 0) + len(older)
+            if not older or session.get("deleted"):
+                return
+            
+            summary = self.summarizer(previous_summary, older)
+            
+            with self._lock:
+                if session.get("deleted"):
+                    return
+                # The hard cap may have trimmed some of the folded messages meanwhile; drop only what remains of them
+                self._drop_front(session, folded_until - session.get("first_seq", 0))
+                session["summary"] = summary
+                session["summarized_messages"] += len(older)
+                self.summaries += 1
+            self._after_update(session_id, session)
+        except Exception as e:
+            self.summary_errors += 1
+            print(f"Session summary error: {str(e)}")
+        finally:
+            with self._lock:
+                self._summarizing.discard(session_id)
+    
+    def delete(self, session_id: str):
+        """Forget a session; updates still in flight for it are not saved"""
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            if session is not None:
+                session["deleted"] = True
+            self._pending_deletes[session_id] = self._pending_deletes.get(session_id, 0) + 1
+        self._writer.submit(self._delete, session_id)
+    
+    def _delete(self, session_id: str):
+        try:
+            self.backend.delete(session_id)
+        except Exception as e:
+            print(f"Session delete error: {str(e)}")
+        finally:
+            with self._lock:
+                remaining = self._pending_deletes.pop(session_id, 1) - 1
+                if remaining > 0:
+                    self._pending_deletes[session_id] = remaining
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": type(self.backend).__name__,
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "summarizing": len(self._summarizing),
+                "summaries": self.summaries,
+                "summary_errors": self.summary_errors,
+                "evictions": self.evictions
+            }
+
+
+_session_store: Optional[SessionStore] = None
+
+
+def get_session_store() -> SessionStore:
+    """Process-wide session store using the backend selected by SESSION_BACKEND"""
+    global _session_store
+    if _session_store is None:
+        backend = FileSessionBackend(SESSION_DIR) if SESSION_BACKEND == "file" else SessionBackend()
+        _session_store = SessionStore(backend=backend)
+    return _session_store
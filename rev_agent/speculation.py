@@ -0,0 +1,92 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Dict
+
+
+# Tools each routing decision will actually consume
+ROUTE_TOOLS = {
+    "rag": {"rag"},
+    "tavily": {"tavily"},
+    "both": {"rag", "tavily"},
+    "none": set()
+}
+
+
+class SpeculationStats:
+    """Process-wide counters for speculative tool work started alongside the router"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Dict[str, Dict[str, int]] = {}
+    
+    def record(self, tool: str, outcome: str):
+        """
+        Record a speculative outcome for a tool
+        
+        Args:
+            tool: "rag" or "tavily"
+            outcome: "launched", "used", "cancelled" (stopped before finishing)
+                or "discarded" (finished but the router did not pick the tool)
+        """
+        with self._lock:
+            counts = self._counts.setdefault(
+                tool, {"launched": 0, "used": 0, "cancelled": 0, "discarded": 0}
+            )
+            counts[outcome] += 1
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """Counters per tool plus the share of launched work that was wasted"""
+        with self._lock:
+            result = {}
+            for tool, counts in self._counts.items():
+                wasted = counts["cancelled"] + counts["discarded"]
+                result[tool] = {
+                    **counts,
+                    "wasted": wasted,
+                    "waste_ratio": round(wasted / counts["launched"], 4) if counts["launched"] else 0.0
+                }
+            return result
+
+
+speculation_stats = SpeculationStats()
+
+
+def settle_speculation(speculative: Dict[str, Any], tool_choice: str) -> Dict[str, Any]:
+    """
+    Drop speculative work the routing decision does not need
+    
+    Args:
+        speculative: In-flight handles keyed by tool (asyncio tasks or futures)
+        tool_choice: Router decision
+        
+    Returns:
+        The handles the chosen tool nodes should reuse
+    """
+    needed = ROUTE_TOOLS.get(tool_choice, set())
+    kept = {}
+    
+    for tool, handle in speculative.items():
+        if tool in needed:
+            kept[tool] = handle
+            continue
+        
+        if handle.done():
+            speculation_stats.record(tool, "discarded")
+        else:
+            handle.cancel()
+            speculation_stats.record(tool, "cancelled")
+    
+    return kept
+
+
+def cancel_speculation(speculative: Dict[str, Any]):
+    """Cancel every in-flight speculative handle (e.g. when routing fails)"""
+    settle_speculation(speculative, "none")
+
+
+def as_awaitable(handle):
+    """Wrap a thread-pool future so async nodes can await sync-launched work"""
+    if isinstance(handle, Future):
+        return asyncio.wrap_future(handle)
+    return handle
@@ -1,4 +1,4 @@
-from typing import Annotated, Optional, List, Dict
+from typing import Annotated, Optional, List, Dict, Any
 from typing_extensions import TypedDict
 from langgraph.graph.message import add_messages
 
@@ -9,12 +9,15 @@ class AgentState(TypedDict):
     messages: Annotated[list, add_messages]
     question: Optional[str]
     conversation_history: Optional[List[Dict[str, str]]]
+    conversation_summary: Optional[str]  # rolling summary of older turns for server-side sessions
     
     
     tool_choice: Optional[str]  
+    time_sensitive: Optional[bool]  # question mentions the date/time; its answer is never cached
+    speculative: Optional[Dict[str, Any]]  
     
     
-    rag_documents: Optional[list]  
+    rag_documents: Optional[list]  # Documents; metadata["similarity"] holds the match score
     tavily_results: Optional[str]
     
     
@@ -1,29 +1,168 @@
-from typing import List, Dict, Any, Optional
-from supabase import create_client, Client
-from langchain_openai import OpenAIEmbeddings
-from langchain.schema import Document
+from typing import TYPE_CHECKING, Callable, List, Dict, Any, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from langchain_core.documents import Document
+import asyncio
+import hashlib
+import random
+import time
 import uuid
 
+from cache import get_embedding_cache
+from response_cache import get_response_cache
+from tokens import count_tokens
+from clients import get_supabase_client, aget_supabase_client, get_embeddings
+from local_index import LocalVectorIndex
+from bm25_index import BM25Index
+from metrics import external_call
+from usage import record_embedding_usage
+from request_trace import record_cache_lookup
+
+if TYPE_CHECKING:
+    from supabase.client import Client, AsyncClient
+
 from config import (
-    SUPABASE_URL,
-    SUPABASE_KEY,
-    OPENAI_API_KEY,
     EMBEDDING_MODEL,
-    RETRIEVER_K
+    RETRIEVER_K,
+    INGEST_BATCH_TOKENS,
+    INGEST_BATCH_SIZE,
+    INGEST_CONCURRENCY,
+    INGEST_MAX_RETRIES,
+    RETRIEVAL_BACKEND,
+    HYBRID_RETRIEVAL,
+    HYBRID_CANDIDATES,
+    RRF_K
 )
 
 
+# Fixed namespace so the same chunk content always maps to the same row ID
+CONTENT_ID_NAMESPACE = uuid.UUID("5b0f3c1e-7a2d-4f4b-9a57-2f6f0c6d8e11")
+
+
+def content_hash_id(content: str) -> str:
+    """Deterministic row ID derived from the SHA-256 of the chunk content"""
+    digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
+    return str(uuid.uuid5(CONTENT_ID_NAMESPACE, digest))
+
+
+def _count_tokens(text: str) -> int:
+    """Token count for the embedding model"""
+    return count_tokens(text, EMBEDDING_MODEL)
+
+
+def _with_retries(operation: Callable[[], Any], max_retries: int) -> Tuple[Any, Optional[str], int]:
+    """
+    Run an operation, retrying with exponential backoff
+    
+    Returns:
+        (result or None, error message or None, attempts made)
+    """
+    attempts = 0
+    while True:
+        attempts += 1
+        try:
+            return operation(), None, attempts
+        except Exception as e:
+            if attempts > max_retries:
+                return None, str(e), attempts
+            time.sleep(min(30.0, 0.5 * 2 ** (attempts - 1)) * (1 + random.random()))
+
+
+def _token_batches(rows: List[Dict[str, Any]], max_tokens: int, max_size: int) -> List[List[Dict[str, Any]]]:
+    """Group rows into batches bounded by both token count and row count"""
+    batches = []
+    current: List[Dict[str, Any]] = []
+    current_tokens = 0
+    
+    for row in rows:
+        tokens = _count_tokens(row["content"])
+        if current and (current_tokens + tokens > max_tokens or len(current) >= max_size):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(row)
+        current_tokens += tokens
+    
+    if current:
+        batches.append(current)
+    
+    return batches
+
+
 class SupabaseVectorStore:
     """Vector store using Supabase pgvector for document embeddings"""
     
-    def __init__(self):
-        """Initialize Supabase client and OpenAI embeddings"""
-        self.supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-        self.embeddings = OpenAIEmbeddings(
-            model=EMBEDDING_MODEL,
-            openai_api_key=OPENAI_API_KEY
-        )
+    def __init__(self, supabase: Optional["Client"] = None, async_supabase: Optional["AsyncClient"] = None, embeddings=None):
+        """
+        Attach the shared, pooled Supabase client and OpenAI embeddings
+        
+        Args:
+            supabase: Sync client to use instead of the shared one (e.g. an offline stand-in)
+            async_supabase: Async client to use instead of the shared one
+            embeddings: Embeddings model to use instead of the shared OpenAIEmbeddings
+        """
+        self.supabase: "Client" = supabase if supabase is not None else get_supabase_client()
+        self._async_supabase = async_supabase
+        self.embeddings = embeddings if embeddings is not None else get_embeddings()
         self.table_name = "rag_table"
+        self.embedding_cache = get_embedding_cache()
+        self.backend = RETRIEVAL_BACKEND
+        self.local_index: Optional[LocalVectorIndex] = (
+            LocalVectorIndex(self.supabase, self.table_name) if self.backend == "local" else None
+        )
+        self.keyword_index: Optional[BM25Index] = (
+            BM25Index(self.supabase, self.table_name) if HYBRID_RETRIEVAL else None
+        )
+    
+    async def _get_async_supabase(self) -> "AsyncClient":
+        """Shared async Supabase client, created lazily on the running event loop"""
+        if self._async_supabase is not None:
+            return self._async_supabase
+        return await aget_supabase_client()
+    
+    def embed_query(self, query: str) -> List[float]:
+        """Embed a query, reusing the process-wide embedding cache"""
+        embedding = self.embedding_cache.get(query)
+        record_cache_lookup("embedding", embedding is not None)
+        if embedding is None:
+            with external_call("embedding"):
+                embedding = self.embeddings.embed_query(query)
+            record_embedding_usage([query])
+            self.embedding_cache.set(query, embedding)
+        return embedding
+    
+    async def aembed_query(self, query: str) -> List[float]:
+        """Async variant of embed_query"""
+        embedding = self.embedding_cache.get(query)
+        record_cache_lookup("embedding", embedding is not None)
+        if embedding is None:
+            with external_call("embedding"):
+                embedding = await self.embeddings.aembed_query(query)
+            record_embedding_usage([query])
+            self.embedding_cache.set(query, embedding)
+        return embedding
+    
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """Embed many queries with a single embed_documents call for the ones not cached yet"""
+        missing = list(dict.fromkeys(query for query in queries if self.embedding_cache.get(query) is None))
+        fresh = {}
+        if missing:
+            with external_call("embedding_batch"):
+                fresh = dict(zip(missing, self.embeddings.embed_documents(missing)))
+            record_embedding_usage(missing)
+        for query, embedding in fresh.items():
+            self.embedding_cache.set(query, embedding)
+        return [fresh[query] if query in fresh else self.embed_query(query) for query in queries]
+    
+    async def aembed_queries(self, queries: List[str]) -> List[List[float]]:
+        """Async variant of embed_queries"""
+        missing = list(dict.fromkeys(query for query in queries if self.embedding_cache.get(query) is None))
+        fresh = {}
+        if missing:
+            with external_call("embedding_batch"):
+                fresh = dict(zip(missing, await self.embeddings.aembed_documents(missing)))
+            record_embedding_usage(missing)
+        for query, embedding in fresh.items():
+            self.embedding_cache.set(query, embedding)
+        return [fresh[query] if query in fresh else await self.aembed_query(query) for query in queries]
     
     def add_documents(self, documents: List[Document]) -> List[str]:
         """
@@ -31,35 +170,224 @@ class SupabaseVectorStore:
         
         Args:
             documents: List of LangChain Document objects
-            
+        
         Returns:
-            List of document IDs
+            List of document IDs (newly written and already present)
         """
-        doc_ids = []
+        return self.ingest_documents(documents)["ids"]
+    
+    def ingest_documents(
+        self,
+        documents: List[Document],
+        batch_tokens: int = INGEST_BATCH_TOKENS,
+        batch_size: int = INGEST_BATCH_SIZE,
+        max_workers: int = INGEST_CONCURRENCY,
+        max_retries: int = INGEST_MAX_RETRIES,
+        skip_existing: bool = True,
+        prune: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Batched ingestion pipeline: embed_documents per token-bounded batch,
+        one multi-row upsert per batch, bounded concurrency with retries
+        
+        IDs are derived from a hash of the chunk content, so re-ingesting
+        unchanged chunks is detected up front and skipped. Stored rows of the
+        same sources are reconciled first (see reconcile_content_ids), so rows
+        written with random IDs before content hashing are re-keyed instead
+        of duplicated.
         
+        Args:
+            documents: List of LangChain Document objects
+            batch_tokens: Max estimated tokens embedded per request
+            batch_size: Max chunks per batch
+            max_workers: Batches processed concurrently
+            max_retries: Retries per batch after the first attempt (exponential backoff)
+            skip_existing: Skip chunks whose content-hash ID is already stored (legacy rows are re-keyed either way)
+            prune: Delete stored chunks of the ingested sources that the documents no longer produce
+        
+        Returns:
+            Report with ids, inserted/skipped/migrated/pruned/failed counts and per-batch failures
+        """
+        start = time.monotonic()
+        
+        rows_by_id: Dict[str, Dict[str, Any]] = {}
         for i, doc in enumerate(documents):
-            try:
-                
-                embedding = self.embeddings.embed_query(doc.page_content)
-                
-                
-                doc_data = {
-                    "id": str(uuid.uuid4()),
-                    "content": doc.page_content,
-                    "embedding": embedding,
-                    "metadata": doc.metadata,
-                    "source": doc.metadata.get("source", "unknown"),
-                    "chunk_index": i
-                }
-                
-                
-                result = self.supabase.table(self.table_name).insert(doc_data).execute()
-                doc_ids.append(doc_data["id"])
-                
-            except Exception as e:
+            doc_id = content_hash_id(doc.page_content)
+            if doc_id in rows_by_id:
+                continue
+            rows_by_id[doc_id] = {
+                "id": doc_id,
+                "content": doc.page_content,
+                "metadata": doc.metadata,
+                "source": doc.metadata.get("source", "unknown"),
+                "chunk_index": i
+            }
+        
+        # Always reconciled, even when nothing is skipped: an upsert by content-hash ID
+        # would otherwise add a second copy of every legacy random-ID row
+        sources = sorted({row["source"] for row in rows_by_id.values()})
+        reconciled, error, attempts = _with_retries(
+            lambda: self.reconcile_content_ids(sources, set(rows_by_id), prune), max_retries
+        )
+        if error is not None:
+            # Without knowing what is stored, writing could duplicate legacy rows
+            print(f"[WARNING] Ingestion aborted: stored rows lookup failed after {attempts} attempts: {error}")
+            return {
+                "ids": [],
+                "inserted": 0,
+                "skipped": 0,
+                "failed": len(rows_by_id),
+                "batches": 0,
+                "failed_batches": [],
+                "error": error,
+                "elapsed_seconds": round(time.monotonic() - start, 2)
+            }
+        
+        existing_ids = reconciled["existing"] & set(rows_by_id) if skip_existing else set()
+        pending = [row for doc_id, row in rows_by_id.items() if doc_id not in existing_ids]
+        batches = _token_batches(pending, batch_tokens, batch_size)
+        
+        inserted_ids: List[str] = []
+        failed_batches: List[Dict[str, Any]] = []
+        
+        with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="ingest") as executor:
+            futures = {
+                executor.submit(self._write_batch, batch, max_retries): index
+                for index, batch in enumerate(batches)
+            }
+            for future in as_completed(futures):
+                index = futures[future]
+                batch_ids = [row["id"] for row in batches[index]]
+                error, attempts = future.result()
+                if error is None:
+                    inserted_ids.extend(batch_ids)
+                else:
+                    failed_batches.append({
+                        "batch": index,
+                        "ids": batch_ids,
+                        "attempts": attempts,
+                        "error": error
+                    })
+        
+        if inserted_ids or reconciled["pruned"]:
+            get_response_cache().invalidate()
+        
+        failed_count = sum(len(batch["ids"]) for batch in failed_batches)
+        stored_ids = existing_ids | set(inserted_ids)
+        report = {
+            "ids": [doc_id for doc_id in rows_by_id if doc_id in stored_ids],
+            "inserted": len(inserted_ids),
+            "skipped": len(existing_ids),
+            "migrated": reconciled["migrated"],
+            "duplicates_removed": reconciled["duplicates"],
+            "stale": reconciled["stale"],
+            "pruned": reconciled["pruned"],
+            "failed": failed_count,
+            "batches": len(batches),
+            "failed_batches": sorted(failed_batches, key=lambda batch: batch["batch"]),
+            "elapsed_seconds": round(time.monotonic() - start, 2)
+        }
+        
+        if failed_batches:
+            print(f"[WARNING] Ingestion: {failed_count} chunks in {len(failed_batches)} batches failed")
+        if reconciled["stale"] and not prune:
+            print(f"[WARNING] Ingestion: {reconciled['stale']} stored chunks of these sources are no longer produced (use --prune)")
+        print(f"[OK] Ingestion: {report['inserted']} inserted, {report['skipped']} unchanged, "
+              f"{report['migrated']} re-keyed, {report['pruned']} pruned, "
+              f"{report['batches']} batches in {report['elapsed_seconds']}s")
+        
+        return report
+    
+    def reconcile_content_ids(
+        self,
+        sources: Optional[List[str]] = None,
+        wanted_ids: Optional[set] = None,
+        prune: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Bring stored rows in line with content-hash IDs
+        
+        Rows written before IDs were content hashes carry random uuid4 IDs, so
+        an ID lookup misses them. Each such row is re-keyed to its content-hash
+        ID (no re-embedding) or deleted when that content is already stored.
+        With prune, rows whose content is not in wanted_ids are deleted too.
+        
+        Args:
+            sources: Only rows with these source values (None = whole table)
+            wanted_ids: Content-hash IDs about to be ingested (None = all stored content is wanted)
+            prune: Delete rows whose content-hash ID is not in wanted_ids
+        
+        Returns:
+            {"existing": set of content-hash IDs now stored, "migrated", "duplicates", "stale", "pruned"}
+        """
+        table = self.supabase.table
+        stored = []
+        offset = 0
+        while True:
+            query = table(self.table_name).select("id,content,source")
+            if sources is not None:
+                query = query.in_("source", sources)
+            page = query.order("id").range(offset, offset + 999).execute().data
+            stored.extend(page)
+            if len(page) < 1000:
+                break
+            offset += 1000
+        
+        # Wanted chunks stored under other sources already count as present
+        existing = {row["id"] for row in stored if row["id"] == content_hash_id(row["content"])}
+        if wanted_ids:
+            lookup = [doc_id for doc_id in wanted_ids if doc_id not in existing]
+            for offset in range(0, len(lookup), 200):
+                result = table(self.table_name).select("id").in_("id", lookup[offset:offset + 200]).execute()
+                existing.update(row["id"] for row in result.data)
+        
+        migrated, duplicates, stale = 0, [], []
+        for row in stored:
+            content_id = content_hash_id(row["content"])
+            if wanted_ids is not None and content_id not in wanted_ids:
+                stale.append(row["id"])
+            elif row["id"] == content_id:
                 continue
+            elif content_id in existing:
+                duplicates.append(row["id"])
+            else:
+                table(self.table_name).update({"id": content_id}).eq("id", row["id"]).execute()
+                existing.add(content_id)
+                migrated += 1
+        
+        removed = duplicates + (stale if prune else [])
+        for offset in range(0, len(removed), 200):
+            table(self.table_name).delete().in_("id", removed[offset:offset + 200]).execute()
+        
+        return {
+            "existing": existing,
+            "migrated": migrated,
+            "duplicates": len(duplicates),
+            "stale": len(stale),
+            "pruned": len(stale) if prune else 0
+        }
+    
+    def _write_batch(self, rows: List[Dict[str, Any]], max_retries: int) -> Tuple[Optional[str], int]:
+        """
+        Embed and upsert one batch, retrying with exponential backoff
         
-        return doc_ids
+        Returns:
+            (error message or None, attempts made)
+        """
+        def write():
+            embeddings = self.embeddings.embed_documents([row["content"] for row in rows])
+            payload = [
+                {**row, "embedding": embedding}
+                for row, embedding in zip(rows, embeddings)
+            ]
+            self.supabase.table(self.table_name).upsert(payload).execute()
+            if self.local_index is not None:
+                self.local_index.upsert_rows(payload)
+            if self.keyword_index is not None and self.keyword_index.loaded:
+                self.keyword_index.add_rows(rows)
+        
+        _, error, attempts = _with_retries(write, max_retries)
+        return error, attempts
     
     def similarity_search(
         self, 
@@ -68,44 +396,162 @@ class SupabaseVectorStore:
         threshold: float = 0.2
     ) -> List[Document]:
         """
-        Perform similarity search using Supabase match_documents function
+        Perform similarity search using Supabase match_documents function,
+        or the in-process mirror when RETRIEVAL_BACKEND is "local"
         
         Args:
             query: Search query text
             k: Number of results to return
             threshold: Minimum similarity threshold (0-1)
-            
+        
         Returns:
             List of matching Document objects
         """
         
-        query_embedding = self.embeddings.embed_query(query)
+        query_embedding = self.embed_query(query)
+        
+        if self.local_index is not None:
+            rows = self._local_search(query_embedding, k, threshold)
+            if rows is not None:
+                return self._rows_to_documents(rows)
         
         
         try:
-            result = self.supabase.rpc(
-                "match_rag_table",
-                {
-                    "query_embedding": query_embedding,
-                    "match_threshold": threshold,
-                    "match_count": k
-                }
-            ).execute()
-            
-            
-            documents = []
-            for row in result.data:
-                doc = Document(
-                    page_content=row["content"],
-                    metadata=row.get("metadata", {})
-                )
-                documents.append(doc)
+            with external_call("match_rag_table"):
+                result = self.supabase.rpc(
+                    "match_rag_table",
+                    {
+                        "query_embedding": query_embedding,
+                        "match_threshold": threshold,
+                        "match_count": k
+                    }
+                ).execute()
             
-            return documents
+            return self._rows_to_documents(result.data)
+        
+        except Exception as e:
+            return []
+    
+    async def asimilarity_search(
+        self, 
+        query: str, 
+        k: int = RETRIEVER_K,
+        threshold: float = 0.2
+    ) -> List[Document]:
+        """
+        Async variant of similarity_search that never blocks the event loop
+        
+        Args:
+            query: Search query text
+            k: Number of results to return
+            threshold: Minimum similarity threshold (0-1)
+        
+        Returns:
+            List of matching Document objects
+        """
+        
+        query_embedding = await self.aembed_query(query)
+        
+        if self.local_index is not None:
+            rows = await self._alocal_search(query_embedding, k, threshold)
+            if rows is not None:
+                return self._rows_to_documents(rows)
+        
+        
+        try:
+            supabase = await self._get_async_supabase()
+            with external_call("match_rag_table"):
+                result = await supabase.rpc(
+                    "match_rag_table",
+                    {
+                        "query_embedding": query_embedding,
+                        "match_threshold": threshold,
+                        "match_count": k
+                    }
+                ).execute()
             
+            return self._rows_to_documents(result.data)
+        
+        except Exception as e:
+            return []
+    
+    def _local_search(self, query_embedding: List[float], k: int, threshold: float) -> Optional[List[Dict[str, Any]]]:
+        """Search the in-process mirror; None means fall back to the RPC"""
+        try:
+            self.local_index.ensure_loaded()
+            return self.local_index.search(query_embedding, k, threshold)
         except Exception as e:
+            print(f"Local index error, falling back to match_rag_table: {str(e)}")
+            return None
+    
+    async def _alocal_search(self, query_embedding: List[float], k: int, threshold: float) -> Optional[List[Dict[str, Any]]]:
+        """Async variant of _local_search; only the first load runs off the event loop"""
+        try:
+            if not self.local_index.loaded:
+                await asyncio.to_thread(self.local_index.ensure_loaded)
+            return self.local_index.search(query_embedding, k, threshold)
+        except Exception as e:
+            print(f"Local index error, falling back to match_rag_table: {str(e)}")
+            return None
+    
+    def keyword_search(self, query: str, k: int = HYBRID_CANDIDATES) -> List[Document]:
+        """BM25 search over the in-memory keyword index (empty if hybrid retrieval is off)"""
+        if self.keyword_index is None:
+            return []
+        try:
+            self.keyword_index.ensure_loaded()
+            return self._keyword_rows_to_documents(self.keyword_index.search(query, k))
+        except Exception as e:
+            print(f"Keyword index error: {str(e)}")
             return []
     
+    async def akeyword_search(self, query: str, k: int = HYBRID_CANDIDATES) -> List[Document]:
+        """Async variant of keyword_search; only the first load runs off the event loop"""
+        if self.keyword_index is None:
+            return []
+        try:
+            if not self.keyword_index.loaded:
+                await asyncio.to_thread(self.keyword_index.ensure_loaded)
+            return self._keyword_rows_to_documents(self.keyword_index.search(query, k))
+        except Exception as e:
+            print(f"Keyword index error: {str(e)}")
+            return []
+    
+    def retrieval_stats(self) -> Dict[str, Any]:
+        """Active retrieval backend and, for "local", the mirror's size and freshness"""
+        stats = {"backend": self.backend, "hybrid": self.keyword_index is not None}
+        if self.local_index is not None:
+            stats.update(self.local_index.stats())
+        if self.keyword_index is not None:
+            stats["keyword_index"] = self.keyword_index.stats()
+        return stats
+    
+    @staticmethod
+    def _keyword_rows_to_documents(rows: List[Dict[str, Any]]) -> List[Document]:
+        return [
+            Document(
+                page_content=row["content"],
+                metadata={**(row.get("metadata") or {}), "bm25_score": row["bm25_score"]}
+            )
+            for row in rows
+        ]
+    
+    @staticmethod
+    def _rows_to_documents(rows: List[Dict[str, Any]]) -> List[Document]:
+        """Convert match_rag_table rows into LangChain Documents, keeping the similarity score"""
+        documents = []
+        for row in rows:
+            metadata = dict(row.get("metadata") or {})
+            if row.get("similarity") is not None:
+                metadata["similarity"] = float(row["similarity"])
+            doc = Document(
+                page_content=row["content"],
+                metadata=metadata
+            )
+            documents.append(doc)
+        
+        return documents
+    
     def get_document_count(self) -> int:
         """Get total number of documents in Supabase"""
         try:
@@ -118,18 +564,34 @@ class SupabaseVectorStore:
         """Delete all documents from Supabase (use with caution!)"""
         try:
             result = self.supabase.table(self.table_name).delete().neq("id", "00000000-0000-0000-0000-000000000000").execute()
+            get_response_cache().invalidate()
+            if self.local_index is not None:
+                self.local_index.clear()
+            if self.keyword_index is not None:
+                self.keyword_index.clear()
         except Exception as e:
             pass
 
 
-def get_supabase_retriever():
-    """Get a retriever that uses Supabase for similarity search"""
+_vectorstore: Optional[SupabaseVectorStore] = None
+
+
+def get_vectorstore() -> SupabaseVectorStore:
+    """Process-wide SupabaseVectorStore shared by retrievers and the response cache"""
+    global _vectorstore
+    if _vectorstore is None:
+        _vectorstore = SupabaseVectorStore()
+    return _vectorstore
+
+
+def get_supabase_retriever(vectorstore: Optional[SupabaseVectorStore] = None):
+    """Get a retriever that uses Supabase for similarity search (the shared vectorstore unless one is given)"""
     
     class SupabaseRetriever:
         """Custom retriever wrapper for Supabase"""
         
         def __init__(self):
-            self.vectorstore = SupabaseVectorStore()
+            self.vectorstore = vectorstore if vectorstore is not None else get_vectorstore()
         
         def get_relevant_documents(self, query: str) -> List[Document]:
             """Get relevant documents for a query"""
@@ -138,5 +600,76 @@ def get_supabase_retriever():
         def invoke(self, query: str) -> List[Document]:
             """Invoke method for LangChain compatibility"""
             return self.get_relevant_documents(query)
+        
+        async def aget_relevant_documents(self, query: str) -> List[Document]:
+            """Get relevant documents for a query without blocking the event loop"""
+            return await self.vectorstore.asimilarity_search(query, k=RETRIEVER_K)
+        
+        async def ainvoke(self, query: str) -> List[Document]:
+            """Async invoke method for LangChain compatibility"""
+            return await self.aget_relevant_documents(query)
     
     return SupabaseRetriever()
+
+
+
+def reciprocal_rank_fusion(result_lists: List[List[Document]], k: int, rrf_k: int = RRF_K) -> List[Document]:
+    """
+    Merge ranked result lists by reciprocal rank, keyed on page content
+    
+    Metadata from every list is merged, so a chunk found by both retrievers
+    keeps its vector similarity as well as its bm25_score.
+    
+    Returns:
+        Top-k documents with rrf_score in metadata
+    """
+    fused: Dict[str, Document] = {}
+    scores: Dict[str, float] = {}
+    
+    for documents in result_lists:
+        for rank, doc in enumerate(documents):
+            key = doc.page_content
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank + 1)
+            if key in fused:
+                fused[key].metadata.update(doc.metadata)
+            else:
+                fused[key] = Document(page_content=doc.page_content, metadata=dict(doc.metadata))
+    
+    ranked = sorted(fused, key=lambda key: scores[key], reverse=True)[:k]
+    for key in ranked:
+        fused[key].metadata["rrf_score"] = scores[key]
+    return [fused[key] for key in ranked]
+
+
+def get_hybrid_retriever(vectorstore: Optional[SupabaseVectorStore] = None):
+    """Get a retriever fusing pgvector similarity and BM25 keyword results (the shared vectorstore unless one is given)"""
+    
+    class HybridRetriever:
+        """Vector + keyword retriever merged with reciprocal rank fusion"""
+        
+        def __init__(self):
+            self.vectorstore = vectorstore if vectorstore is not None else get_vectorstore()
+        
+        def get_relevant_documents(self, query: str) -> List[Document]:
+            """Get relevant documents for a query"""
+            vector_docs = self.vectorstore.similarity_search(query, k=HYBRID_CANDIDATES)
+            keyword_docs = self.vectorstore.keyword_search(query, k=HYBRID_CANDIDATES)
+            return reciprocal_rank_fusion([vector_docs, keyword_docs], RETRIEVER_K)
+        
+        def invoke(self, query: str) -> List[Document]:
+            """Invoke method for LangChain compatibility"""
+            return self.get_relevant_documents(query)
+        
+        async def aget_relevant_documents(self, query: str) -> List[Document]:
+            """Run both searches concurrently and fuse the rankings"""
+            vector_docs, keyword_docs = await asyncio.gather(
+                self.vectorstore.asimilarity_search(query, k=HYBRID_CANDIDATES),
+                self.vectorstore.akeyword_search(query, k=HYBRID_CANDIDATES)
+            )
+            return reciprocal_rank_fusion([vector_docs, keyword_docs], RETRIEVER_K)
+        
+        async def ainvoke(self, query: str) -> List[Document]:
+            """Async invoke method for LangChain compatibility"""
+            return await self.aget_relevant_documents(query)
+    
+    return HybridRetriever()
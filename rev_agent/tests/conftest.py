@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+# The app uses flat imports (from config import ...), so run the tests against the app directory
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+
+class FakeClock:
+    """Stand-in for time.time() that only moves when told to"""
+    
+    def __init__(self, start: float = 1_000_000.0):
+        self.now = start
+    
+    def __call__(self) -> float:
+        return self.now
+    
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
@@ -0,0 +1,170 @@
+"""In-memory stand-in for the supabase-py table API used by ingestion and the local indexes"""
+from typing import Any, Callable, Dict, List, Optional
+
+
+def _split_top_level(text: str) -> List[str]:
+    """Split a PostgREST or=() body on commas outside parentheses and quotes"""
+    parts, depth, quoted, current = [], 0, False, ""
+    for index, char in enumerate(text):
+        if char == '"' and (index == 0 or text[index - 1] != "\\"):
+            quoted = not quoted
+        elif not quoted and char == "(":
+            depth += 1
+        elif not quoted and char == ")":
+            depth -= 1
+        elif not quoted and depth == 0 and char == ",":
+            parts.append(current)
+            current = ""
+            continue
+        current += char
+    parts.append(current)
+    return parts
+
+
+def _parse_value(text: str, like: Any) -> Any:
+    """Unquote a filter value and coerce it to the type of the row value it is compared with"""
+    if text.startswith('"'):
+        text = text[1:-1].replace('\\"', '"').replace("\\\\", "\\")
+    if isinstance(like, (int, float)) and not isinstance(like, bool):
+        return type(like)(text)
+    return text
+
+
+def _parse_condition(text: str) -> Callable[[Dict[str, Any]], bool]:
+    """Predicate for one or=() condition: column.gt.value, column.eq.value, column.is.null or and(...)"""
+    if text.startswith("and(") and text.endswith(")"):
+        checks = [_parse_condition(part) for part in _split_top_level(text[4:-1])]
+        return lambda row: all(check(row) for check in checks)
+    column, operator, value = text.split(".", 2)
+    if operator == "is" and value == "null":
+        return lambda row: row.get(column) is None
+    if operator == "eq":
+        return lambda row: row.get(column) is not None and row[column] == _parse_value(value, row[column])
+    if operator == "gt":
+        return lambda row: row.get(column) is not None and row[column] > _parse_value(value, row[column])
+    raise ValueError(f"Unsupported filter: {text}")
+
+
+class FakeResult:
+    def __init__(self, data: List[Dict[str, Any]], count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+
+class FakeQuery:
+    """Chainable PostgREST-style query over a list of row dicts"""
+    
+    def __init__(self, table: "FakeSupabase"):
+        self.table = table
+        self.operation = "select"
+        self.payload: Any = None
+        self.filters: List[Callable[[Dict[str, Any]], bool]] = []
+        self.order_columns: List[str] = []
+        self.row_range: Optional[tuple] = None
+        self.row_limit: Optional[int] = None
+    
+    def select(self, columns: str, count: Optional[str] = None):
+        self.columns = columns
+        return self
+    
+    def in_(self, column: str, values):
+        values = set(values)
+        self.filters.append(lambda row: row.get(column) in values)
+        return self
+    
+    def eq(self, column: str, value):
+        self.filters.append(lambda row: row.get(column) == value)
+        return self
+    
+    def neq(self, column: str, value):
+        self.filters.append(lambda row: row.get(column) != value)
+        return self
+    
+    def gte(self, column: str, value):
+        self.filters.append(lambda row: row.get(column) >= value)
+        return self
+    
+    def gt(self, column: str, value):
+        self.filters.append(lambda row: row.get(column) > value)
+        return self
+    
+    def or_(self, filters: str):
+        checks = [_parse_condition(part) for part in _split_top_level(filters)]
+        self.filters.append(lambda row: any(check(row) for check in checks))
+        return self
+    
+    def order(self, column: str):
+        self.order_columns.append(column)
+        return self
+    
+    def range(self, start: int, end: int):
+        self.row_range = (start, end)
+        return self
+    
+    def limit(self, count: int):
+        self.row_limit = count
+        return self
+    
+    def update(self, values: Dict[str, Any]):
+        self.operation, self.payload = "update", values
+        return self
+    
+    def delete(self):
+        self.operation = "delete"
+        return self
+    
+    def upsert(self, rows: List[Dict[str, Any]]):
+        self.operation, self.payload = "upsert", rows
+        return self
+    
+    def execute(self) -> FakeResult:
+        self.table.calls.append(self.operation)
+        if self.table.fail_next and self.table.fail_operation in (None, self.operation):
+            self.table.fail_next -= 1
+            raise ConnectionError("Supabase unavailable")
+        
+        rows = self.table.rows
+        matched = [row for row in rows if all(check(row) for check in self.filters)]
+        if self.operation == "select":
+            # Ascending with NULLS LAST, like Postgres; a missing column raises KeyError
+            for column in reversed(self.order_columns):
+                matched.sort(key=lambda row: (row[column] is None, row[column] if row[column] is not None else 0))
+            count = len(matched)
+            if self.row_range:
+                matched = matched[self.row_range[0]:self.row_range[1] + 1]
+            if self.row_limit is not None:
+                matched = matched[:self.row_limit]
+            return FakeResult([dict(row) for row in matched], count)
+        if self.operation == "update":
+            for row in matched:
+                row.update(self.payload)
+        elif self.operation == "delete":
+            rows[:] = [row for row in rows if not all(check(row) for check in self.filters)]
+        elif self.operation == "upsert":
+            ids = {row["id"] for row in self.payload}
+            rows[:] = [row for row in rows if row["id"] not in ids] + [dict(row) for row in self.payload]
+        return FakeResult([])
+
+
+class FakeSupabase:
+    """One table's rows; fail_next makes that many upcoming requests (of fail_operation, if set) raise"""
+    
+    def __init__(self, rows: Optional[List[Dict[str, Any]]] = None):
+        self.rows = [dict(row) for row in rows or []]
+        self.fail_next = 0
+        self.fail_operation: Optional[str] = None
+        self.calls: List[str] = []
+    
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self)
+
+
+class FakeEmbeddings:
+    """Two-dimensional embeddings derived from the text length"""
+    
+    def __init__(self):
+        self.calls = 0
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        return [[float(len(text)), 1.0] for text in texts]
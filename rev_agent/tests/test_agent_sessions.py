@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+
+import agent
+
+
+@pytest.fixture
+def turns(monkeypatch):
+    recorded = []
+    
+    async def session_context(session_id, conversation_history=None):
+        return "", None
+    
+    monkeypatch.setattr(agent, "COALESCE_QUERIES", True)
+    monkeypatch.setattr(agent, "_asession_context", session_context)
+    monkeypatch.setattr(agent, "_record_turn", lambda session_id, query, answer: recorded.append((session_id, answer)))
+    return recorded
+
+
+def test_coalesced_queries_record_one_turn_per_session(monkeypatch, turns):
+    runs = []
+    
+    async def execute(query, conversation_history, conversation_summary, run_info, speculative=None):
+        runs.append(query)
+        await asyncio.sleep(0.01)
+        return "Lower CAC by ...", True
+    
+    monkeypatch.setattr(agent, "_aexecute_query", execute)
+    
+    async def main():
+        return await asyncio.gather(
+            *(agent.aquery_agent_with_usage("How do we lower CAC?", session_id="s1") for _ in range(3)),
+            agent.aquery_agent_with_usage("How do we lower CAC?", session_id="s2")
+        )
+    
+    results = asyncio.run(main())
+    assert [result["response"] for result in results] == ["Lower CAC by ..."] * 4
+    # Identical requests share a run only within a session
+    assert len(runs) == 2
+    assert sorted(turns) == [("s1", "Lower CAC by ..."), ("s2", "Lower CAC by ...")]
+
+
+def test_coalesced_streams_record_one_turn(monkeypatch, turns):
+    async def events(query, conversation_history, conversation_summary, run_info):
+        await asyncio.sleep(0.01)
+        yield {"type": "token", "content": "Lower "}
+        yield {"type": "token", "content": "CAC"}
+        yield {"type": "answered", "answered": True}
+    
+    monkeypatch.setattr(agent, "_astream_events", events)
+    
+    async def collect():
+        return [event["content"] async for event in agent.astream_agent("How do we lower CAC?", session_id="s1")]
+    
+    async def main():
+        return await asyncio.gather(collect(), collect())
+    
+    assert asyncio.run(main()) == [["Lower ", "CAC"]] * 2
+    assert turns == [("s1", "Lower CAC")]
@@ -0,0 +1,170 @@
+import math
+
+import pytest
+
+from bm25_index import BM25Index, tokenize
+from tests.fakes import FakeSupabase
+
+
+def _index(rows):
+    index = BM25Index(supabase=None, table_name="rag_table", refresh_seconds=0, k1=1.5, b=0.75)
+    index.add_rows(rows)
+    return index
+
+
+def _row(doc_id, content, **extra):
+    return {"id": doc_id, "content": content, "metadata": {"source": doc_id}, **extra}
+
+
+def test_tokenize_drops_stopwords_and_plural_s_but_not_ss():
+    assert tokenize("What are the MQLs for Q3?") == ["mql", "q3"]
+    assert tokenize("Business deals") == ["business", "deal"]
+    assert tokenize("P&L isn't ARR") == ["p&l", "isn't", "arr"]
+
+
+def test_search_matches_the_bm25_formula():
+    index = _index([
+        _row("a", "pipeline coverage pipeline"),
+        _row("b", "pipeline velocity"),
+        _row("c", "churn rate")
+    ])
+    results = index.search("coverage", k=5)
+    
+    n, df, avgdl = 3, 1, 7 / 3
+    idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+    expected = idf * 1 * 2.5 / (1 + 1.5 * (1 - 0.75 + 0.75 * 3 / avgdl))
+    assert [row["id"] for row in results] == ["a"]
+    assert results[0]["bm25_score"] == pytest.approx(expected, rel=1e-5)
+    assert results[0]["metadata"] == {"source": "a"}
+
+
+def test_search_ranks_by_term_frequency_and_rarity():
+    index = _index([
+        _row("a", "pipeline pipeline forecast"),
+        _row("b", "pipeline forecast forecast"),
+        _row("c", "pipeline churn")
+    ])
+    # "forecast" is rarer than "pipeline", so b's two forecasts beat a's two pipelines
+    assert [row["id"] for row in index.search("pipeline forecast", k=3)] == ["b", "a", "c"]
+    assert [row["id"] for row in index.search("pipeline forecast", k=1)] == ["b"]
+    assert index.search("the of and", k=3) == []
+    assert index.search("unknown", k=3) == []
+
+
+def test_changed_rows_replace_their_old_postings():
+    index = _index([_row("a", "pipeline coverage"), _row("b", "churn")])
+    index.add_rows([_row("a", "net revenue retention")])
+    
+    assert index.search("coverage", k=3) == []
+    assert [row["id"] for row in index.search("retention", k=3)] == ["a"]
+    assert index.stats()["documents"] == 2
+
+
+def test_unchanged_rows_only_update_metadata():
+    index = _index([_row("a", "pipeline coverage")])
+    index.add_rows([{"id": "a", "content": "pipeline coverage", "metadata": {"source": "renamed"}}])
+    
+    assert index.search("pipeline", k=1)[0]["metadata"] == {"source": "renamed"}
+    assert len(index._ids) == 1
+
+
+def test_remove_ids_tombstones_rows():
+    index = _index([_row("a", "pipeline coverage"), _row("b", "pipeline churn")])
+    index.remove_ids(["a", "missing"])
+    index.remove_ids(["a"])
+    
+    assert [row["id"] for row in index.search("pipeline coverage", k=3)] == ["b"]
+    stats = index.stats()
+    assert stats["documents"] == 1
+    assert index._total_length == 2
+
+
+def test_removed_rows_no_longer_count_toward_idf():
+    index = _index([_row("a", "pipeline"), _row("b", "pipeline"), _row("c", "pipeline churn")])
+    index.remove_ids(["a", "b"])
+    
+    # Only c is left, so "pipeline" has df=1 of 1 live document
+    idf = math.log(1 + 0.5 / 1.5)
+    expected = idf * 2.5 / (1 + 1.5)
+    assert index.search("pipeline", k=1)[0]["bm25_score"] == pytest.approx(expected, rel=1e-5)
+
+
+def test_clear_empties_the_index_in_place():
+    index = _index([_row("a", "pipeline coverage", updated_at="2024-01-01T00:00:00")])
+    lock = index._lock
+    index.loaded = True
+    index.clear()
+    
+    assert index.search("pipeline", k=3) == []
+    assert index.stats()["documents"] == 0
+    assert index.stats()["version"] is None
+    assert index._lock is lock
+    assert index.loaded
+    
+    index.add_rows([_row("b", "pipeline churn")])
+    assert [row["id"] for row in index.search("pipeline", k=3)] == ["b"]
+
+
+def test_version_tracks_the_newest_row():
+    index = BM25Index(supabase=None, table_name="rag_table", version_column="updated_at", refresh_seconds=0)
+    index.add_rows([
+        _row("a", "one", updated_at="2024-01-02T00:00:00+00:00"),
+        _row("b", "two", updated_at="2024-01-10T00:00:00+00:00"),
+        _row("c", "three", updated_at="2024-01-09T23:00:00+00:00")
+    ])
+    assert index.stats()["version"] == "2024-01-10T00:00:00+00:00"
+
+
+def _versioned_table():
+    return FakeSupabase([_row("a", "pipeline coverage", updated_at=1), _row("b", "pipeline churn", updated_at=2)])
+
+
+def test_refresh_drops_deleted_rows_when_the_count_differs():
+    table = _versioned_table()
+    index = BM25Index(table, "rag_table", version_column="updated_at", refresh_seconds=0)
+    index.ensure_loaded()
+    
+    del table.rows[0]
+    index.refresh()
+    assert [row["id"] for row in index.search("pipeline", k=5)] == ["b"]
+
+
+def test_periodic_reconcile_catches_a_delete_hidden_by_an_insert():
+    table = _versioned_table()
+    index = BM25Index(table, "rag_table", version_column="updated_at", refresh_seconds=0, reconcile_seconds=0)
+    index.ensure_loaded()
+    
+    # Same row count, and the new row's version is below what the index has seen
+    del table.rows[0]
+    table.rows.append(_row("c", "pipeline forecast", updated_at=0))
+    index.refresh()
+    
+    assert sorted(row["id"] for row in index.search("pipeline", k=5)) == ["b", "c"]
+    assert index.stats()["documents"] == 2
+
+
+def test_reconcile_compacts_once_tombstones_pass_the_threshold():
+    table = FakeSupabase([_row(name, f"pipeline {name}x", updated_at=1) for name in "abcd"])
+    index = BM25Index(table, "rag_table", version_column="updated_at", refresh_seconds=0, compact_dead_fraction=0.5)
+    index.ensure_loaded()
+    
+    del table.rows[0]
+    index.reconcile()
+    assert index.stats()["tombstones"] == 1
+    assert index.compactions == 0
+    
+    del table.rows[0]
+    with index._lock:
+        # What reconcile would leave without compacting
+        index.remove_ids(["b"])
+        expected = index.search("pipeline cx", k=5)
+    index.reconcile()
+    
+    stats = index.stats()
+    assert (stats["documents"], stats["tombstones"], index.compactions) == (2, 0, 1)
+    assert "ax" not in index._postings and "bx" not in index._postings
+    assert stats["version"] == 1
+    # Scores only depend on live documents, so compaction leaves them unchanged
+    actual = index.search("pipeline cx", k=5)
+    assert [row["id"] for row in actual] == [row["id"] for row in expected] == ["c", "d"]
+    assert [row["bm25_score"] for row in actual] == pytest.approx([row["bm25_score"] for row in expected])
@@ -0,0 +1,250 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import cache
+from cache import EmbeddingCache, SingleFlight, StreamFanout, TTLCache, normalize_text
+
+
+@pytest.fixture
+def fake_time(monkeypatch, clock):
+    monkeypatch.setattr(cache.time, "time", clock)
+    return clock
+
+
+def test_normalize_text_folds_case_and_whitespace():
+    assert normalize_text("  What IS\tan  MQL?\n") == "what is an mql?"
+
+
+def test_ttl_cache_evicts_least_recently_used(fake_time):
+    store = TTLCache(max_size=2, ttl_seconds=60)
+    store.set("a", 1)
+    store.set("b", 2)
+    assert store.get("a") == 1  # "b" is now the least recently used
+    store.set("c", 3)
+    
+    assert store.get("b") is None
+    assert store.get("a") == 1
+    assert store.get("c") == 3
+    assert store.evictions == 1
+
+
+def test_ttl_cache_expires_entries(fake_time):
+    store = TTLCache(max_size=10, ttl_seconds=60)
+    store.set("a", 1)
+    
+    fake_time.advance(60)
+    assert store.get_entry("a") == (1, fake_time.now - 60)
+    fake_time.advance(0.001)
+    assert store.get("a") is None
+    assert store.expirations == 1
+    assert len(store) == 0
+
+
+def test_ttl_cache_set_refreshes_the_timestamp(fake_time):
+    store = TTLCache(max_size=10, ttl_seconds=60)
+    store.set("a", 1)
+    fake_time.advance(50)
+    store.set("a", 2)
+    fake_time.advance(50)
+    assert store.get("a") == 2
+
+
+def test_ttl_cache_with_zero_size_stores_nothing():
+    store = TTLCache(max_size=0, ttl_seconds=60)
+    store.set("a", 1)
+    assert store.get("a") is None
+    assert len(store) == 0
+
+
+def test_ttl_cache_stats_count_hits_and_misses(fake_time):
+    store = TTLCache(max_size=10, ttl_seconds=60)
+    store.set("a", 1)
+    store.get("a")
+    store.get("missing")
+    store.clear()
+    store.get("a")
+    
+    stats = store.stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (1, 2, 0)
+    assert stats["hit_rate"] == pytest.approx(1 / 3, abs=1e-4)
+
+
+def test_embedding_cache_keys_on_normalized_text():
+    embeddings = EmbeddingCache("model", max_size=10, ttl_seconds=60, use_float32=True)
+    embeddings.set("What is an MQL?", [0.5, 0.25])
+    
+    assert embeddings.get("  what is an mql? ") == [0.5, 0.25]
+    assert EmbeddingCache("other-model", 10, 60).get("What is an MQL?") is None
+
+
+def test_single_flight_shares_one_execution():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+    
+    def slow():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "answer"
+    
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do("key", slow)))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(flight.do("key", slow))) for _ in range(3)]
+    for follower in followers:
+        follower.start()
+    # Followers attach while the leader is still running
+    while flight.stats()["shared"] < 3:
+        time.sleep(0.001)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+    
+    assert results == ["answer"] * 4
+    assert len(calls) == 1
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_single_flight_shares_errors_and_then_forgets_them():
+    flight = SingleFlight()
+    
+    def fail():
+        raise ValueError("upstream down")
+    
+    with pytest.raises(ValueError):
+        flight.do("key", fail)
+    # A finished call is not cached: the next caller runs again
+    assert flight.do("key", lambda: "recovered") == "recovered"
+    assert flight.stats()["executions"] == 2
+
+
+def test_single_flight_async_callers_share_a_task():
+    flight = SingleFlight()
+    calls = []
+    
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "answer"
+    
+    async def main():
+        return await asyncio.gather(*(flight.ado("key", fetch) for _ in range(5)))
+    
+    assert asyncio.run(main()) == ["answer"] * 5
+    assert len(calls) == 1
+    assert flight.stats()["shared"] == 4
+
+
+def test_single_flight_cancelled_caller_does_not_cancel_the_shared_call():
+    flight = SingleFlight()
+    
+    async def fetch():
+        await asyncio.sleep(0.02)
+        return "answer"
+    
+    async def main():
+        first = asyncio.ensure_future(flight.ado("key", fetch))
+        second = asyncio.ensure_future(flight.ado("key", fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second, first.cancelled()
+    
+    assert asyncio.run(main()) == ("answer", True)
+
+
+async def _collect(events):
+    return [event async for event in events]
+
+
+async def _aiter(items):
+    for item in items:
+        yield item
+
+
+def test_stream_fanout_late_joiner_replays_earlier_events():
+    fanout = StreamFanout()
+    calls = []
+    
+    async def main():
+        release = asyncio.Event()
+        
+        async def events():
+            calls.append(1)
+            yield "routing"
+            await release.wait()
+            yield "token"
+        
+        first = fanout.subscribe("key", events)
+        assert await first.__anext__() == "routing"
+        
+        # Joins after "routing" was produced
+        late = asyncio.ensure_future(_collect(fanout.subscribe("key", events)))
+        await asyncio.sleep(0)
+        release.set()
+        return [event async for event in first], await late
+    
+    rest, late = asyncio.run(main())
+    assert rest == ["token"]
+    assert late == ["routing", "token"]
+    assert len(calls) == 1
+    assert fanout.stats() == {"executions": 1, "shared": 1, "coalescing_ratio": 0.5, "in_flight": 0}
+
+
+def test_stream_fanout_cancels_the_producer_when_the_last_subscriber_leaves():
+    fanout = StreamFanout()
+    seen = []
+    
+    async def main():
+        async def events():
+            try:
+                yield "routing"
+                await asyncio.sleep(10)
+                yield "token"
+            except asyncio.CancelledError:
+                seen.append("cancelled")
+                raise
+        
+        first = fanout.subscribe("key", events)
+        second = fanout.subscribe("key", events)
+        assert await first.__anext__() == "routing"
+        assert await second.__anext__() == "routing"
+        task = next(iter(fanout._streams.values()))["task"]
+        
+        await first.aclose()
+        await asyncio.sleep(0)
+        assert not task.done()  # one subscriber is still following
+        
+        await second.aclose()
+        await asyncio.gather(task)
+        # _produce swallows the cancellation: the task ends normally, with nothing left to retrieve
+        return task.cancelled(), task.exception()
+    
+    assert asyncio.run(main()) == (False, None)
+    assert seen == ["cancelled"]
+    assert fanout.stats()["in_flight"] == 0
+
+
+def test_stream_fanout_shares_errors_and_then_forgets_the_stream():
+    fanout = StreamFanout()
+    
+    async def failing():
+        yield "routing"
+        raise ValueError("upstream down")
+    
+    async def main():
+        results = await asyncio.gather(
+            *(_collect(fanout.subscribe("key", failing)) for _ in range(2)),
+            return_exceptions=True
+        )
+        return results, await _collect(fanout.subscribe("key", lambda: _aiter(["fresh"])))
+    
+    results, fresh = asyncio.run(main())
+    assert all(isinstance(result, ValueError) for result in results)
+    assert fresh == ["fresh"]
+    assert fanout.stats()["executions"] == 2
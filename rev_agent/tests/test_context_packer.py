@@ -0,0 +1,79 @@
+import pytest
+from langchain_core.documents import Document
+
+import tokens
+from config import LLM_MODEL
+from context_packer import pack_history, pack_rag, pack_web
+
+
+@pytest.fixture(autouse=True)
+def estimated_tokens(monkeypatch):
+    # Count tokens as ~4 chars each so budgets are exact and nothing is downloaded
+    monkeypatch.setitem(tokens._encodings, LLM_MODEL, False)
+
+
+def _sentence(topic: str, words: int = 40) -> str:
+    return " ".join(f"{topic}{i}" for i in range(words))
+
+
+def test_rag_passages_are_ordered_by_score():
+    docs = [
+        Document(page_content=_sentence("low"), metadata={"similarity": 0.5}),
+        Document(page_content=_sentence("high"), metadata={"similarity": 0.9}),
+        Document(page_content=_sentence("unscored"))
+    ]
+    passages = pack_rag(docs, budget=10_000)
+    assert [passage.split()[0] for passage in passages] == ["high0", "low0", "unscored0"]
+
+
+def test_fused_score_takes_precedence_over_similarity():
+    docs = [
+        Document(page_content=_sentence("vector"), metadata={"rrf_score": 1 / 61, "similarity": 0.9}),
+        Document(page_content=_sentence("both"), metadata={"rrf_score": 1 / 61 + 1 / 62, "similarity": 0.7})
+    ]
+    assert [passage.split()[0] for passage in pack_rag(docs, budget=10_000)] == ["both0", "vector0"]
+
+
+def test_near_duplicate_passages_are_removed():
+    text = _sentence("pipeline")
+    passages = pack_rag([text, text + " extra", _sentence("churn")], budget=10_000)
+    assert passages == [text, _sentence("churn")]
+
+
+def test_shared_chunk_overlap_is_kept_once():
+    shared = "Coverage is the ratio of open pipeline to the remaining quota for the period."
+    first = "Pipeline reviews happen weekly with every account executive. " + shared
+    second = shared + " A ratio below three usually means the forecast is at risk."
+    
+    passages = pack_rag([first, second], budget=10_000)
+    assert passages[0] == first
+    assert passages[1] == "A ratio below three usually means the forecast is at risk."
+
+
+def test_passages_are_truncated_or_dropped_at_the_budget():
+    long = "x" * 800   # 201 tokens
+    second = "y" * 800
+    
+    passages = pack_rag([long, second], budget=300)
+    assert passages[0] == long
+    # 99 tokens left: enough to keep a truncated second passage
+    assert passages[1] == "y" * (98 * 4) + " ..."
+    
+    # 49 tokens left is below PACK_MIN_PASSAGE_TOKENS, so the second passage is dropped
+    assert pack_rag([long, second], budget=250) == [long]
+
+
+def test_web_results_keep_their_freshness_header():
+    results = "(Web results retrieved 2024-05-01)\n\nFirst result\n\n\nFirst result\n\nSecond result"
+    assert pack_web(results, budget=1000) == "(Web results retrieved 2024-05-01)\n\nFirst result\n\nSecond result"
+    assert pack_web("   ", budget=1000) == ""
+
+
+def test_history_keeps_the_newest_messages_in_order():
+    history = [{"role": "user" if i % 2 == 0 else "assistant", "content": f"message {i} " + "z" * 396} for i in range(8)]
+    
+    packed = pack_history(history, budget=320)
+    # Each message is ~101 tokens: the newest three fit, the fourth would be under the minimum
+    assert [msg["content"].split()[1] for msg in packed] == ["5", "6", "7"]
+    assert [msg["role"] for msg in packed] == ["assistant", "user", "assistant"]
+    assert pack_history([], budget=320) == []
@@ -0,0 +1,37 @@
+import re
+from unittest.mock import MagicMock
+
+from langchain_core.runnables import RunnableLambda
+
+import nodes
+
+
+def _generate(state):
+    prompts = []
+    llm = RunnableLambda(lambda prompt: prompts.append(prompt.to_string()) or "answer")
+    llm.with_structured_output = lambda schema: MagicMock()
+    generate_response = nodes.create_nodes(llm, MagicMock(), MagicMock())["generate_response"]
+    generate_response({"rag_documents": [], "tavily_results": "", **state})
+    return prompts[0]
+
+
+def test_datetime_comes_after_history_and_context():
+    prompt = _generate({
+        "question": "How do we lower CAC?",
+        "conversation_summary": "Discussed paid channels.",
+        "conversation_history": [{"role": "user", "content": "Hi"}],
+        "tavily_results": "CAC rose 12% this year."
+    })
+    summary = prompt.index("Conversation Summary")
+    web = prompt.index("Current Web Search Results")
+    current = prompt.index("Current System Information")
+    assert summary < web < current
+
+
+def test_date_only_unless_the_question_mentions_the_time():
+    prompt = _generate({"question": "How do we lower CAC?", "time_sensitive": False})
+    assert "date only" in prompt
+    assert not re.search(r"\d\d:\d\d [AP]M", prompt)
+    
+    prompt = _generate({"question": "What time is it?", "time_sensitive": True})
+    assert re.search(r"- Time: \d\d:\d\d [AP]M UTC", prompt)
@@ -0,0 +1,132 @@
+import uuid
+
+import pytest
+from langchain_core.documents import Document
+
+import supabase_vectorstore
+import tokens
+from config import EMBEDDING_MODEL
+from supabase_vectorstore import SupabaseVectorStore, _token_batches, _with_retries, content_hash_id
+from tests.fakes import FakeEmbeddings, FakeSupabase
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(supabase_vectorstore.time, "sleep", lambda seconds: None)
+
+
+def _store(rows=None):
+    return SupabaseVectorStore(supabase=FakeSupabase(rows), embeddings=FakeEmbeddings())
+
+
+def _docs(*contents, source="playbook.md"):
+    return [Document(page_content=content, metadata={"source": source}) for content in contents]
+
+
+def _legacy_row(content, source="playbook.md"):
+    return {"id": str(uuid.uuid4()), "content": content, "source": source, "metadata": {"source": source}}
+
+
+def test_content_hash_id_is_stable_and_content_specific():
+    assert content_hash_id("pipeline") == content_hash_id("pipeline")
+    assert content_hash_id("pipeline") != content_hash_id("pipeline ")
+    assert uuid.UUID(content_hash_id("pipeline")).version == 5
+
+
+def test_token_batches_respect_token_and_size_limits(monkeypatch):
+    # Estimated counts (~4 chars/token) keep the batch sizes independent of the tokenizer
+    monkeypatch.setitem(tokens._encodings, EMBEDDING_MODEL, False)
+    rows = [{"content": "x" * 400} for _ in range(5)]  # ~100 estimated tokens each
+    sizes = [len(batch) for batch in _token_batches(rows, max_tokens=250, max_size=10)]
+    assert sizes == [2, 2, 1]
+    assert [len(batch) for batch in _token_batches(rows, max_tokens=10_000, max_size=3)] == [3, 2]
+    # A single oversized row still gets its own batch
+    assert len(_token_batches([{"content": "x" * 4000}], max_tokens=10, max_size=10)) == 1
+
+
+def test_with_retries_reports_attempts():
+    outcomes = iter([ConnectionError("reset"), ConnectionError("reset"), "ok"])
+    
+    def flaky():
+        outcome = next(outcomes)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+    
+    assert _with_retries(flaky, max_retries=3) == ("ok", None, 3)
+    assert _with_retries(lambda: 1 / 0, max_retries=1)[1:] == ("division by zero", 2)
+
+
+def test_reingesting_unchanged_chunks_writes_nothing():
+    store = _store()
+    first = store.ingest_documents(_docs("alpha", "beta", "alpha"))
+    second = store.ingest_documents(_docs("alpha", "beta"))
+    
+    assert (first["inserted"], first["skipped"]) == (2, 0)
+    assert (second["inserted"], second["skipped"], second["batches"]) == (0, 2, 0)
+    assert second["ids"] == [content_hash_id("alpha"), content_hash_id("beta")]
+    assert len(store.supabase.rows) == 2
+
+
+def test_legacy_random_id_rows_are_rekeyed_not_duplicated():
+    legacy = _legacy_row("alpha")
+    store = _store([legacy, _legacy_row("alpha")])
+    report = store.ingest_documents(_docs("alpha", "beta"))
+    
+    assert (report["migrated"], report["duplicates_removed"], report["inserted"]) == (1, 1, 1)
+    assert sorted(row["id"] for row in store.supabase.rows) == sorted([content_hash_id("alpha"), content_hash_id("beta")])
+    # The re-keyed row keeps its stored embedding; only "beta" was embedded
+    assert store.embeddings.calls == 1
+
+
+def test_stale_chunks_are_reported_and_only_deleted_with_prune():
+    store = _store()
+    store.ingest_documents(_docs("alpha", "beta"))
+    store.ingest_documents(_docs("other", source="faq.md"))
+    
+    report = store.ingest_documents(_docs("alpha"))
+    assert (report["stale"], report["pruned"]) == (1, 0)
+    assert len(store.supabase.rows) == 3
+    
+    report = store.ingest_documents(_docs("alpha"), prune=True)
+    assert report["pruned"] == 1
+    # Rows of other sources are untouched
+    assert sorted(row["content"] for row in store.supabase.rows) == ["alpha", "other"]
+
+
+def test_chunk_already_stored_under_another_source_counts_as_present():
+    store = _store()
+    store.ingest_documents(_docs("shared", source="faq.md"))
+    report = store.ingest_documents(_docs("shared", source="playbook.md"))
+    assert (report["inserted"], report["skipped"]) == (0, 1)
+
+
+def test_ingestion_aborts_when_stored_rows_cannot_be_read():
+    store = _store([_legacy_row("alpha")])
+    store.supabase.fail_next = 10
+    report = store.ingest_documents(_docs("alpha"), max_retries=2)
+    
+    assert report["inserted"] == 0
+    assert report["failed"] == 1
+    assert "unavailable" in report["error"]
+    assert store.supabase.calls == ["select"] * 3
+
+
+def test_failed_batches_are_retried_and_reported():
+    store = _store()
+    report = store.ingest_documents(_docs("alpha"), skip_existing=False, max_retries=1)
+    assert report["inserted"] == 1
+    
+    store.supabase.fail_next, store.supabase.fail_operation = 2, "upsert"
+    report = store.ingest_documents(_docs("beta"), skip_existing=False, max_retries=1)
+    assert report["failed"] == 1
+    assert report["failed_batches"][0]["attempts"] == 2
+    assert report["ids"] == []
+
+
+def test_legacy_rows_are_rekeyed_even_without_skipping():
+    store = _store([_legacy_row("alpha")])
+    report = store.ingest_documents(_docs("alpha", "beta"), skip_existing=False)
+    
+    assert (report["migrated"], report["inserted"], report["skipped"]) == (1, 2, 0)
+    assert sorted(row["content"] for row in store.supabase.rows) == ["alpha", "beta"]
@@ -0,0 +1,104 @@
+import pytest
+
+from local_index import LocalVectorIndex, fetch_table_rows, version_key
+from tests.fakes import FakeSupabase
+
+
+def test_timestamps_compare_by_instant_not_text():
+    # As text "...T09:00:00+00:00" sorts after "...T10:00:00+02:00", but it is the later instant
+    assert version_key("2024-01-10T09:00:00+00:00") > version_key("2024-01-10T10:00:00+02:00")
+    assert version_key("2024-01-10T00:00:00.12345+00:00") > version_key("2024-01-10T00:00:00+00:00")
+    assert version_key("2024-01-10T00:00:00") == version_key("2024-01-10T00:00:00+00:00")
+
+
+def test_numbers_compare_by_value():
+    assert version_key(10) > version_key(9)
+    assert version_key("10") > version_key("9")
+    assert version_key(2.5) == version_key("2.5")
+
+
+def test_other_text_sorts_after_numbers_and_timestamps():
+    assert version_key("b") > version_key("a")
+    assert version_key("a") > version_key(10 ** 12)
+
+
+def _row(doc_id, embedding, updated_at):
+    return {"id": doc_id, "content": doc_id, "metadata": {}, "embedding": embedding, "updated_at": updated_at}
+
+
+@pytest.fixture
+def table():
+    return FakeSupabase([
+        _row("a", [1.0, 0.0], "2024-01-01T00:00:00+00:00"),
+        _row("b", [0.0, 1.0], "2024-01-02T00:00:00+00:00")
+    ])
+
+
+def _index(table):
+    index = LocalVectorIndex(table, "rag_table", version_column="updated_at", refresh_seconds=0, reconcile_seconds=3600)
+    index.ensure_loaded()
+    return index
+
+
+def test_refresh_picks_up_new_and_changed_rows(table):
+    index = _index(table)
+    table.rows.append(_row("c", [0.6, 0.8], "2024-01-03T00:00:00+00:00"))
+    table.rows[0].update(content="a v2", updated_at="2024-01-04T00:00:00+00:00")
+    index.refresh()
+    
+    assert index.size == 3
+    assert index.search([1.0, 0.0], k=1, threshold=0.5)[0]["content"] == "a v2"
+    assert index.search([0.6, 0.8], k=1, threshold=0.5)[0]["id"] == "c"
+
+
+def test_refresh_without_changes_fetches_no_rows(table):
+    index = _index(table)
+    fetched = []
+    fetch_rows = index._fetch_rows
+    index._fetch_rows = lambda after=None: fetched.extend(fetch_rows(after)) or []
+    index.refresh()
+    
+    assert fetched == []
+    assert index.stats()["version"] == "2024-01-02T00:00:00+00:00"
+
+
+def test_refresh_picks_up_a_new_row_at_the_last_seen_version(table):
+    index = _index(table)
+    table.rows.append(_row("c", [0.6, 0.8], "2024-01-02T00:00:00+00:00"))
+    index.refresh()
+    
+    assert index.size == 3
+    assert index.search([0.6, 0.8], k=1, threshold=0.5)[0]["id"] == "c"
+
+
+def test_pages_split_inside_a_version_without_skipping_or_repeating_rows():
+    same = "2024-01-01T00:00:00+00:00"
+    table = FakeSupabase([_row(f"r{i}", [1.0, 0.0], same) for i in range(5)] + [_row("z", [0.0, 1.0], None)])
+    
+    rows = fetch_table_rows(table, "rag_table", "id,updated_at", "updated_at", page_size=2)
+    assert [row["id"] for row in rows] == ["r0", "r1", "r2", "r3", "r4", "z"]
+    
+    rows = fetch_table_rows(table, "rag_table", "id,updated_at", "updated_at", after=(same, "r1"), page_size=2)
+    assert [row["id"] for row in rows] == ["r2", "r3", "r4"]
+
+
+def test_refresh_drops_rows_deleted_from_the_table(table):
+    index = _index(table)
+    del table.rows[0]
+    index.refresh()
+    
+    assert index.size == 1
+    assert index.search([1.0, 0.0], k=2, threshold=0.5) == []
+    assert index.reconciled_removed == 1
+
+
+def test_unusable_version_column_falls_back_to_reconciling(table):
+    index = LocalVectorIndex(table, "rag_table", version_column="missing_column", refresh_seconds=0)
+    with pytest.raises(ValueError):
+        index.validate_version_column()
+    assert not index.incremental
+    
+    index.ensure_loaded()
+    table.rows.append(_row("c", [0.6, 0.8], None))
+    index.refresh()
+    assert index.size == 3
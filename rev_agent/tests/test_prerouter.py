@@ -0,0 +1,120 @@
+import numpy as np
+import pytest
+
+from prerouter import PreRouter
+
+
+RAG = [1.0, 0.0, 0.0]
+TAVILY = [0.0, 1.0, 0.0]
+
+
+class CountingEmbedder:
+    def __init__(self, vector):
+        self.vector = vector
+        self.calls = 0
+    
+    def __call__(self, question):
+        self.calls += 1
+        return self.vector
+
+
+def _router(embed_query=None, **kwargs):
+    options = dict(log_path=None, min_examples=2, min_similarity=0.5, min_margin=0.1,
+                   shadow_rate=0.0, min_agreement=0.8, agreement_window=20, dimensions=3)
+    options.update(kwargs)
+    return PreRouter(embed_query or CountingEmbedder(RAG), **options)
+
+
+@pytest.fixture
+def router():
+    router = _router()
+    for _ in range(2):
+        router._add_example("what is our CAC?", "rag", RAG)
+        router._add_example("latest SaaS funding news", "tavily", TAVILY)
+    yield router
+    router._learner.shutdown(wait=True)
+
+
+def _checked(router, predicted, tool_choice, times):
+    # The LLM router's label is also learned, from an embedding that matches it
+    embedding = RAG if tool_choice == "rag" else TAVILY
+    pre = {"tool_choice": None, "predicted": predicted, "confident": True, "source": "centroid", "embedding": embedding}
+    for _ in range(times):
+        router.record_llm_decision("q", tool_choice, pre)
+
+
+def test_lexical_rules_route_small_talk_without_embedding():
+    embed = CountingEmbedder(RAG)
+    router = _router(embed)
+    assert router.route("Thanks so much!")["tool_choice"] == "none"
+    assert router.route("What is today's date?")["source"] == "lexical"
+    assert embed.calls == 0
+
+
+def test_untrained_router_abstains_without_embedding():
+    embed = CountingEmbedder(RAG)
+    router = _router(embed)
+    router._add_example("what is our CAC?", "rag", RAG)
+    
+    assert not router.trained
+    assert router.route("How should we set our marketing budget?")["tool_choice"] is None
+    assert embed.calls == 0
+
+
+def test_confident_queries_are_classified_by_nearest_centroid(router):
+    router.embed_query = CountingEmbedder([0.9, 0.1, 0.0])
+    result = router.route("How do we calculate LTV?")
+    assert result["tool_choice"] == "rag"
+    assert result["source"] == "centroid"
+    assert result["embedding"] == [0.9, 0.1, 0.0]
+
+
+def test_ambiguous_queries_abstain_to_the_llm_router(router):
+    router.embed_query = CountingEmbedder([1.0, 1.0, 0.0])
+    result = router.route("Benchmark our CAC against this year's market")
+    assert result["tool_choice"] is None
+    assert result["predicted"] in ("rag", "tavily")
+    assert not result["confident"]
+
+
+def test_examples_are_stored_as_float32(router):
+    assert all(vector.dtype == np.float32 for _, vector in router._examples)
+    np.testing.assert_allclose(router._sums[0], [2.0, 0.0, 0.0])
+
+
+def test_oldest_example_drops_out_of_its_centroid():
+    router = _router(max_examples=2)
+    router._add_example("a", "rag", RAG)
+    router._add_example("b", "tavily", TAVILY)
+    router._add_example("c", "tavily", TAVILY)
+    assert router.stats()["examples"]["rag"] == 0
+    np.testing.assert_allclose(router._sums[0], [0.0, 0.0, 0.0])
+
+
+def test_low_agreement_suspends_and_recovery_resumes_centroid_routing(router):
+    router.embed_query = CountingEmbedder([0.9, 0.1, 0.0])
+    
+    _checked(router, "rag", "tavily", 20)
+    assert router.suspended
+    suspended = router.route("How do we calculate LTV?")
+    assert suspended["tool_choice"] is None
+    assert suspended["predicted"] == "rag"
+    
+    _checked(router, "rag", "rag", 15)
+    assert router.suspended  # 15 of the last 20 agree
+    _checked(router, "rag", "rag", 1)
+    assert not router.suspended
+    assert router.route("How do we calculate LTV?")["tool_choice"] == "rag"
+    assert router.stats()["suspensions"] == 1
+
+
+def test_logged_decisions_train_a_new_router(tmp_path):
+    path = str(tmp_path / "decisions.jsonl")
+    first = _router(log_path=path)
+    for _ in range(2):
+        first._learn("what is our CAC?", "rag", RAG)
+        first._learn("latest SaaS funding news", "tavily", TAVILY)
+    
+    second = _router(log_path=path)
+    assert second.trained
+    assert second.stats()["examples"] == {"rag": 2, "tavily": 2, "both": 0, "none": 0}
@@ -0,0 +1,67 @@
+import time
+
+from request_trace import RequestTrace, server_timing
+
+
+def _trace(**overrides):
+    trace = {
+        "total_ms": 812.4,
+        "path": ["analyze_and_route", "execute_rag_tool", "generate_response"],
+        "route": "use_rag",
+        "retries": [],
+        "nodes": [
+            {"node": "analyze_and_route", "start_ms": 0.0, "duration_ms": 301.2, "error": False},
+            {"node": "execute_rag_tool", "start_ms": 301.5, "duration_ms": 120.0, "error": False},
+            {"node": "generate_response", "start_ms": 421.9, "duration_ms": 390.1, "error": False}
+        ],
+        "cache": {},
+        "external_calls": []
+    }
+    trace.update(overrides)
+    return trace
+
+
+def test_server_timing_lists_nodes_route_and_total():
+    assert server_timing(_trace()) == (
+        "analyze_and_route;dur=301.2, execute_rag_tool;dur=120.0, generate_response;dur=390.1, "
+        'route;desc="use_rag", total;dur=812.4'
+    )
+
+
+def test_server_timing_includes_retries_caches_and_external_calls():
+    header = server_timing(_trace(
+        retries=["try_tavily", "generate_llm"],
+        cache={"embedding": {"hits": 1, "misses": 2}},
+        external_calls=[{"call": "supabase.match_rag_table", "duration_ms": 45.6}]
+    ))
+    entries = header.split(", ")
+    assert 'retries;desc="try_tavily generate_llm"' in entries
+    assert 'embedding-cache;desc="1 hit 2 miss"' in entries
+    assert "supabase-match_rag_table;dur=45.6" in entries
+    assert entries[-1] == "total;dur=812.4"
+
+
+def test_server_timing_names_are_header_safe_tokens():
+    header = server_timing(_trace(
+        nodes=[{"node": "my node, \"quoted\"", "start_ms": 0.0, "duration_ms": 1.0, "error": False}],
+        route=None
+    ))
+    assert header == "my-node---quoted-;dur=1.0, total;dur=812.4"
+
+
+def test_trace_orders_nodes_by_start_and_reports_route_and_retries():
+    trace = RequestTrace()
+    now = time.perf_counter()
+    trace.add_node("generate_response", now + 0.2, 0.1)
+    trace.add_node("analyze_and_route", now, 0.05)
+    trace.add_decision("route", "use_rag")
+    trace.add_decision("validation", "try_tavily")
+    trace.add_decision("validation", "generate")
+    trace.add_cache_lookup("response", hit=False)
+    
+    result = trace.to_dict()
+    assert result["path"] == ["analyze_and_route", "generate_response"]
+    assert result["route"] == "use_rag"
+    assert result["retries"] == ["try_tavily"]
+    assert result["cache"] == {"response": {"hits": 0, "misses": 1}}
+    assert result["nodes"][1]["duration_ms"] == 100.0
@@ -0,0 +1,115 @@
+import pytest
+
+import response_cache
+from response_cache import SemanticResponseCache
+from utils import mentions_datetime
+
+
+@pytest.fixture
+def answers(monkeypatch, clock):
+    monkeypatch.setattr(response_cache.time, "time", clock)
+    return SemanticResponseCache(max_size=2, threshold=0.9, ttl_seconds=3600, volatile_ttl_seconds=60, dimensions=3)
+
+
+def test_lookup_hits_above_the_threshold_only(answers):
+    answers.store("What is an MQL?", [1.0, 0.0, 0.0], "A marketing qualified lead.", "rag")
+    
+    hit = answers.lookup([0.95, 0.2, 0.0])
+    assert hit["answer"] == "A marketing qualified lead."
+    assert hit["similarity"] >= 0.9
+    # cos ~0.8, below the threshold
+    assert answers.lookup([0.8, 0.6, 0.0]) is None
+    assert (answers.hits, answers.misses) == (1, 1)
+
+
+def test_lookup_returns_the_closest_entry(answers):
+    answers.store("a", [1.0, 0.0, 0.0], "first", "rag")
+    answers.store("b", [0.9, 0.1, 0.0], "second", "rag")
+    assert answers.lookup([0.9, 0.1, 0.0])["answer"] == "second"
+
+
+def test_entries_expire_after_their_ttl(answers, clock):
+    answers.store("a", [1.0, 0.0, 0.0], "internal", "rag")
+    answers.store("b", [0.0, 1.0, 0.0], "from the web", "tavily")
+    
+    clock.advance(61)
+    assert answers.lookup([0.0, 1.0, 0.0]) is None  # volatile TTL
+    assert answers.lookup([1.0, 0.0, 0.0])["age_seconds"] == 61
+    clock.advance(3600)
+    assert answers.lookup([1.0, 0.0, 0.0]) is None
+    assert answers.stats()["size"] == 0
+
+
+def test_expired_best_match_falls_back_to_the_next_one(answers, clock):
+    answers.store("web", [1.0, 0.0, 0.0], "stale", "both")
+    answers.store("kb", [0.95, 0.1, 0.0], "fresh", "rag")
+    clock.advance(120)
+    assert answers.lookup([1.0, 0.0, 0.0])["answer"] == "fresh"
+
+
+def test_time_sensitive_answers_are_never_stored(answers):
+    answers.store("What time is it?", [1.0, 0.0, 0.0], "It is 10:42.", "none", time_sensitive=True)
+    assert answers.lookup([1.0, 0.0, 0.0]) is None
+    assert answers.bypassed == 1
+
+
+def test_zero_volatile_ttl_skips_web_answers():
+    answers = SemanticResponseCache(max_size=2, threshold=0.9, ttl_seconds=3600, volatile_ttl_seconds=0, dimensions=3)
+    answers.store("news", [1.0, 0.0, 0.0], "headline", "tavily")
+    assert answers.stats()["size"] == 0
+    assert answers.bypassed == 1
+
+
+def test_full_cache_evicts_the_least_recently_used(answers):
+    answers.store("a", [1.0, 0.0, 0.0], "a", "rag")
+    answers.store("b", [0.0, 1.0, 0.0], "b", "rag")
+    answers.lookup([1.0, 0.0, 0.0])
+    answers.store("c", [0.0, 0.0, 1.0], "c", "rag")
+    
+    assert answers.lookup([0.0, 1.0, 0.0]) is None
+    assert answers.lookup([1.0, 0.0, 0.0])["answer"] == "a"
+    assert answers.lookup([0.0, 0.0, 1.0])["answer"] == "c"
+
+
+def test_invalidate_drops_entries_and_bumps_the_generation(answers):
+    answers.store("a", [1.0, 0.0, 0.0], "a", "rag")
+    answers.invalidate()
+    
+    assert answers.lookup([1.0, 0.0, 0.0]) is None
+    assert answers.generation == 1
+    answers.store("a", [1.0, 0.0, 0.0], "a again", "rag", generation=1)
+    assert answers.lookup([1.0, 0.0, 0.0])["answer"] == "a again"
+
+
+def test_write_from_before_an_invalidation_is_dropped(answers):
+    generation = answers.generation
+    answers.invalidate()
+    answers.store("a", [1.0, 0.0, 0.0], "from the old knowledge base", "rag", generation=generation)
+    
+    assert answers.lookup([1.0, 0.0, 0.0]) is None
+    assert answers.stale_writes == 1
+
+
+@pytest.mark.parametrize("question", [
+    "What is today's date please",
+    "Can you tell me the date?",
+    "what year is it",
+    "Which DAY of the week is it?"
+])
+def test_paraphrased_date_questions_are_never_stored(answers, question):
+    assert mentions_datetime(question)
+    answers.store(question, [1.0, 0.0, 0.0], "It is Monday.", "none", time_sensitive=mentions_datetime(question))
+    assert answers.lookup([1.0, 0.0, 0.0]) is None
+
+
+def test_questions_without_dates_are_not_time_sensitive():
+    assert not mentions_datetime("How do I calculate CAC payback?")
+    assert not mentions_datetime("Explain the daytime-nowhere metric")
+
+
+def test_direct_answers_get_the_volatile_ttl(answers, clock):
+    answers.store("Explain CAC simply", [1.0, 0.0, 0.0], "Cost to acquire a customer.", "none")
+    clock.advance(59)
+    assert answers.lookup([1.0, 0.0, 0.0]) is not None
+    clock.advance(2)
+    assert answers.lookup([1.0, 0.0, 0.0]) is None
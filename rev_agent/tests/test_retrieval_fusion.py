@@ -0,0 +1,31 @@
+from langchain_core.documents import Document
+
+from supabase_vectorstore import reciprocal_rank_fusion
+
+
+def _docs(*contents, **metadata):
+    return [Document(page_content=content, metadata=dict(metadata)) for content in contents]
+
+
+def test_documents_found_by_both_retrievers_rank_first():
+    vector = _docs("a", "b", "c", similarity=0.8)
+    keyword = _docs("c", "d", bm25_score=3.0)
+    fused = reciprocal_rank_fusion([vector, keyword], k=4, rrf_k=60)
+    
+    assert [doc.page_content for doc in fused] == ["c", "a", "b", "d"]
+    assert fused[0].metadata["rrf_score"] == 1 / 63 + 1 / 61
+    assert fused[1].metadata["rrf_score"] == 1 / 61
+
+
+def test_metadata_from_both_lists_is_merged():
+    fused = reciprocal_rank_fusion([_docs("a", similarity=0.9), _docs("a", bm25_score=2.5)], k=1)
+    assert fused[0].metadata == {"similarity": 0.9, "bm25_score": 2.5, "rrf_score": fused[0].metadata["rrf_score"]}
+
+
+def test_inputs_are_not_mutated_and_k_limits_the_result():
+    vector = _docs("a", "b", "c")
+    fused = reciprocal_rank_fusion([vector, []], k=2)
+    
+    assert [doc.page_content for doc in fused] == ["a", "b"]
+    assert "rrf_score" not in vector[0].metadata
+    assert reciprocal_rank_fusion([[], []], k=3) == []
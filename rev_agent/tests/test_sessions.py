@@ -0,0 +1,152 @@
+import threading
+import time
+
+import pytest
+
+import sessions
+from sessions import FileSessionBackend, SessionStore, valid_session_id
+
+RECENT = sessions.SESSION_RECENT_MESSAGES
+SUMMARIZE_AFTER = sessions.SESSION_SUMMARIZE_AFTER
+MAX_MESSAGES = sessions.SESSION_MAX_MESSAGES
+
+
+class GatedSummarizer:
+    """Summarizer that records what it was asked to fold and can be held mid-call"""
+    
+    def __init__(self):
+        self.release = threading.Event()
+        self.release.set()
+        self.calls = []
+    
+    def __call__(self, previous_summary, messages):
+        self.calls.append((previous_summary, [msg["content"] for msg in messages]))
+        self.release.wait(5)
+        return f"summary {len(self.calls)}"
+
+
+def _wait_idle(store: SessionStore):
+    deadline = time.monotonic() + 5
+    while store.stats()["summarizing"] and time.monotonic() < deadline:
+        time.sleep(0.005)
+    store._writer.submit(lambda: None).result(5)
+
+
+def _turns(store: SessionStore, session_id: str, start: int, count: int):
+    for i in range(start, start + count):
+        store.append_turn(session_id, f"q{i}", f"a{i}")
+
+
+@pytest.fixture
+def summarizer():
+    return GatedSummarizer()
+
+
+@pytest.fixture
+def store(tmp_path, summarizer):
+    return SessionStore(backend=FileSessionBackend(str(tmp_path)), summarizer=summarizer)
+
+
+def test_session_ids_are_limited_to_a_safe_charset():
+    assert valid_session_id("abc-DEF_123")
+    assert not valid_session_id("../etc/passwd")
+    assert not valid_session_id("")
+
+
+def test_older_messages_are_folded_into_the_summary(store, summarizer):
+    turns = (RECENT + SUMMARIZE_AFTER) // 2
+    _turns(store, "s", 0, turns)
+    _wait_idle(store)
+    
+    summary, recent = store.get_context("s")
+    assert summary == "summary 1"
+    assert len(recent) == RECENT
+    assert recent[-1] == {"role": "assistant", "content": f"a{turns - 1}"}
+    # Exactly the messages before the recent window were folded
+    folded = summarizer.calls[0][1]
+    assert len(folded) == 2 * turns - RECENT
+    assert folded[0] == "q0"
+    assert store._sessions["s"]["summarized_messages"] == len(folded)
+
+
+def test_summary_is_persisted_and_reloaded(tmp_path, store):
+    _turns(store, "s", 0, (RECENT + SUMMARIZE_AFTER) // 2)
+    _wait_idle(store)
+    
+    reloaded = SessionStore(backend=FileSessionBackend(str(tmp_path)), summarizer=GatedSummarizer())
+    assert reloaded.get_context("s") == store.get_context("s")
+
+
+def test_hard_cap_during_a_summary_only_drops_folded_messages(store, summarizer):
+    summarizer.release.clear()
+    turns = (RECENT + SUMMARIZE_AFTER) // 2
+    _turns(store, "s", 0, turns)
+    while not summarizer.calls:
+        time.sleep(0.005)
+    
+    # Flood past the hard cap while the summary is in flight; the cap trims the folded messages first
+    _turns(store, "s", turns, MAX_MESSAGES // 2)
+    before = [msg["content"] for msg in store._sessions["s"]["messages"]]
+    assert len(before) == MAX_MESSAGES
+    summarizer.release.set()
+    _wait_idle(store)
+    
+    remaining = [msg["content"] for msg in store._sessions["s"]["messages"]]
+    summarized = {content for _, contents in summarizer.calls for content in contents}
+    # Every message the cap kept was either folded into a summary or is still in the session
+    assert [content for content in before if content not in summarized and content not in remaining] == []
+    assert remaining == before[len(before) - len(remaining):]
+    assert store._sessions["s"]["first_seq"] + len(remaining) == 2 * (turns + MAX_MESSAGES // 2)
+
+
+def test_failed_summary_keeps_the_messages(tmp_path):
+    def broken(previous_summary, messages):
+        raise RuntimeError("LLM unavailable")
+    
+    store = SessionStore(backend=FileSessionBackend(str(tmp_path)), summarizer=broken)
+    _turns(store, "s", 0, MAX_MESSAGES)
+    _wait_idle(store)
+    
+    summary, _ = store.get_context("s")
+    assert summary == ""
+    assert len(store._sessions["s"]["messages"]) == MAX_MESSAGES
+    assert store.stats()["summary_errors"] >= 1
+
+
+def test_seed_only_fills_an_empty_session(store):
+    store.seed("s", [{"role": "user", "content": "hi"}])
+    store.seed("s", [{"role": "user", "content": "ignored"}])
+    assert store.get_context("s") == ("", [{"role": "user", "content": "hi"}])
+
+
+def test_delete_is_not_undone_by_an_in_flight_summary(tmp_path, store, summarizer):
+    summarizer.release.clear()
+    _turns(store, "s", 0, (RECENT + SUMMARIZE_AFTER) // 2)
+    while not summarizer.calls:
+        time.sleep(0.005)
+    
+    store.delete("s")
+    summarizer.release.set()
+    _wait_idle(store)
+    
+    assert not (tmp_path / "s.json").exists()
+    assert store.get_context("s") == ("", [])
+
+
+def test_idle_sessions_expire(tmp_path, summarizer):
+    store = SessionStore(backend=FileSessionBackend(str(tmp_path)), summarizer=summarizer, ttl_seconds=60)
+    store.append_turn("s", "q", "a")
+    _wait_idle(store)
+    store._sessions["s"]["updated_at"] -= 61
+    (tmp_path / "s.json").unlink()
+    
+    assert store.get_context("s") == ("", [])
+
+
+def test_least_recently_used_sessions_are_evicted(summarizer):
+    store = SessionStore(summarizer=summarizer, max_sessions=2)
+    for session_id in ("a", "b", "c"):
+        store.append_turn(session_id, "q", "a")
+    
+    assert list(store._sessions) == ["b", "c"]
+    assert store.stats()["evictions"] == 1
@@ -0,0 +1,64 @@
+import asyncio
+import threading
+
+import pytest
+
+import tokens
+
+
+class _WordEncoding:
+    def encode(self, text, disallowed_special=()):
+        return text.split()
+    
+    def decode(self, words):
+        return " ".join(words)
+
+
+@pytest.fixture
+def slow_tokenizer(monkeypatch):
+    """A tokenizer whose first load blocks until released, like a BPE download"""
+    tiktoken = pytest.importorskip("tiktoken")
+    release = threading.Event()
+    loads = []
+    
+    def encoding_for_model(model):
+        loads.append(threading.current_thread().name)
+        release.wait(5)
+        return _WordEncoding()
+    
+    monkeypatch.setattr(tiktoken, "encoding_for_model", encoding_for_model)
+    monkeypatch.setattr(tokens, "_encodings", {})
+    monkeypatch.setattr(tokens, "_loading", set())
+    yield release, loads
+    release.set()
+
+
+def test_counts_are_estimated_while_the_tokenizer_loads_off_the_loop(slow_tokenizer):
+    release, loads = slow_tokenizer
+    
+    async def count():
+        return tokens.count_tokens("one two three four five six", "model"), tokens.count_tokens("again", "model")
+    
+    # Returns at once with the ~4 chars/token estimate instead of waiting on the load
+    assert asyncio.run(count()) == (len("one two three four five six") // 4 + 1, 2)
+    release.set()
+    for thread in threading.enumerate():
+        if thread.name == "tiktoken-load":
+            thread.join(5)
+    
+    assert loads == ["tiktoken-load"]
+    assert asyncio.run(count()) == (6, 1)
+
+
+def test_load_encodings_blocks_until_loaded(slow_tokenizer):
+    release, loads = slow_tokenizer
+    release.set()
+    assert tokens.load_encodings(["model"]) == {"model": True}
+    assert tokens.truncate_to_tokens("one two three", 2, "model") == "one two"
+
+
+def test_unavailable_tokenizer_falls_back_to_estimates(monkeypatch):
+    monkeypatch.setattr(tokens, "_encodings", {"model": False})
+    assert tokens.count_tokens("x" * 40, "model") == 11
+    assert tokens.truncate_to_tokens("x" * 40, 2, "model") == "x" * 8
+    assert tokens.truncate_to_tokens("x" * 40, 0, "model") == ""
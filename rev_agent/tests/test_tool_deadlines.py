@@ -0,0 +1,106 @@
+import socket
+import threading
+import time
+from unittest.mock import MagicMock
+
+import httpx
+import pytest
+
+import metrics
+import nodes
+from clients import call_deadline, get_http_client
+
+TIMEOUT = 0.3
+
+
+@pytest.fixture(scope="module")
+def silent_server():
+    """Accepts connections and reads requests but never answers"""
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen(16)
+    connections = []
+    
+    def serve():
+        while True:
+            try:
+                connection, _ = server.accept()
+            except OSError:
+                return
+            connections.append(connection)
+    
+    threading.Thread(target=serve, daemon=True).start()
+    yield f"http://127.0.0.1:{server.getsockname()[1]}"
+    server.close()
+    for connection in connections:
+        connection.close()
+
+
+class SlowRetriever:
+    """Retriever whose search hangs on an upstream that never replies"""
+    
+    def __init__(self, base_url: str):
+        self.client = get_http_client("test-silent", base_url=base_url)
+        self.finished = threading.Event()
+        self.error = None
+    
+    def invoke(self, question):
+        try:
+            self.client.post("/search", json={"query": question})
+        except Exception as e:
+            self.error = e
+            raise
+        finally:
+            self.finished.set()
+    
+    async def ainvoke(self, question):
+        return self.invoke(question)
+
+
+def _abandoned(tool: str) -> float:
+    return metrics.TOOL_ABANDONED._values.get((tool,), 0)
+
+
+def test_call_deadline_caps_pooled_requests(silent_server):
+    client = get_http_client("test-silent", base_url=silent_server)
+    start = time.monotonic()
+    with pytest.raises(httpx.TimeoutException):
+        with call_deadline(TIMEOUT):
+            client.post("/search", json={})
+    assert time.monotonic() - start < TIMEOUT + 0.5
+
+
+def test_requests_after_the_deadline_fail_at_once(silent_server):
+    client = get_http_client("test-silent", base_url=silent_server)
+    with call_deadline(0.0):
+        with pytest.raises(httpx.PoolTimeout):
+            client.get("/")
+
+
+def test_timed_out_tool_returns_none_and_frees_its_worker(silent_server):
+    retriever = SlowRetriever(silent_server)
+    abandoned = _abandoned("RAG retrieval")
+    
+    future = nodes._submit_with_deadline(retriever.invoke, TIMEOUT, "question")
+    start = time.monotonic()
+    assert nodes._wait_for_future(future, start + TIMEOUT, "RAG retrieval") is None
+    assert time.monotonic() - start < TIMEOUT + 0.2
+    
+    # The worker is not stuck on the read timeout; its request is cut at the deadline
+    assert retriever.finished.wait(1.0)
+    assert isinstance(retriever.error, httpx.TimeoutException)
+    if metrics.METRICS_ENABLED:
+        assert _abandoned("RAG retrieval") == abandoned + 1
+
+
+def test_rag_node_continues_without_documents_on_timeout(monkeypatch, silent_server):
+    monkeypatch.setattr(nodes, "RAG_TOOL_TIMEOUT", TIMEOUT)
+    retriever = SlowRetriever(silent_server)
+    execute_rag_tool = nodes.create_nodes(MagicMock(), retriever, MagicMock())["execute_rag_tool"]
+    
+    start = time.monotonic()
+    result = execute_rag_tool({"question": "What is CAC?", "tools_tried": [], "speculative": {}})
+    assert time.monotonic() - start < TIMEOUT + 0.2
+    assert result["rag_documents"] == []
+    assert result["tools_tried"] == ["rag"]
+    assert retriever.finished.wait(1.0)
@@ -0,0 +1,63 @@
+from langchain_core.documents import Document
+
+from validation import (
+    AMBIGUOUS,
+    STRONG,
+    WEAK,
+    ValidationStats,
+    assess_rag,
+    assess_tavily,
+    count_tavily_results,
+    score_based_validation
+)
+
+LONG = "x" * 400
+
+
+def _doc(similarity, content=LONG):
+    metadata = {} if similarity is None else {"similarity": similarity}
+    return Document(page_content=content, metadata=metadata)
+
+
+def _web(results, chars_each=200):
+    return "\n".join(f"{i}. Result {i}: " + "y" * chars_each for i in range(1, results + 1))
+
+
+def test_rag_assessment_uses_top_similarity_and_content_size():
+    assert assess_rag([])[0] == WEAK
+    assert assess_rag([_doc(0.2), _doc(0.29)])[0] == WEAK
+    assert assess_rag([_doc(0.2), _doc(0.6)])[0] == STRONG
+    # A strong match that is too short to answer from is not enough on its own
+    assert assess_rag([_doc(0.6, content="short")])[0] == AMBIGUOUS
+    assert assess_rag([_doc(0.4)])[0] == AMBIGUOUS
+    assert assess_rag([_doc(None)]) == (AMBIGUOUS, "documents carry no scores")
+
+
+def test_tavily_assessment_counts_numbered_results():
+    assert count_tavily_results(_web(3)) == 3
+    assert count_tavily_results(None) == 0
+    assert assess_tavily("")[0] == WEAK
+    assert assess_tavily(_web(3))[0] == STRONG
+    assert assess_tavily(_web(1))[0] == AMBIGUOUS
+    assert assess_tavily(_web(2, chars_each=10))[0] == AMBIGUOUS
+
+
+def test_any_strong_tool_is_sufficient():
+    state = {"tools_tried": ["rag", "tavily"], "rag_documents": [_doc(0.1)], "tavily_results": _web(3)}
+    result, reason = score_based_validation(state)
+    assert result == "sufficient"
+    assert reason.startswith("rag: weak") and "tavily: strong" in reason
+
+
+def test_all_weak_is_insufficient_and_mixed_is_left_to_the_llm():
+    assert score_based_validation({"tools_tried": ["rag"], "rag_documents": []})[0] == "insufficient"
+    mixed = {"tools_tried": ["rag", "tavily"], "rag_documents": [_doc(0.1)], "tavily_results": _web(1)}
+    assert score_based_validation(mixed)[0] is None
+    assert score_based_validation({"tools_tried": []})[0] is None
+
+
+def test_stats_report_the_deterministic_rate():
+    stats = ValidationStats()
+    for result in ("sufficient", "insufficient", None, None):
+        stats.record(result)
+    assert stats.snapshot() == {"sufficient": 1, "insufficient": 1, "ambiguous": 2, "deterministic_rate": 0.5}
@@ -0,0 +1,88 @@
+import asyncio
+import threading
+from typing import Dict, Iterable, Set
+
+
+# Per-model tiktoken encodings; False marks a model whose tokenizer could not be loaded
+_encodings: Dict[str, object] = {}
+_lock = threading.Lock()
+# Models whose encoding is being loaded off the event loop
+_loading: Set[str] = set()
+_loading_lock = threading.Lock()
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+def _load_encoding(model: str):
+    encoding = _encodings.get(model)
+    if encoding is None:
+        with _lock:
+            encoding = _encodings.get(model)
+            if encoding is None:
+                try:
+                    import tiktoken
+                    encoding = tiktoken.encoding_for_model(model)
+                except Exception as e:
+                    print(f"[WARNING] tiktoken unavailable for {model}, estimating token counts: {str(e)}")
+                    encoding = False
+                _encodings[model] = encoding
+    return encoding
+
+
+def _load_in_background(model: str):
+    with _loading_lock:
+        if model in _loading:
+            return
+        _loading.add(model)
+    threading.Thread(target=_load_encoding, args=(model,), name="tiktoken-load", daemon=True).start()
+
+
+def _get_encoding(model: str):
+    encoding = _encodings.get(model)
+    if encoding is None:
+        if _on_event_loop():
+            # The first load may download the BPE file; estimate instead of blocking the loop on it
+            _load_in_background(model)
+            return False
+        encoding = _load_encoding(model)
+    return encoding
+
+
+def load_encodings(models: Iterable[str]) -> Dict[str, bool]:
+    """
+    Load the tokenizers for the given models (blocking; run it off the event loop)
+    
+    Called by the startup warm-up. With TIKTOKEN_CACHE_DIR baked into the image
+    this reads local files; otherwise tiktoken downloads them here.
+    
+    Returns:
+        Whether each model's tokenizer is available (token counts are estimated if not)
+    """
+    return {model: bool(_load_encoding(model)) for model in models}
+
+
+def count_tokens(text: str, model: str) -> int:
+    """Token count for a model (~4 chars/token if the tokenizer is unavailable or still loading)"""
+    encoding = _get_encoding(model)
+    if not encoding:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str) -> str:
+    """Cut text to at most max_tokens, on a token boundary when the tokenizer is available"""
+    if max_tokens <= 0:
+        return ""
+    encoding = _get_encoding(model)
+    if not encoding:
+        return text[:max_tokens * 4]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
@@ -1,13 +1,30 @@
-from langchain.tools.retriever import create_retriever_tool
-from langchain.tools import tool
-from tavily import TavilyClient
+from langchain_core.tools import StructuredTool
+from typing import Any, Dict, Tuple
 import os
+import time
 
-tavily_client = TavilyClient(api_key=os.getenv("TAVILY_API_KEY"))
+from cache import TTLCache, SingleFlight, normalize_text
+from clients import get_http_client, get_async_http_client
+from metrics import external_call
+from request_trace import record_cache_lookup
+from config import (
+    TAVILY_SEARCH_DEPTH,
+    TAVILY_MAX_RESULTS,
+    TAVILY_CACHE_SIZE,
+    TAVILY_CACHE_TTL
+)
+
+TAVILY_API_URL = "https://api.tavily.com"
+
+# Raw Tavily responses keyed on normalized query + search parameters
+_search_cache = TTLCache(TAVILY_CACHE_SIZE, TAVILY_CACHE_TTL)
+_search_flight = SingleFlight()
 
 
 def get_retriever_tool(retriever):
     """Create retriever tool"""
+    from langchain.tools.retriever import create_retriever_tool
+    
     retriever_tool = create_retriever_tool(
         retriever,
         "retrieve_cmo_revenue_playbook",
@@ -20,8 +37,112 @@ def get_retriever_tool(retriever):
     return retriever_tool
 
 
-@tool
-def tavily_search(query: str) -> str:
+def _describe_age(age_seconds: float) -> str:
+    """Human-readable age of a search result set"""
+    if age_seconds < 60:
+        return "just now"
+    if age_seconds < 3600:
+        minutes = int(age_seconds // 60)
+        return f"{minutes} minute{'s' if minutes != 1 else ''} ago"
+    hours = int(age_seconds // 3600)
+    return f"{hours} hour{'s' if hours != 1 else ''} ago"
+
+
+def _format_results(response: dict, retrieved_at: float) -> str:
+    """Format a Tavily search response into the string handed to the generator"""
+    if not response.get('results'):
+        return "No results found for your query."
+    
+    # Cached results can be minutes old; say so, so the answer can mention freshness
+    formatted_results = [f"(Web results retrieved {_describe_age(time.time() - retrieved_at)})\n"]
+    for idx, result in enumerate(response['results'], 1):
+        formatted_results.append(
+            f"{idx}. {result['title']}\n"
+            f"   URL: {result['url']}\n"
+            f"   {result['content']}\n"
+        )
+    
+    return "\n".join(formatted_results)
+
+
+def _search_key(query: str) -> tuple:
+    return (normalize_text(query), TAVILY_SEARCH_DEPTH, TAVILY_MAX_RESULTS)
+
+
+def _search_payload(query: str) -> Dict[str, Any]:
+    """Request body for Tavily's /search endpoint (same fields TavilyClient.search sends)"""
+    return {
+        "api_key": os.getenv("TAVILY_API_KEY"),
+        "query": query,
+        "search_depth": TAVILY_SEARCH_DEPTH,
+        "max_results": TAVILY_MAX_RESULTS,
+        "topic": "general"
+    }
+
+
+def _post_search(query: str) -> Dict[str, Any]:
+    """Tavily search over the shared keep-alive pool instead of a fresh connection per call"""
+    with external_call("tavily"):
+        response = get_http_client("tavily", base_url=TAVILY_API_URL).post("/search", json=_search_payload(query))
+        response.raise_for_status()
+    return response.json()
+
+
+async def _apost_search(query: str) -> Dict[str, Any]:
+    """Async variant of _post_search"""
+    client = get_async_http_client("tavily", base_url=TAVILY_API_URL)
+    with external_call("tavily"):
+        response = await client.post("/search", json=_search_payload(query))
+        response.raise_for_status()
+    return response.json()
+
+
+def _cached_search(query: str) -> Tuple[Dict[str, Any], float]:
+    """
+    Tavily search through the TTL cache, coalescing concurrent identical searches
+    
+    Returns:
+        The raw Tavily response and the time it was retrieved
+    """
+    key = _search_key(query)
+    entry = _search_cache.get_entry(key)
+    record_cache_lookup("tavily", entry is not None)
+    if entry:
+        return entry
+    
+    def fetch():
+        response = _post_search(query)
+        _search_cache.set(key, response)
+        return response, time.time()
+    
+    return _search_flight.do(key, fetch)
+
+
+async def _acached_search(query: str) -> Tuple[Dict[str, Any], float]:
+    """Async variant of _cached_search"""
+    key = _search_key(query)
+    entry = _search_cache.get_entry(key)
+    record_cache_lookup("tavily", entry is not None)
+    if entry:
+        return entry
+    
+    async def fetch():
+        response = await _apost_search(query)
+        _search_cache.set(key, response)
+        return response, time.time()
+    
+    return await _search_flight.ado(key, fetch)
+
+
+def get_tavily_cache_stats() -> Dict[str, Any]:
+    """Tavily result cache and in-flight deduplication counters"""
+    return {
+        "cache": _search_cache.stats(),
+        "singleflight": _search_flight.stats()
+    }
+
+
+def _tavily_search(query: str) -> str:
     """
     Search the web using Tavily for current information, news, and research.
     
@@ -34,29 +155,32 @@ def tavily_search(query: str) -> str:
     
     Args:
         query: The search query string
-        
+    
     Returns:
         A formatted string containing search results with titles, URLs, and content snippets
     """
     try:
-        response = tavily_client.search(
-            query=query,
-            search_depth="advanced",
-            max_results=5
-        )
+        response, retrieved_at = _cached_search(query)
         
-        if not response.get('results'):
-            return "No results found for your query."
-        
-        formatted_results = []
-        for idx, result in enumerate(response['results'], 1):
-            formatted_results.append(
-                f"{idx}. {result['title']}\n"
-                f"   URL: {result['url']}\n"
-                f"   {result['content']}\n"
-            )
-        
-        return "\n".join(formatted_results)
+        return _format_results(response, retrieved_at)
+    
+    except Exception as e:
+        return f"Error performing search: {str(e)}"
+
+
+async def _atavily_search(query: str) -> str:
+    """Async variant of _tavily_search"""
+    try:
+        response, retrieved_at = await _acached_search(query)
         
+        return _format_results(response, retrieved_at)
+    
     except Exception as e:
         return f"Error performing search: {str(e)}"
+
+
+tavily_search = StructuredTool.from_function(
+    func=_tavily_search,
+    coroutine=_atavily_search,
+    name="tavily_search"
+)
@@ -0,0 +1,274 @@
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from config import LLM_MODEL, EMBEDDING_MODEL, USAGE_ROUTE_WINDOW
+
+
+# USD per 1M tokens: (input, cached input, output)
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "text-embedding-3-small": (0.02, 0.02, 0.0),
+    "text-embedding-3-large": (0.13, 0.13, 0.0)
+}
+
+
+def estimate_cost(model: str, input_tokens: int, cached_tokens: int = 0, output_tokens: int = 0) -> float:
+    """USD cost of a call from MODEL_PRICES (0.0 for unknown models)"""
+    prices = MODEL_PRICES.get(model)
+    if prices is None:
+        return 0.0
+    input_price, cached_price, output_price = prices
+    uncached = max(0, input_tokens - cached_tokens)
+    return (uncached * input_price + cached_tokens * cached_price + output_tokens * output_price) / 1_000_000
+
+
+def extract_usage(response: LLMResult) -> Optional[Dict[str, int]]:
+    """
+    Input, cached and output token counts from a chat model result
+    
+    Reads usage_metadata (input_token_details.cache_read) on the message first,
+    then the raw OpenAI token_usage (prompt_tokens_details.cached_tokens) in
+    llm_output. cached_tokens is None when the provider response carried no
+    cache details (e.g. streamed responses on older langchain-openai).
+    """
+    usage = None
+    cached = None
+    
+    for generations in response.generations:
+        for generation in generations:
+            message = getattr(generation, "message", None)
+            metadata = getattr(message, "usage_metadata", None)
+            if metadata:
+                usage = {
+                    "input_tokens": metadata.get("input_tokens", 0),
+                    "output_tokens": metadata.get("output_tokens", 0)
+                }
+                details = metadata.get("input_token_details") or {}
+                if details.get("cache_read") is not None:
+                    cached = details["cache_read"]
+    
+    token_usage = (response.llm_output or {}).get("token_usage") or {}
+    if usage is None and token_usage:
+        usage = {
+            "input_tokens": token_usage.get("prompt_tokens", 0),
+            "output_tokens": token_usage.get("completion_tokens", 0)
+        }
+    if cached is None:
+        details = token_usage.get("prompt_tokens_details") or {}
+        if details.get("cached_tokens") is not None:
+            cached = details["cached_tokens"]
+    
+    if usage is None:
+        return None
+    usage["cached_tokens"] = cached
+    return usage
+
+
+class RequestUsage:
+    """Tokens and estimated cost of one agent request, per graph node plus embeddings"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.nodes: Dict[str, Dict[str, Any]] = {}
+        self.embedding = {"calls": 0, "tokens": 0, "cost_usd": 0.0}
+    
+    def add_llm(self, node: str, model: str, usage: Dict[str, Optional[int]]):
+        cached = usage["cached_tokens"] or 0
+        cost = estimate_cost(model, usage["input_tokens"], cached, usage["output_tokens"])
+        with self._lock:
+            stats = self.nodes.setdefault(node, {
+                "calls": 0,
+                "input_tokens": 0,
+                "cached_tokens": 0,
+                "output_tokens": 0,
+                "cost_usd": 0.0
+            })
+            stats["calls"] += 1
+            stats["input_tokens"] += usage["input_tokens"]
+            stats["cached_tokens"] += cached
+            stats["output_tokens"] += usage["output_tokens"]
+            stats["cost_usd"] += cost
+    
+    def add_embedding(self, tokens: int, model: str = EMBEDDING_MODEL):
+        with self._lock:
+            self.embedding["calls"] += 1
+            self.embedding["tokens"] += tokens
+            self.embedding["cost_usd"] += estimate_cost(model, tokens)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            nodes = {node: dict(stats) for node, stats in self.nodes.items()}
+            embedding = dict(self.embedding)
+        for stats in list(nodes.values()) + [embedding]:
+            stats["cost_usd"] = round(stats["cost_usd"], 8)
+        return {
+            "input_tokens": sum(stats["input_tokens"] for stats in nodes.values()),
+            "cached_tokens": sum(stats["cached_tokens"] for stats in nodes.values()),
+            "output_tokens": sum(stats["output_tokens"] for stats in nodes.values()),
+            "embedding_tokens": embedding["tokens"],
+            "llm_calls": sum(stats["calls"] for stats in nodes.values()),
+            "cost_usd": round(sum(stats["cost_usd"] for stats in nodes.values()) + embedding["cost_usd"], 8),
+            "nodes": nodes,
+            "embedding": embedding
+        }
+
+
+# Usage of the agent request running in the current context (None outside one).
+# Graph nodes, tool threads and callback executors copy the context, so they share it.
+_request_usage: ContextVar[Optional[RequestUsage]] = ContextVar("request_usage", default=None)
+
+
+@contextmanager
+def track_request_usage() -> Iterator[RequestUsage]:
+    """Collect the usage of every LLM and embedding call made inside the block"""
+    usage = RequestUsage()
+    token = _request_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        try:
+            _request_usage.reset(token)
+        except ValueError:
+            # An async generator resumed in another context; that context never saw the set
+            pass
+
+
+def record_embedding_usage(texts: List[str], model: str = EMBEDDING_MODEL):
+    """Attribute an embedding call to the current request (token counts are estimated locally)"""
+    usage = _request_usage.get()
+    if usage is None:
+        return
+    from tokens import count_tokens
+    usage.add_embedding(sum(count_tokens(text, model) for text in texts), model)
+
+
+class UsageRecorder(BaseCallbackHandler):
+    """
+    Chat model callback aggregating token usage per graph node
+    
+    The node comes from the langgraph_node metadata LangGraph attaches to
+    every run inside a node; calls outside the graph are filed under "other".
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._nodes: Dict[UUID, str] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+    
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, metadata: Optional[Dict[str, Any]] = None, **kwargs):
+        with self._lock:
+            self._nodes[run_id] = (metadata or {}).get("langgraph_node", "other")
+    
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs):
+        with self._lock:
+            node = self._nodes.pop(run_id, "other")
+        usage = extract_usage(response)
+        if usage is None:
+            return
+        
+        model = (response.llm_output or {}).get("model_name") or LLM_MODEL
+        request_usage = _request_usage.get()
+        if request_usage is not None:
+            request_usage.add_llm(node, model, usage)
+        
+        with self._lock:
+            stats = self._stats.setdefault(node, {
+                "calls": 0,
+                "input_tokens": 0,
+                "cached_tokens": 0,
+                "output_tokens": 0,
+                "calls_with_cache_details": 0,
+                "cost_usd": 0.0
+            })
+            stats["calls"] += 1
+            stats["input_tokens"] += usage["input_tokens"]
+            stats["output_tokens"] += usage["output_tokens"]
+            stats["cost_usd"] += estimate_cost(model, usage["input_tokens"], usage["cached_tokens"] or 0, usage["output_tokens"])
+            if usage["cached_tokens"] is not None:
+                stats["cached_tokens"] += usage["cached_tokens"]
+                stats["calls_with_cache_details"] += 1
+    
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs):
+        with self._lock:
+            self._nodes.pop(run_id, None)
+    
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            nodes = {node: dict(stats) for node, stats in self._stats.items()}
+        for stats in nodes.values():
+            stats["cost_usd"] = round(stats["cost_usd"], 6)
+            stats["cache_hit_rate"] = (
+                round(stats["cached_tokens"] / stats["input_tokens"], 4) if stats["input_tokens"] else 0.0
+            )
+        return nodes
+
+
+usage_recorder = UsageRecorder()
+
+
+def _percentile(values: List[float], percentile: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(percentile * len(ordered)))]
+
+
+class RouteUsageStats:
+    """
+    Rolling per-route request usage over the last USAGE_ROUTE_WINDOW requests
+    
+    Routes are the router's tool choice ("rag", "tavily", "both", "none"),
+    suffixed with "+retry" when validation sent the request back to a tool,
+    or "cache" for response-cache hits.
+    """
+    
+    def __init__(self, window: int = USAGE_ROUTE_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._routes: Dict[str, deque] = {}
+        self._totals: Dict[str, int] = {}
+    
+    def record(self, route: str, usage: Dict[str, Any], latency_seconds: float):
+        entry = (
+            usage["input_tokens"],
+            usage["cached_tokens"],
+            usage["output_tokens"],
+            usage["embedding_tokens"],
+            usage["cost_usd"],
+            latency_seconds
+        )
+        with self._lock:
+            self._routes.setdefault(route, deque(maxlen=self.window)).append(entry)
+            self._totals[route] = self._totals.get(route, 0) + 1
+    
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            routes = {route: list(entries) for route, entries in self._routes.items()}
+            totals = dict(self._totals)
+        
+        result = {}
+        for route, entries in routes.items():
+            count = len(entries)
+            latencies = [entry[5] for entry in entries]
+            result[route] = {
+                "requests": totals[route],
+                "window": count,
+                "avg_input_tokens": round(sum(entry[0] for entry in entries) / count, 1),
+                "avg_cached_tokens": round(sum(entry[1] for entry in entries) / count, 1),
+                "avg_output_tokens": round(sum(entry[2] for entry in entries) / count, 1),
+                "avg_embedding_tokens": round(sum(entry[3] for entry in entries) / count, 1),
+                "avg_cost_usd": round(sum(entry[4] for entry in entries) / count, 8),
+                "window_cost_usd": round(sum(entry[4] for entry in entries), 6),
+                "latency_p50_ms": round(_percentile(latencies, 0.5) * 1000, 1),
+                "latency_p95_ms": round(_percentile(latencies, 0.95) * 1000, 1)
+            }
+        return result
+
+
+route_usage_stats = RouteUsageStats()
@@ -1,42 +1,53 @@
-from datetime import datetime
-import pytz
+import re
+from datetime import datetime, timezone
 
 
-def get_current_datetime_context() -> str:
-    """
-    Get current date and time context for the agent.
-    Returns a formatted string with current date, time, and timezone.
-    """
-    try:
-        # Get current UTC time
-        utc_now = datetime.now(pytz.UTC)
-        
-        # Format the context string
-        context = f"""**Current System Information:**
-- Date: {utc_now.strftime('%A, %B %d, %Y')}
-- Time: {utc_now.strftime('%I:%M %p UTC')}
-- Timezone: UTC
-- ISO Format: {utc_now.isoformat()}
+# Questions about the current date or time; their answers go stale within minutes
+_DATETIME_QUESTION = re.compile(
+    r"^(?:"
+    r"what(?:['’]s| is) (?:today['’]?s date|the date(?: today)?|the time|the current time|the current date|today)"
+    r"|what time is it(?: now)?|what day is (?:it|today)"
+    r")[\s!.?,]*$"
+)
 
-Use this current date and time information when responding to date/time-related queries."""
-        
-        return context
-    except Exception as e:
-        # Fallback if timezone handling fails
-        now = datetime.now()
-        return f"""**Current System Information:**
-- Date: {now.strftime('%A, %B %d, %Y')}
-- Time: {now.strftime('%I:%M %p')}
+# Any mention of the date or time, however phrased ("can you tell me the date?", "what year is it")
+_DATETIME_TERM = re.compile(r"\b(?:date|time|today|tonight|now|day|weekday|week|month|year|clock|hour)\b")
 
-Use this current date and time information when responding to date/time-related queries."""
 
+def get_coarse_datetime_context(granularity_minutes: int = 24 * 60) -> str:
+    """
+    Date/time context rounded down to granularity_minutes (1 = exact minute, 1440 = date only)
+    
+    Used in the request-specific part of prompts, after the static prefix.
+    """
+    utc_now = datetime.now(timezone.utc)
+    granularity = max(1, granularity_minutes)
+    minutes = (utc_now.hour * 60 + utc_now.minute) // granularity * granularity
+    window_start = utc_now.replace(hour=minutes // 60, minute=minutes % 60, second=0, microsecond=0)
+    
+    if granularity >= 24 * 60:
+        time_line = "- Time: not tracked (date only)"
+    elif granularity == 1:
+        time_line = f"- Time: {window_start.strftime('%I:%M %p UTC')}"
+    else:
+        time_line = f"- Time: approximately {window_start.strftime('%I:%M %p UTC')} (within {granularity} minutes)"
+    
+    return f"""**Current System Information:**
+- Date: {utc_now.strftime('%A, %B %d, %Y')}
+{time_line}
+- Timezone: UTC"""
 
-def get_simple_date() -> str:
-    """Get simple formatted current date"""
-    return datetime.now().strftime('%A, %B %d, %Y')
 
+def is_datetime_question(question: str) -> bool:
+    """True for short questions asking the current date or time (e.g. "what time is it?")"""
+    return bool(_DATETIME_QUESTION.match(" ".join(question.split()).casefold()))
 
-def get_simple_time() -> str:
-    """Get simple formatted current time"""
-    return datetime.now().strftime('%I:%M %p')
 
+def mentions_datetime(question: str) -> bool:
+    """
+    True when a question mentions the date or time at all
+    
+    Deliberately broad: a false positive only costs a response-cache write,
+    while a miss can serve yesterday's date from the cache.
+    """
+    return bool(_DATETIME_TERM.search(question.casefold()))
@@ -0,0 +1,115 @@
+import re
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+from config import (
+    VALIDATION_HIGH_SCORE,
+    VALIDATION_LOW_SCORE,
+    VALIDATION_MIN_CONTENT_CHARS,
+    VALIDATION_MIN_TAVILY_RESULTS
+)
+
+
+_RESULT_LINE = re.compile(r"^\d+\. ", re.MULTILINE)
+
+STRONG, WEAK, AMBIGUOUS = "strong", "weak", "ambiguous"
+
+
+def document_score(doc) -> Optional[float]:
+    """Similarity score carried in a retrieved document's metadata, if any"""
+    metadata = getattr(doc, "metadata", None) or {}
+    score = metadata.get("similarity")
+    return float(score) if score is not None else None
+
+
+def assess_rag(rag_docs: Optional[list]) -> Tuple[str, str]:
+    """Classify RAG output from its similarity distribution and content size"""
+    if not rag_docs:
+        return WEAK, "no documents"
+    
+    scores = [score for score in (document_score(doc) for doc in rag_docs) if score is not None]
+    if not scores:
+        return AMBIGUOUS, "documents carry no scores"
+    
+    top = max(scores)
+    content_chars = sum(len(getattr(doc, "page_content", str(doc))) for doc in rag_docs)
+    
+    if top < VALIDATION_LOW_SCORE:
+        return WEAK, f"top similarity {top:.2f} below {VALIDATION_LOW_SCORE}"
+    if top >= VALIDATION_HIGH_SCORE and content_chars >= VALIDATION_MIN_CONTENT_CHARS:
+        return STRONG, f"top similarity {top:.2f}, {len(scores)} docs, {content_chars} chars"
+    return AMBIGUOUS, f"top similarity {top:.2f}, {content_chars} chars"
+
+
+def count_tavily_results(tavily_res: Optional[str]) -> int:
+    """Number of numbered results in formatted Tavily output"""
+    if not tavily_res or not isinstance(tavily_res, str):
+        return 0
+    return len(_RESULT_LINE.findall(tavily_res))
+
+
+def assess_tavily(tavily_res: Optional[str]) -> Tuple[str, str]:
+    """Classify Tavily output from its result count and content length"""
+    results = count_tavily_results(tavily_res)
+    if results == 0:
+        return WEAK, "no web results"
+    if results >= VALIDATION_MIN_TAVILY_RESULTS and len(tavily_res) >= VALIDATION_MIN_CONTENT_CHARS:
+        return STRONG, f"{results} web results, {len(tavily_res)} chars"
+    return AMBIGUOUS, f"{results} web results, {len(tavily_res)} chars"
+
+
+def score_based_validation(state: Dict[str, Any]) -> Tuple[Optional[str], str]:
+    """
+    Deterministic validation from tool-output signals
+    
+    Any strong tool output is "sufficient"; if every tool tried came back
+    weak the result is "insufficient" (validation_decision then picks
+    try_rag, try_tavily or generate_llm). Anything else is ambiguous and
+    returns None so the caller can fall back to the LLM validator.
+    
+    Returns:
+        (validation_result or None, reason)
+    """
+    tools_tried = state.get("tools_tried") or []
+    assessments = {}
+    if "rag" in tools_tried:
+        assessments["rag"] = assess_rag(state.get("rag_documents"))
+    if "tavily" in tools_tried:
+        assessments["tavily"] = assess_tavily(state.get("tavily_results"))
+    
+    reason = "; ".join(f"{tool}: {verdict} ({detail})" for tool, (verdict, detail) in assessments.items())
+    verdicts = [verdict for verdict, _ in assessments.values()]
+    
+    if STRONG in verdicts:
+        result = "sufficient"
+    elif verdicts and all(verdict == WEAK for verdict in verdicts):
+        result = "insufficient"
+    else:
+        result = None
+    
+    validation_stats.record(result)
+    return result, reason
+
+
+class ValidationStats:
+    """How often validation was settled deterministically vs by the LLM"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {"sufficient": 0, "insufficient": 0, "ambiguous": 0}
+    
+    def record(self, result: Optional[str]):
+        with self._lock:
+            self._counts[result or "ambiguous"] += 1
+    
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self._counts)
+        total = sum(counts.values())
+        counts["deterministic_rate"] = (
+            round((counts["sufficient"] + counts["insufficient"]) / total, 4) if total else 0.0
+        )
+        return counts
+
+
+validation_stats = ValidationStats()
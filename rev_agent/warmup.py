@@ -0,0 +1,136 @@
+import asyncio
+import importlib
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from config import get_settings
+
+
+class WarmupState:
+    """Progress and per-step timings of the startup warm-up, reported by /ready"""
+    
+    def __init__(self):
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.steps: List[Dict[str, Any]] = []
+        self.failed_critical = False
+    
+    @property
+    def ready(self) -> bool:
+        return self.finished_at is not None and not self.failed_critical
+    
+    def snapshot(self) -> Dict[str, Any]:
+        if self.finished_at is None:
+            status = "warming" if self.started_at is not None else "pending"
+        elif self.failed_critical:
+            status = "failed"
+        elif any(step["status"] == "error" for step in self.steps):
+            status = "degraded"
+        else:
+            status = "ready"
+        
+        total_ms = None
+        if self.started_at is not None and self.finished_at is not None:
+            total_ms = round((self.finished_at - self.started_at) * 1000, 1)
+        
+        return {
+            "ready": self.ready,
+            "status": status,
+            "total_ms": total_ms,
+            "steps": list(self.steps)
+        }
+
+
+warmup_state = WarmupState()
+
+
+async def _run_step(name: str, step: Callable[[], Awaitable[Any]], critical: bool = False):
+    """Run one warm-up step under a timeout, recording its duration and outcome"""
+    start = time.perf_counter()
+    record = {"name": name, "status": "ok", "duration_ms": None, "critical": critical}
+    try:
+        await asyncio.wait_for(step(), timeout=get_settings().WARMUP_STEP_TIMEOUT)
+    except Exception as e:
+        record["status"] = "error"
+        record["error"] = str(e) or type(e).__name__
+        if critical:
+            warmup_state.failed_critical = True
+        print(f"[WARNING] Warm-up step '{name}' failed: {record['error']}")
+    record["duration_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    warmup_state.steps.append(record)
+
+
+async def _import_modules():
+    # The serving stack (langgraph, langchain, supabase) is imported here rather than by api
+    await asyncio.to_thread(importlib.import_module, "agent")
+
+
+async def _load_tokenizers():
+    # tiktoken loads (or downloads) its BPE files on first use; do it here, not on the event loop mid-request.
+    # A tokenizer that cannot load falls back to estimated counts (with a warning) rather than failing readiness.
+    from tokens import load_encodings
+    settings = get_settings()
+    await asyncio.to_thread(load_encodings, (settings.LLM_MODEL, settings.EMBEDDING_MODEL))
+
+
+async def _build_graph():
+    # Compiles the graph and constructs the shared chat model, retriever and pre-router
+    from agent import get_agent
+    await asyncio.to_thread(get_agent)
+
+
+async def _embed():
+    # Opens the pooled OpenAI connection (TLS + HTTP/2) that the chat model shares
+    from supabase_vectorstore import get_vectorstore
+    await get_vectorstore().aembed_query(get_settings().WARMUP_QUERY)
+
+
+async def _check_index_versions():
+    # A missing version column would otherwise fail the first index load or stall incremental refresh
+    from supabase_vectorstore import get_vectorstore
+    vectorstore = get_vectorstore()
+    for index in (vectorstore.local_index, vectorstore.keyword_index):
+        if index is not None:
+            await asyncio.to_thread(index.validate_version_column)
+
+
+async def _retrieve():
+    # Async Supabase client + match_rag_table RPC, or the local index load when RETRIEVAL_BACKEND=local
+    from supabase_vectorstore import get_vectorstore
+    await get_vectorstore().asimilarity_search(get_settings().WARMUP_QUERY, k=1)
+
+
+async def _preload_keyword_index():
+    from supabase_vectorstore import get_vectorstore
+    await asyncio.to_thread(get_vectorstore().keyword_index.ensure_loaded)
+
+
+async def run_warmup():
+    """
+    Warm the process before it takes traffic
+    
+    The imports, tokenizers and graph build are critical: if one fails the
+    service never reports ready. Other steps are best-effort and only mark
+    the warm-up as degraded.
+    """
+    settings = get_settings()
+    if not settings.WARMUP_ENABLED:
+        warmup_state.started_at = warmup_state.finished_at = time.time()
+        return
+    
+    warmup_state.started_at = time.time()
+    
+    await _run_step("imports", _import_modules, critical=True)
+    await _run_step("tokenizers", _load_tokenizers, critical=True)
+    await _run_step("graph", _build_graph, critical=True)
+    await _run_step("embedding", _embed)
+    if settings.RETRIEVAL_BACKEND == "local" or settings.HYBRID_RETRIEVAL:
+        await _run_step("index_version_column", _check_index_versions)
+    await _run_step("retrieval", _retrieve)
+    if settings.WARMUP_PRELOAD_INDEXES and settings.HYBRID_RETRIEVAL:
+        await _run_step("keyword_index", _preload_keyword_index)
+    
+    warmup_state.finished_at = time.time()
+    
+    snapshot = warmup_state.snapshot()
+    print(f"[OK] Warm-up {snapshot['status']} in {snapshot['total_ms']} ms")